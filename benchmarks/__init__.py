@@ -0,0 +1,9 @@
+"""
+Benchmarks, run from the repository root as modules:
+
+    python -m benchmarks.suite run --preset small --out results.json
+    python -m benchmarks.suite compare baseline.json results.json
+    python -m benchmarks.corpus /tmp/lmtc_corpus --preset medium
+
+The bench_* modules are focused micro-benchmarks for single components.
+"""
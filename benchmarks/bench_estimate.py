@@ -0,0 +1,54 @@
+"""
+Exact BPE token counts vs the byte-count approx estimator over a directory.
+
+    python -m benchmarks.bench_estimate --input path/to/repo --encoding o200k_base
+"""
+import argparse
+import pathlib
+import time
+from lmtokencook.extractors import get_extractor
+from lmtokencook.scanner import scan_directory
+from lmtokencook.tokenizers import ApproxEstimator, get_encoding, available_encodings, DEFAULT_ENCODING
+
+
+def _timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare exact token counts with approx byte-count estimates")
+    parser.add_argument("--input", required=True)
+    parser.add_argument("--encoding", choices=available_encodings(), default=DEFAULT_ENCODING)
+    parser.add_argument("--samples-per-type", type=int, default=5)
+    args = parser.parse_args()
+    files, _ = scan_directory(pathlib.Path(args.input))
+    enc = get_encoding(args.encoding)
+
+    def _exact():
+        per_file = {}
+        for f in files:
+            try:
+                per_file[f] = len(enc.encode_ordinary(get_extractor(f.suffix.lower()).extract(f)))
+            except Exception:
+                per_file[f] = 0
+        return per_file
+    exact_s, exact = _timed(_exact)
+    estimator = ApproxEstimator(encoding_name=args.encoding)
+    default_s, default = _timed(lambda: {f: estimator.estimate_file(f) for f in files})
+    calibrate_s, _ = _timed(lambda: estimator.calibrate(files, enc, args.samples_per_type))
+    calibrated_s, calibrated = _timed(lambda: {f: estimator.estimate_file(f) for f in files})
+
+    total = sum(exact.values()) or 1
+    print(f"files={len(files)} exact_tokens={total} encoding={args.encoding}")
+    print(f"  {'exact (extract + BPE)':<28} {exact_s:8.3f}s")
+    for name, secs, estimate in (("approx, default ratios", default_s, default),
+                                 ("approx, calibrated", calibrated_s, calibrated)):
+        error = (sum(estimate.values()) - total) / total
+        print(f"  {name:<28} {secs:8.3f}s  x{exact_s / max(secs, 1e-9):8.1f}  total error {error:+.1%}")
+    print(f"  {'calibration':<28} {calibrate_s:8.3f}s  ({len(estimator.calibrated)} file types)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Micro-benchmark: the old per-character printable-ASCII filter vs the
+sanitize modes.
+
+    python -m benchmarks.bench_sanitize --lines 200000 --dirty 0.05
+"""
+import argparse
+import random
+import time
+from lmtokencook.sanitize import sanitize_lines, SANITIZE_MODES
+
+WORDS = "def return import class self value data token serving cook the a of and for while if else".split()
+DIRTY = ["café", "naïve", "\x00", "\x1b[0m", "→", "😀", "\x7f", "日本語"]
+
+
+def make_text(n: int, dirty_ratio: float, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    lines = []
+    for _ in range(n):
+        words = [rng.choice(WORDS) for _ in range(rng.randint(0, 16))]
+        if words and rng.random() < dirty_ratio:
+            words[rng.randrange(len(words))] = rng.choice(DIRTY)
+        lines.append("\t" * rng.randint(0, 2) + " ".join(words))
+    return "\n".join(lines)
+
+
+def legacy_filter(text: str, skip_empty_lines: bool = False) -> list:
+    allowed = set(map(chr, range(32, 127)))
+    filtered_lines = []
+    for line in text.splitlines():
+        if not all(c in allowed for c in line):
+            continue
+        if skip_empty_lines and not line.strip():
+            continue
+        filtered_lines.append(line)
+    return filtered_lines
+
+
+def _timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the legacy character filter with the sanitize modes")
+    parser.add_argument("--lines", type=int, default=200000)
+    parser.add_argument("--dirty", type=float, default=0.05, help="Fraction of lines with a non-ASCII or control character")
+    args = parser.parse_args()
+    text = make_text(args.lines, args.dirty)
+    megabytes = len(text.encode("utf-8")) / (1024 * 1024)
+
+    legacy_s, legacy = _timed(lambda: legacy_filter(text))
+    results = [("legacy per-char filter", legacy_s, len(legacy))]
+    for mode in SANITIZE_MODES:
+        secs, (lines, _, _) = _timed(lambda: sanitize_lines(text, mode))
+        if mode == "drop-line":
+            assert lines == legacy, "drop-line disagrees with the legacy filter"
+        results.append((mode, secs, len(lines)))
+
+    print(f"lines={args.lines} size={megabytes:.1f} MB dirty={args.dirty}")
+    for name, secs, kept in results:
+        print(f"  {name:<24} {secs:8.3f}s  {megabytes / secs:10.1f} MB/s  kept={kept:<8} x{legacy_s / secs:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Scanner throughput: legacy pathlib walk vs os.scandir walk (serial and threaded).
+
+    python -m benchmarks.bench_scan --dirs 2000 --files-per-dir 20 --threads 8
+    python -m benchmarks.bench_scan --root /path/to/existing/tree
+"""
+import argparse
+import contextlib
+import io
+import pathlib
+import random
+import shutil
+import tempfile
+import time
+from lmtokencook import scanner
+
+
+def legacy_scan_directory(input_path: pathlib.Path):
+    # The pre-scandir implementation: recursive, one stat per is_* call
+    files, dir_struct = [], {}
+    def _scan_dir(cur_path, cur_struct):
+        for entry in cur_path.iterdir():
+            if entry.is_symlink():
+                cur_struct[entry.name] = {'processed': False, 'skipped': 'symlink'}
+                continue
+            if entry.is_dir():
+                if entry.name == '.venv':
+                    cur_struct[entry.name] = {'processed': False, 'skipped': '.venv'}
+                    continue
+                cur_struct[entry.name] = {}
+                _scan_dir(entry, cur_struct[entry.name])
+            elif entry.is_file():
+                ext = entry.suffix.lower()
+                if ext in scanner.EXCLUDE_EXTENSIONS:
+                    cur_struct[entry.name] = {'processed': False, 'skipped': 'explicitly_excluded'}
+                elif ext in scanner.INCLUDE_EXTENSIONS or (not ext and not entry.name.startswith('.')):
+                    # Extensionless names count as candidates today; the generated files are all text
+                    cur_struct[entry.name] = {'processed': True, 'rel_path': str(entry.relative_to(input_path))}
+                    files.append(entry)
+                else:
+                    cur_struct[entry.name] = {'processed': False, 'skipped': 'not_plaintext'}
+    _scan_dir(input_path, dir_struct)
+    return files, dir_struct
+
+
+def make_tree(root: pathlib.Path, dirs: int, files_per_dir: int, seed: int = 0):
+    rng = random.Random(seed)
+    exts = [".py", ".md", ".txt", ".json", ".png", ".bin", ""]
+    paths = [root]
+    for i in range(dirs):
+        parent = rng.choice(paths)
+        d = parent / f"d{i}"
+        d.mkdir()
+        paths.append(d)
+        for j in range(files_per_dir):
+            (d / f"f{j}{rng.choice(exts)}").write_bytes(b"x")
+    (root / ".venv").mkdir()
+    (root / ".venv" / "skipped.py").write_bytes(b"x")
+    with contextlib.suppress(OSError):
+        (root / "link.py").symlink_to(root / "d0")
+
+
+def _timed(fn):
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = fn()
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark scan_directory")
+    parser.add_argument("--root", default=None, help="Scan an existing tree instead of generating one")
+    parser.add_argument("--dirs", type=int, default=2000)
+    parser.add_argument("--files-per-dir", type=int, default=20)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    tmp = None
+    if args.root:
+        root = pathlib.Path(args.root)
+    else:
+        tmp = pathlib.Path(tempfile.mkdtemp(prefix="lmtc_bench_scan_"))
+        make_tree(tmp, args.dirs, args.files_per_dir)
+        root = tmp
+    try:
+        candidates = {
+            "legacy pathlib": lambda: legacy_scan_directory(root),
+            "scandir": lambda: scanner.scan_directory(root),
+            f"scandir x{args.threads} threads": lambda: scanner.scan_directory(root, threads=args.threads),
+        }
+        reference = None
+        baseline_s = None
+        for name, fn in candidates.items():
+            best, result = min((_timed(fn) for _ in range(args.repeat)), key=lambda r: r[0])
+            files, dir_struct = result
+            if reference is None:
+                reference, baseline_s = result, best
+            assert files == reference[0] and dir_struct == reference[1], f"{name} result differs from legacy scan"
+            print(f"  {name:<24} {best:8.3f}s  {len(files) / best:12,.0f} files/s  x{baseline_s / best:.2f}")
+    finally:
+        if tmp is not None:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
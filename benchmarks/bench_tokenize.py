@@ -0,0 +1,53 @@
+"""
+Micro-benchmark: per-call vs batched token counting.
+
+    python -m benchmarks.bench_tokenize --lines 200000 --threads 8
+"""
+import argparse
+import random
+import time
+from lmtokencook.tokens import count_tokens, DEFAULT_BATCH_SIZE, DEFAULT_NUM_THREADS
+from lmtokencook.tokenizers import get_encoding, available_encodings, DEFAULT_ENCODING
+
+WORDS = "def return import class self value data token serving cook the a of and for while if else".split()
+
+
+def make_lines(n: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(WORDS) for _ in range(rng.randint(0, 16))) for _ in range(n)]
+
+
+def _timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-call and batched token counting")
+    parser.add_argument("--lines", type=int, default=200000)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--threads", type=int, default=DEFAULT_NUM_THREADS)
+    parser.add_argument("--encoding", choices=available_encodings(), default=DEFAULT_ENCODING)
+    args = parser.parse_args()
+    enc = get_encoding(args.encoding)
+    lines = make_lines(args.lines)
+
+    simple_s, simple = _timed(lambda: count_tokens(lines, enc, backend="simple"))
+    batch_s, batch = _timed(lambda: count_tokens(lines, enc, args.batch_size, args.threads, backend="batch"))
+    # tiktoken's own batch API, for reference (one future per string)
+    def _tiktoken_batch():
+        out = []
+        for i in range(0, len(lines), args.batch_size):
+            out.extend(map(len, enc.encode_ordinary_batch(lines[i:i + args.batch_size], num_threads=args.threads)))
+        return out
+    tk_s, tk = _timed(_tiktoken_batch)
+
+    assert list(simple) == list(batch) == tk, "backends disagree on token counts"
+    print(f"lines={len(lines)} tokens={sum(simple)} batch_size={args.batch_size} threads={args.threads}")
+    for name, secs in (("simple", simple_s), ("batch", batch_s), ("tiktoken encode_ordinary_batch", tk_s)):
+        print(f"  {name:<32} {secs:8.3f}s  {len(lines) / secs:12,.0f} lines/s  x{simple_s / secs:.2f}")
+
+
+if __name__ == "__main__":
+    main()
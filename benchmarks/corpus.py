@@ -0,0 +1,179 @@
+"""
+Deterministic synthetic corpus for the benchmark suite: many small source and
+text files, a few huge files, one deeply nested chain of directories, and
+generated DOCX and PDF documents. The same preset and seed always give the
+same text content.
+
+    python -m benchmarks.corpus /tmp/lmtc_corpus --preset small
+    python -m benchmarks.corpus /tmp/lmtc_corpus --preset medium --huge-mb 64 --seed 7
+"""
+import argparse
+import json
+import pathlib
+import random
+import shutil
+from typing import Dict, List
+
+PRESETS = {
+    "tiny":   {"small_files": 60,    "dirs": 8,   "huge_files": 1, "huge_mb": 2,   "depth": 6,  "docx": 2,  "pdf": 2, "pdf_pages": 8},
+    "small":  {"small_files": 600,   "dirs": 40,  "huge_files": 2, "huge_mb": 8,   "depth": 12, "docx": 5,  "pdf": 3, "pdf_pages": 40},
+    "medium": {"small_files": 4000,  "dirs": 200, "huge_files": 3, "huge_mb": 32,  "depth": 20, "docx": 10, "pdf": 5, "pdf_pages": 150},
+    "large":  {"small_files": 20000, "dirs": 800, "huge_files": 4, "huge_mb": 128, "depth": 32, "docx": 20, "pdf": 8, "pdf_pages": 400},
+}
+DEFAULT_PRESET = "small"
+# Bump when the generated content changes, so cached corpora are rebuilt
+CORPUS_VERSION = 1
+
+WORDS = ("def return import class self value data token serving cook the a of and for while if else "
+         "manual section figure table install config warning note request response error retry").split()
+SMALL_EXTS = [".py", ".py", ".js", ".md", ".txt", ".json", ".yaml", ".html", ".css", ".sql", ""]
+
+
+def _sentence(rng: random.Random, lo: int = 4, hi: int = 14) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(lo, hi)))
+
+
+def _small_file(rng: random.Random, ext: str) -> str:
+    n = rng.randint(5, 400)
+    if ext == ".py":
+        return "\n".join(f"{'    ' * rng.randint(0, 3)}{_sentence(rng)}" for _ in range(n)) + "\n"
+    if ext == ".json":
+        return json.dumps({f"key_{i}": _sentence(rng, 1, 6) for i in range(n)}, indent=2) + "\n"
+    return "\n".join(_sentence(rng) if rng.random() > 0.1 else "" for _ in range(n)) + "\n"
+
+
+def _write_huge(path: pathlib.Path, rng: random.Random, nbytes: int):
+    # A block of random lines repeated with a running counter: fast to write, not trivially compressible
+    block = [_sentence(rng, 6, 20) for _ in range(2000)]
+    written = 0
+    i = 0
+    with open(path, "w", encoding="utf-8", newline="\n") as f:
+        while written < nbytes:
+            line = f"{i:09d} INFO worker-{i % 17} {block[i % len(block)]}\n"
+            f.write(line)
+            written += len(line)
+            i += 1
+
+
+def write_docx(path: pathlib.Path, paragraphs: List[str]):
+    import datetime
+    import docx
+    doc = docx.Document()
+    for text in paragraphs:
+        doc.add_paragraph(text)
+    fixed = datetime.datetime(2024, 1, 1)
+    doc.core_properties.created = doc.core_properties.modified = fixed
+    doc.save(str(path))
+
+
+def write_pdf(path: pathlib.Path, pages: List[List[str]]):
+    """Minimal text-layer PDF (Helvetica, one text object per page) built with pypdf."""
+    from pypdf import PdfWriter
+    from pypdf.generic import DictionaryObject, NameObject, StreamObject
+    writer = PdfWriter()
+    font = writer._add_object(DictionaryObject({
+        NameObject("/Type"): NameObject("/Font"),
+        NameObject("/Subtype"): NameObject("/Type1"),
+        NameObject("/BaseFont"): NameObject("/Helvetica"),
+    }))
+    for lines in pages:
+        page = writer.add_blank_page(612, 792)
+        ops = ["BT /F1 10 Tf 12 TL 50 750 Td"]
+        for line in lines:
+            ops.append("(" + line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") + ") Tj T*")
+        ops.append("ET")
+        content = StreamObject()
+        content.set_data("\n".join(ops).encode("latin-1"))
+        page[NameObject("/Contents")] = writer._add_object(content)
+        page[NameObject("/Resources")] = DictionaryObject({NameObject("/Font"): DictionaryObject({NameObject("/F1"): font})})
+    with open(path, "wb") as f:
+        writer.write(f)
+
+
+def corpus_params(preset: str = DEFAULT_PRESET, seed: int = 0, **overrides) -> Dict:
+    params = dict(PRESETS[preset])
+    params.update({k: v for k, v in overrides.items() if v is not None})
+    params.update({"preset": preset, "seed": seed, "version": CORPUS_VERSION})
+    return params
+
+
+def generate_corpus(out_dir, params: Dict) -> pathlib.Path:
+    """
+    Writes the corpus described by params (see corpus_params) to out_dir/tree
+    and its description to out_dir/corpus.json, and returns the tree root.
+    An existing corpus with the same params is reused as is.
+    """
+    out_dir = pathlib.Path(out_dir)
+    root = out_dir / "tree"
+    stamp = out_dir / "corpus.json"
+    if stamp.is_file() and root.is_dir():
+        with open(stamp, "r", encoding="utf-8") as f:
+            if json.load(f).get("params") == params:
+                return root
+    shutil.rmtree(root, ignore_errors=True)
+    root.mkdir(parents=True)
+    rng = random.Random(params["seed"])
+
+    dirs = [root]
+    for i in range(params["dirs"]):
+        d = rng.choice(dirs) / f"pkg{i}"
+        d.mkdir()
+        dirs.append(d)
+    for i in range(params["small_files"]):
+        ext = rng.choice(SMALL_EXTS)
+        name = f"mod{i}{ext}" if ext else ("Makefile" if i % 2 else "Dockerfile")
+        path = rng.choice(dirs) / name
+        if not path.exists():
+            path.write_text(_small_file(rng, ext), encoding="utf-8")
+
+    deep = root
+    for level in range(params["depth"]):
+        deep = deep / f"level{level}"
+    deep.mkdir(parents=True)
+    (deep / "bottom.md").write_text(_small_file(rng, ".md"), encoding="utf-8")
+
+    huge_dir = root / "data"
+    huge_dir.mkdir()
+    huge_exts = [".log", ".txt", ".json"]
+    for i in range(params["huge_files"]):
+        _write_huge(huge_dir / f"huge{i}{huge_exts[i % len(huge_exts)]}", rng, params["huge_mb"] * 1024 * 1024)
+
+    docs_dir = root / "docs"
+    docs_dir.mkdir()
+    for i in range(params["docx"]):
+        write_docx(docs_dir / f"report{i}.docx", [_sentence(rng, 8, 30) for _ in range(rng.randint(20, 300))])
+    for i in range(params["pdf"]):
+        pages = [[_sentence(rng, 6, 12) for _ in range(45)] for _ in range(params["pdf_pages"])]
+        write_pdf(docs_dir / f"manual{i}.pdf", pages)
+
+    files = [p for p in root.rglob("*") if p.is_file()]
+    summary = {"params": params, "files": len(files), "bytes": sum(p.stat().st_size for p in files)}
+    with open(stamp, "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+    return root
+
+
+def add_corpus_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--preset", choices=sorted(PRESETS), default=DEFAULT_PRESET)
+    parser.add_argument("--seed", type=int, default=0)
+    for key in PRESETS[DEFAULT_PRESET]:
+        parser.add_argument(f"--{key.replace('_', '-')}", type=int, default=None, help=f"Override the preset's {key}")
+
+
+def params_from_args(args) -> Dict:
+    return corpus_params(args.preset, args.seed, **{key: getattr(args, key) for key in PRESETS[DEFAULT_PRESET]})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate the deterministic benchmark corpus")
+    parser.add_argument("out_dir")
+    add_corpus_arguments(parser)
+    args = parser.parse_args()
+    root = generate_corpus(args.out_dir, params_from_args(args))
+    with open(pathlib.Path(args.out_dir) / "corpus.json", "r", encoding="utf-8") as f:
+        summary = json.load(f)
+    print(f"{root}: {summary['files']} files, {summary['bytes'] / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
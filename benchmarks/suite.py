@@ -0,0 +1,335 @@
+"""
+Benchmark suite: times the scanner, each extractor, token counting,
+write_servings and write_manifest on their own, and the whole cook through
+run_lmtokencook, on a generated corpus (see benchmarks.corpus).
+
+Every stage runs in a fresh process, so its peak RSS is its own and warm
+caches from one stage do not flatter the next. Setup (extracting the input
+of the tokenizer stage, loading the encoder, ...) is done before the clock
+starts; each stage reports the best of --repeat runs.
+
+    python -m benchmarks.suite run --preset small --out results.json
+    python -m benchmarks.suite run --corpus-dir /tmp/lmtc_corpus --stages scan end_to_end
+    python -m benchmarks.suite compare baseline.json results.json --threshold 0.1
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import pathlib
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Callable, Dict, List, Optional, Tuple
+
+from benchmarks.corpus import generate_corpus, add_corpus_arguments, params_from_args
+from lmtokencook.instrument import peak_rss_mb
+
+STAGES = ["scan", "extract_text", "extract_text_stream", "extract_pdf", "extract_docx",
+          "count_tokens", "write_servings", "write_manifest", "end_to_end"]
+DEFAULT_THRESHOLD = 0.10
+# Slowdowns smaller than this many seconds are noise, whatever the ratio
+DEFAULT_MIN_DELTA = 0.01
+DEFAULT_CHUNK_SIZE = 28000
+
+
+def _quiet(fn: Callable):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn()
+
+
+def _scanned_files(root: pathlib.Path) -> List[pathlib.Path]:
+    from lmtokencook.scanner import scan_directory
+    return _quiet(lambda: scan_directory(root))[0]
+
+
+def _text_files(root: pathlib.Path) -> List[pathlib.Path]:
+    from lmtokencook.extractors import get_extractor, PlainTextExtractor
+    return [f for f in _scanned_files(root) if isinstance(get_extractor(f.suffix.lower()), PlainTextExtractor)]
+
+
+def _text_lines(root: pathlib.Path) -> List[str]:
+    from lmtokencook.extractors import get_extractor
+    from lmtokencook.sanitize import sanitize_lines
+    lines = []
+    for f in _text_files(root):
+        lines.extend(sanitize_lines(get_extractor(f.suffix.lower()).extract(f))[0])
+    return lines
+
+
+def _size(files: List[pathlib.Path]) -> int:
+    return sum(os.stat(f).st_size for f in files)
+
+
+# Each stage returns (setup state, body(state) -> None, items, bytes)
+def _stage_scan(root, options):
+    from lmtokencook.scanner import scan_directory
+    files = _scanned_files(root)
+    return None, lambda _: _quiet(lambda: scan_directory(root, threads=options["scan_threads"])), len(files), 0
+
+
+def _stage_extract(suffixes: Optional[Tuple[str, ...]], stream: bool = False):
+    def _stage(root, options):
+        from lmtokencook.extractors import get_extractor
+        if suffixes is None:
+            files = _text_files(root)
+        else:
+            files = [f for f in _scanned_files(root) if f.suffix.lower() in suffixes]
+        def _body(_):
+            for f in files:
+                extractor = get_extractor(f.suffix.lower())
+                if stream:
+                    for _line in extractor.iter_lines(f):
+                        pass
+                elif hasattr(extractor, "extract_pages"):
+                    extractor.extract_pages(f, workers=options["pdf_workers"])
+                else:
+                    extractor.extract(f)
+        return None, _body, len(files), _size(files)
+    return _stage
+
+
+def _stage_count_tokens(root, options):
+    from lmtokencook.tokens import count_tokens
+    from lmtokencook.tokenizers import get_encoding
+    enc = get_encoding(options["encoding"])
+    lines = _text_lines(root)
+    return lines, lambda lines: count_tokens(lines, enc), len(lines), sum(len(line) for line in lines)
+
+
+def _stage_write_servings(root, options):
+    import hashlib
+    from lmtokencook.chunker import MasterSpool, iter_serving_data, write_servings, serving_overhead, make_planner
+    from lmtokencook.cook import Serving
+    from lmtokencook.tokens import count_tokens_split
+    from lmtokencook.tokenizers import get_encoding
+    enc = get_encoding(options["encoding"])
+    planner = make_planner("greedy", options["chunk_size"], serving_overhead(enc), serving_overhead(enc, final=True))
+    lines, line_tokens, _ = count_tokens_split(_text_lines(root), enc, planner.max_line_tokens)
+    # The master spool is built (in memory) before the clock starts; the stage
+    # cuts servings out of it and writes them through the ServingWriter, as a cook does
+    spool = MasterSpool(None, planner)
+    spool.write_lines(lines, line_tokens)
+    spool.close()
+    total = len(planner.serving_ranges)
+    def _body(_):
+        out = pathlib.Path(tempfile.mkdtemp(prefix="lmtc_bench_serve_"))
+        try:
+            with spool.reader() as f:
+                servings = (Serving(n, total, name, data, tokens, hashlib.sha256(data).hexdigest())
+                            for (n, name, data), tokens in zip(iter_serving_data(f, planner.serving_ranges), planner.serving_tokens))
+                write_servings(servings, out)
+        finally:
+            shutil.rmtree(out, ignore_errors=True)
+    return None, _body, len(lines), spool.bytes_written
+
+
+def _stage_write_manifest(root, options):
+    from lmtokencook.scanner import scan_directory
+    from lmtokencook.manifest import build_manifest_metadata, write_manifest
+    files, dir_struct = _quiet(lambda: scan_directory(root))
+    processed_files = [{
+        "relative_path": str(f.relative_to(root)), "absolute_path": str(f), "char_start_offset": i * 1000,
+        "char_end_offset": (i + 1) * 1000, "char_count": 1000, "estimated_tokens": 250, "extraction_status": "Success",
+        "encoding_used": "utf-8", "size_bytes": 1000, "mtime_ns": 0, "sha256": "0" * 64, "content_lines": 40,
+        "servings": [{"file": "serving_1_of_1.txt", "line_start": 1, "line_end": 40}],
+    } for i, f in enumerate(files)]
+    scan_counts = {"scanned": len(files), "processed": len(files)}
+    metadata = build_manifest_metadata(root, "bench", scan_counts, {"enabled": False}, {})
+    def _body(_):
+        out = pathlib.Path(tempfile.mkdtemp(prefix="lmtc_bench_manifest_"))
+        try:
+            write_manifest(out / "manifest.json", metadata, dir_struct, processed_files)
+        finally:
+            shutil.rmtree(out, ignore_errors=True)
+    return None, _body, len(processed_files), 0
+
+
+def _stage_end_to_end(root, options):
+    from lmtokencook.main import run_lmtokencook
+    from lmtokencook.tokenizers import get_encoding
+    get_encoding(options["encoding"])
+    files = _scanned_files(root)
+    def _body(_):
+        out = pathlib.Path(tempfile.mkdtemp(prefix="lmtc_bench_e2e_"))
+        try:
+            _quiet(lambda: run_lmtokencook(root, out, options["chunk_size"], workers=options["workers"],
+                                           scan_threads=options["scan_threads"], encoding=options["encoding"]))
+        finally:
+            shutil.rmtree(out, ignore_errors=True)
+    return None, _body, len(files), _size(files)
+
+
+STAGE_FUNCTIONS = {
+    "scan": _stage_scan,
+    "extract_text": _stage_extract(None),
+    "extract_text_stream": _stage_extract(None, stream=True),
+    "extract_pdf": _stage_extract((".pdf",)),
+    "extract_docx": _stage_extract((".docx",)),
+    "count_tokens": _stage_count_tokens,
+    "write_servings": _stage_write_servings,
+    "write_manifest": _stage_write_manifest,
+    "end_to_end": _stage_end_to_end,
+}
+
+
+def run_stage(name: str, root: str, options: Dict, repeat: int) -> Dict:
+    """Runs one stage `repeat` times in this process and returns its timings."""
+    state, body, items, nbytes = STAGE_FUNCTIONS[name](pathlib.Path(root), options)
+    runs = []
+    cpu = []
+    for _ in range(repeat):
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        body(state)
+        runs.append(time.perf_counter() - wall_start)
+        cpu.append(time.process_time() - cpu_start)
+    best = min(runs)
+    result = {
+        "seconds": round(best, 6),
+        "median_seconds": round(statistics.median(runs), 6),
+        "cpu_seconds": round(min(cpu), 6),
+        "runs": [round(r, 6) for r in runs],
+        "items": items,
+        "bytes": nbytes,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    if best > 0:
+        result["items_per_second"] = round(items / best, 1)
+        if nbytes:
+            result["mb_per_second"] = round(nbytes / best / 1e6, 2)
+    return result
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=pathlib.Path(__file__).resolve().parent, timeout=10)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_suite(root: pathlib.Path, stages: List[str], options: Dict, repeat: int, corpus: Dict, progress=print) -> Dict:
+    results = {}
+    spawn = get_context("spawn")
+    for name in stages:
+        progress(f"[bench] {name} ...")
+        # A fresh interpreter per stage: peak RSS is the stage's own
+        with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as pool:
+            results[name] = pool.submit(run_stage, name, str(root), options, repeat).result()
+        r = results[name]
+        progress(f"[bench] {name:<20} {r['seconds']:9.3f}s  peak RSS {r['peak_rss_mb']} MB")
+    return {
+        "meta": {
+            "timestamp_utc": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "repeat": repeat,
+            "options": options,
+            "corpus": corpus,
+        },
+        "stages": results,
+    }
+
+
+def compare_results(base: Dict, new: Dict, threshold: float = DEFAULT_THRESHOLD, rss_threshold: Optional[float] = None,
+                    min_delta: float = DEFAULT_MIN_DELTA) -> Tuple[List[str], List[str]]:
+    """
+    Compares two suite results stage by stage. A stage regresses when its best
+    time grows by more than threshold (0.1 = 10%) and by at least min_delta
+    seconds, or its peak RSS by more than
+    rss_threshold if given. Returns (report lines, names of regressed stages).
+    """
+    lines = [f"{'stage':<22} {'base s':>10} {'new s':>10} {'change':>8}  {'base MB':>8} {'new MB':>8}"]
+    regressed = []
+    for name, new_stage in new["stages"].items():
+        base_stage = base["stages"].get(name)
+        if base_stage is None:
+            lines.append(f"{name:<22} {'-':>10} {new_stage['seconds']:>10.3f} {'new':>8}")
+            continue
+        change = new_stage["seconds"] / base_stage["seconds"] - 1 if base_stage["seconds"] else 0.0
+        flags = []
+        if change > threshold and new_stage["seconds"] - base_stage["seconds"] >= min_delta:
+            flags.append("SLOWER")
+        base_rss, new_rss = base_stage.get("peak_rss_mb"), new_stage.get("peak_rss_mb")
+        if rss_threshold is not None and base_rss and new_rss and new_rss / base_rss - 1 > rss_threshold:
+            flags.append("MORE MEMORY")
+        if flags:
+            regressed.append(name)
+        lines.append(f"{name:<22} {base_stage['seconds']:>10.3f} {new_stage['seconds']:>10.3f} {change:>+8.1%}  "
+                     f"{base_rss or 0:>8} {new_rss or 0:>8}  {' '.join(flags)}")
+    if base["meta"].get("corpus") != new["meta"].get("corpus"):
+        lines.append("warning: the two runs used different corpora")
+    return lines, regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LMTokenCook benchmark suite")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="Generate (or reuse) a corpus and time every stage")
+    run.add_argument("--corpus-dir", default=None, help="Where to keep the corpus between runs (default: a temp dir)")
+    add_corpus_arguments(run)
+    run.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    run.add_argument("--repeat", type=int, default=3)
+    run.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    run.add_argument("--workers", type=int, default=1)
+    run.add_argument("--scan-threads", type=int, default=1)
+    run.add_argument("--pdf-workers", type=int, default=1)
+    run.add_argument("--encoding", default="cl100k_base")
+    run.add_argument("--out", default=None, help="Write results JSON here (default: print it)")
+
+    cmp = sub.add_parser("compare", help="Flag stages that regressed between two result files")
+    cmp.add_argument("baseline")
+    cmp.add_argument("results")
+    cmp.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Allowed slowdown, 0.1 = 10%%")
+    cmp.add_argument("--rss-threshold", type=float, default=None, help="Allowed peak RSS growth (off by default)")
+    cmp.add_argument("--min-delta", type=float, default=DEFAULT_MIN_DELTA, help="Ignore slowdowns smaller than this many seconds")
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            base = json.load(f)
+        with open(args.results, "r", encoding="utf-8") as f:
+            new = json.load(f)
+        lines, regressed = compare_results(base, new, args.threshold, args.rss_threshold, args.min_delta)
+        print("\n".join(lines))
+        if regressed:
+            print(f"REGRESSION in {len(regressed)} stage(s): {', '.join(regressed)}")
+            sys.exit(1)
+        print("No regressions.")
+        return
+
+    corpus_dir = pathlib.Path(args.corpus_dir or tempfile.mkdtemp(prefix="lmtc_bench_corpus_"))
+    try:
+        params = params_from_args(args)
+        print(f"[bench] corpus {params['preset']} (seed {params['seed']}) in {corpus_dir}")
+        root = generate_corpus(corpus_dir, params)
+        with open(corpus_dir / "corpus.json", "r", encoding="utf-8") as f:
+            corpus = json.load(f)
+        options = {"chunk_size": args.chunk_size, "workers": args.workers, "scan_threads": args.scan_threads,
+                   "pdf_workers": args.pdf_workers, "encoding": args.encoding}
+        results = run_suite(root, args.stages, options, args.repeat, corpus)
+    finally:
+        if args.corpus_dir is None:
+            shutil.rmtree(corpus_dir, ignore_errors=True)
+    text = json.dumps(results, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        print(f"[bench] results written to {args.out}")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
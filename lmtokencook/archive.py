@@ -0,0 +1,81 @@
+import io
+import os
+import pathlib
+import tarfile
+import time
+import zipfile
+from lmtokencook.chunker import ServingWriter, WRITE_QUEUE_SIZE
+
+# --output-format values other than "dir", with their file extensions
+ARCHIVE_FORMATS = {"zip": ".zip", "tar.gz": ".tar.gz", "tar.xz": ".tar.xz"}
+OUTPUT_FORMATS = ("dir", *ARCHIVE_FORMATS)
+DEFAULT_OUTPUT_FORMAT = "dir"
+
+
+def archive_path_for(output_base: pathlib.Path, name: str, output_format: str) -> pathlib.Path:
+    return pathlib.Path(output_base) / f"{name}{ARCHIVE_FORMATS[output_format]}"
+
+
+class ArchiveWriter(ServingWriter):
+    """
+    ServingWriter that streams files into a single zip, tar.gz or tar.xz
+    archive instead of a directory, under a top-level folder named root (what
+    zipping an output directory would give). Compression runs on the writer
+    thread, overlapping with whatever produces the servings. The archive is
+    built under a hidden temporary name and renamed into place by close(), so
+    it only appears once complete.
+    """
+    def __init__(self, archive_path: pathlib.Path, output_format: str, root: str, max_pending: int = WRITE_QUEUE_SIZE):
+        if output_format not in ARCHIVE_FORMATS:
+            raise ValueError(f"Unknown archive format: {output_format}")
+        self.archive_path = pathlib.Path(archive_path)
+        self.output_format = output_format
+        self.root = root
+        self._tmp_path = self.archive_path.with_name(f".{self.archive_path.name}.tmp")
+        if output_format == "zip":
+            self._archive = zipfile.ZipFile(self._tmp_path, "w", zipfile.ZIP_DEFLATED)
+        else:
+            self._archive = tarfile.open(self._tmp_path, "w:" + output_format.split(".")[1])
+        super().__init__(self.archive_path.parent, max_pending)
+
+    def _publish(self, name: str, data):
+        member = f"{self.root}/{name}"
+        if isinstance(data, pathlib.Path):
+            # put_file(): copied from disk in blocks, never read whole
+            self.bytes_written += os.path.getsize(data)
+            if self.output_format == "zip":
+                self._archive.write(data, member)
+            else:
+                self._archive.add(str(data), member)
+            return
+        if self.output_format == "zip":
+            self._archive.writestr(member, data)
+        else:
+            info = tarfile.TarInfo(member)
+            info.size = len(data)
+            info.mtime = int(time.time())
+            self._archive.addfile(info, io.BytesIO(data))
+        self.bytes_written += len(data)
+
+    def put_file(self, name: str, path: pathlib.Path):
+        """Queues the file at path to be copied into the archive as name."""
+        self.put(name, pathlib.Path(path))
+
+    def close(self):
+        try:
+            super().close()
+        except BaseException:
+            self._discard()
+            raise
+        self._archive.close()
+        os.replace(self._tmp_path, self.archive_path)
+
+    def abort(self):
+        super().abort()
+        self._discard()
+
+    def _discard(self):
+        try:
+            self._archive.close()
+        finally:
+            self._tmp_path.unlink(missing_ok=True)
@@ -0,0 +1,100 @@
+import json
+import os
+import pathlib
+import sqlite3
+import time
+from array import array
+from typing import Optional
+
+# Bump when the cached record layout or filtering rules change
+CACHE_FORMAT_VERSION = 3
+DEFAULT_CACHE_SIZE_MB = 1024
+
+
+def default_cache_dir() -> pathlib.Path:
+    env = os.environ.get("LMTOKENCOOK_CACHE_DIR")
+    if env:
+        return pathlib.Path(env)
+    if os.name == "nt":
+        return pathlib.Path(os.environ.get("LOCALAPPDATA", pathlib.Path.home())) / "LMTokenCook" / "cache"
+    return pathlib.Path(os.environ.get("XDG_CACHE_HOME", pathlib.Path.home() / ".cache")) / "lmtokencook"
+
+
+class ExtractionCache:
+    """
+    On-disk SQLite cache of extracted, filtered and tokenized files.
+    Entries are keyed by absolute path, size and mtime plus everything that
+    changes the cooked lines (extractor, encoding, filter options), and are
+    evicted least-recently-used once the cache grows past max_bytes.
+    Only used from the thread that owns the cook loop.
+    """
+    def __init__(self, cache_dir, max_bytes: int = DEFAULT_CACHE_SIZE_MB * 1024 * 1024):
+        self.cache_dir = pathlib.Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._conn = sqlite3.connect(str(self.cache_dir / f"extraction_cache_v{CACHE_FORMAT_VERSION}.sqlite3"))
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY,"
+            " lines TEXT NOT NULL,"
+            " line_tokens BLOB NOT NULL,"
+            " tokens INTEGER NOT NULL,"
+            " char_count INTEGER NOT NULL,"
+            " sha256 TEXT NOT NULL,"
+            " stats TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+
+    @staticmethod
+    def make_key(file_path: pathlib.Path, extractor_name: str, encoding_name: str, options: str) -> Optional[str]:
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            return None
+        return f"v{CACHE_FORMAT_VERSION}|{extractor_name}|{encoding_name}|{options}|{st.st_size}|{st.st_mtime_ns}|{os.path.abspath(file_path)}"
+
+    def get(self, key: str) -> Optional[tuple]:
+        """Returns (content_lines, line_tokens, tokens, char_count, sha256, stats) or None."""
+        row = self._conn.execute(
+            "SELECT lines, line_tokens, tokens, char_count, sha256, stats FROM entries WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._conn.execute("UPDATE entries SET last_used = ? WHERE key = ?", (time.time(), key))
+        lines, blob, tokens, char_count, sha256, stats = row
+        line_tokens = array("I")
+        line_tokens.frombytes(blob)
+        # line_tokens also covers the two file markers, so it tells [] apart from [""]
+        return (lines.split("\n") if len(line_tokens) > 2 else []), line_tokens, tokens, char_count, sha256, json.loads(stats)
+
+    def put(self, key: str, content_lines, line_tokens: array, tokens: int, char_count: int, sha256: str, stats: Optional[dict] = None):
+        lines = "\n".join(content_lines)
+        blob = line_tokens.tobytes()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO entries (key, lines, line_tokens, tokens, char_count, sha256, stats, size, last_used)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (key, lines, blob, tokens, char_count, sha256, json.dumps(stats or {}), len(lines.encode("utf-8")) + len(blob), time.time()),
+        )
+
+    def evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        stale = []
+        for key, size in self._conn.execute("SELECT key, size FROM entries ORDER BY last_used"):
+            if total <= self.max_bytes:
+                break
+            stale.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM entries WHERE key = ?", stale)
+
+    def close(self):
+        self.evict()
+        self._conn.commit()
+        self._conn.close()
@@ -1,216 +1,687 @@
+import bisect
+import io
+import os
 import pathlib
-from typing import List, Dict, Any
-import tiktoken
+import queue
+import threading
+from array import array
+from contextlib import nullcontext
+from functools import lru_cache
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Sequence, Tuple
+from lmtokencook.instrument import clock, lap
 
+# Serving header/footer overhead is reserved for up to this many servings
+MAX_SERVINGS = 999_999
+# Servings assembled ahead of the writer thread
+WRITE_QUEUE_SIZE = 4
 
-def serving_lines(
-    lines: list,
-    output_dir: pathlib.Path,
-    serving_size: int,
-    encoding_name: str = "cl100k_base"
-) -> int:
-    """
-    Splits a list of lines into serving_XXX.txt files based on token count.
-    Returns the number of chunks created.
-    """
-    import tiktoken
-    enc = tiktoken.get_encoding(encoding_name)
-    serving_number = 1
-    current_serving_tokens = 0
-    current_serving_lines = []
-    serving_files = []
-    # Count how many chunks there will be
-    temp_serving_tokens = 0
-    temp_serving_count = 1
-    for line in lines:
-        line_tokens = len(enc.encode(line))
-        if temp_serving_tokens + line_tokens > serving_size and temp_serving_tokens > 0:
-            temp_serving_count += 1
-            temp_serving_tokens = 0
-        temp_serving_tokens += line_tokens
-    total_chunks = temp_serving_count
-    # Actual chunking
-    serving_number = 1
-    current_serving_tokens = 0
-    current_serving_lines = []
-    for line in lines:
-        line_tokens = len(enc.encode(line))
-        if current_serving_tokens + line_tokens > serving_size and current_serving_tokens > 0:
-            serving_path = output_dir / f"serving_{serving_number}_of_{total_chunks}.txt"
-            with open(serving_path, "w", encoding="utf-8") as f:
-                if serving_number < total_chunks:
-                    comment = f"# [LMTokenCook] This is chunk {serving_number} of {total_chunks}. Do not respond yet, more chunks are coming."
-                else:
-                    comment = f"# [LMTokenCook] This is chunk {serving_number} of {total_chunks}. This is everything. Make an index of all the information you’ve been provided and summarize it. Ask me what I want to do now that we're on the same page thanks to LMTokenCook by DropShock Digital."
-                f.write(comment + "\n")
-                for l in current_serving_lines:
-                    f.write(l + "\n")
-                f.write(comment + "\n")
-            serving_files.append(serving_path)
-            serving_number += 1
-            current_serving_lines = []
-            current_serving_tokens = 0
-        current_serving_lines.append(line)
-        current_serving_tokens += line_tokens
-    if current_serving_lines:
-        serving_path = output_dir / f"serving_{serving_number}_of_{total_chunks}.txt"
-        with open(serving_path, "w", encoding="utf-8") as f:
-            if serving_number < total_chunks:
-                comment = f"# [LMTokenCook] This is chunk {serving_number} of {total_chunks}. Do not respond yet, more chunks are coming."
-            else:
-                comment = f"# [LMTokenCook] This is chunk {serving_number} of {total_chunks}. This is everything. Make an index of all the information you’ve been provided and summarize it. Ask me what I want to do now that we're on the same page thanks to LMTokenCook by DropShock Digital."
-            f.write(comment + "\n")
-            for l in current_serving_lines:
-                f.write(l + "\n")
-            f.write(comment + "\n")
-        serving_files.append(serving_path)
-    return len(serving_files)
-
-def serving_master_text(
-    master_file: pathlib.Path,
-    output_dir: pathlib.Path,
+# greedy:   fill servings line by line in master order (fewest servings for that order)
+# files:    keep files whole where they fit, first-fit-decreasing by directory subtree
+# balanced: master order, with serving sizes evened out at the greedy serving count
+PACKING_STRATEGIES = ("greedy", "files", "balanced")
+DEFAULT_PACKING = "greedy"
+
+
+def serving_comment(serving_number: int, total_chunks: int) -> str:
+    if serving_number < total_chunks:
+        return f"# [LMTokenCook] This is chunk {serving_number} of {total_chunks}. Do not respond yet, more chunks are coming."
+    return f"# [LMTokenCook] This is chunk {serving_number} of {total_chunks}. This is everything. Make an index of all the information you’ve been provided and summarize it. Ask me what I want to do now that we're on the same page thanks to LMTokenCook by DropShock Digital."
+
+
+@lru_cache(maxsize=None)
+def _digit_groups_are_tokens(enc) -> bool:
+    """
+    True for encodings (cl100k_base, o200k_base) that split digit runs into
+    groups of up to three and have a single token for every such group: there
+    a number's token count only grows with its length.
+    """
+    groups = {str(i).zfill(width) for i in range(1000) for width in (1, 2, 3) if len(str(i)) <= width}
+    return (all(len(enc.encode_ordinary(group)) == 1 for group in groups)
+            and all(len(enc.encode_ordinary(n)) == 2 for n in ("100000", "123456", "999999")))
+
+
+def serving_overhead(enc, final: bool = False, max_servings: int = MAX_SERVINGS) -> int:
+    """
+    Upper bound on the tokens a serving's header and footer comment lines add,
+    including their newlines, for any serving number up to max_servings. The
+    last serving (final=True) has the longer closing comment.
+    Numbers are tokenized apart from the words around them, so a comment costs
+    the same plus whatever its two numbers cost. Where digit groups are single
+    tokens the largest numbers cost the most; otherwise (r50k_base, p50k_base)
+    any number is bounded by one token per digit plus its leading space.
+    """
+    numbers = (max_servings, max_servings) if final else (max_servings - 1, max_servings)
+    tokens = len(enc.encode_ordinary(serving_comment(*numbers)))
+    if not _digit_groups_are_tokens(enc):
+        tokens += sum(len(str(n)) + 1 - len(enc.encode_ordinary(f" {n}")) for n in numbers)
+    return 2 * (tokens + 1)
+
+
+def _encode_line(line: str) -> bytes:
+    # Same bytes a text-mode utf-8 write of line + "\n" produces on this platform
+    data = (line + "\n").encode("utf-8")
+    if os.linesep != "\n":
+        data = data.replace(b"\n", os.linesep.encode("ascii"))
+    return data
+
+
+class ServingPlanner:
+    """
+    Online greedy packer. Feed it one token count (and optionally the encoded
+    byte size and physical line count) per master line, in order; it records
+    where each serving starts and ends without holding the lines or their counts.
+    Every line is charged one extra token for its newline and the header and
+    footer overhead is reserved (final_overhead for the last serving), so a
+    serving never goes over serving_size as long as no line is longer than
+    max_line_tokens.
+
+    After finish(), every planner exposes the same plan: serving_ranges (the
+    spool byte ranges making up each serving, in order), segments (see
+    locate_lines) and serving_tokens.
+    """
+    strategy = "greedy"
+
+    def __init__(self, serving_size: int, overhead: int = 0, final_overhead: Optional[int] = None):
+        self.serving_size = serving_size
+        self.overhead = overhead
+        self.final_overhead = overhead if final_overhead is None else final_overhead
+        # Longest line (in tokens, without its newline) that fits in any serving on its own
+        self.max_line_tokens = serving_size - max(overhead, self.final_overhead) - 1
+        if self.max_line_tokens < 1:
+            raise ValueError(f"Serving size {serving_size} leaves no room for content after "
+                             f"{max(overhead, self.final_overhead)} tokens of header and footer")
+        self.bounds = []            # (start_line, end_line) per serving, in master lines
+        self.byte_bounds = []       # (start_byte, end_byte) per serving
+        self.physical_bounds = []   # (start, end) per serving, in newline-separated file lines
+        self.serving_tokens = []    # accounted tokens per serving, header and footer included
+        self.total_tokens = 0       # content tokens only
+        self._current_tokens = 0
+        self._start_line = self._line = 0
+        self._start_byte = self._byte = 0
+        self._start_physical = self._physical = 0
+        self._open_lines = []       # (cost, nbytes, physical_lines) of the serving being filled
+        self.serving_ranges = []
+        self.segments = []
+
+    def begin_unit(self, name: str):
+        """Marks the start of a file (or the directory tree) in the master; greedy ignores it."""
+
+    def add(self, line_tokens: int, nbytes: int = 0, physical_lines: int = 1):
+        cost = line_tokens + 1
+        if self._current_tokens + cost > self.serving_size - self.overhead and self._current_tokens > 0:
+            self._close_serving()
+        self._current_tokens += cost
+        self._open_lines.append((cost, nbytes, physical_lines))
+        self.total_tokens += line_tokens
+        self._line += 1
+        self._byte += nbytes
+        self._physical += physical_lines
+
+    def _close_serving(self, final: bool = False):
+        self.bounds.append((self._start_line, self._line))
+        self.byte_bounds.append((self._start_byte, self._byte))
+        self.physical_bounds.append((self._start_physical, self._physical))
+        self.serving_tokens.append(self._current_tokens + (self.final_overhead if final else self.overhead))
+        self._start_line, self._start_byte, self._start_physical = self._line, self._byte, self._physical
+        self._current_tokens = 0
+        self._open_lines = []
+
+    def finish(self) -> List[Tuple[int, int]]:
+        if self._line > self._start_line:
+            budget = self.serving_size - self.final_overhead
+            if self._current_tokens > budget:
+                # The closing comment does not fit: end the serving early and
+                # move as many trailing lines as fit into a last serving of their own
+                lines = tokens = nbytes = physical = 0
+                for cost, line_bytes, line_physical in reversed(self._open_lines):
+                    if tokens + cost > budget:
+                        break
+                    lines, tokens, nbytes, physical = lines + 1, tokens + cost, nbytes + line_bytes, physical + line_physical
+                tail = self._open_lines[len(self._open_lines) - lines:]
+                self._line -= lines
+                self._byte -= nbytes
+                self._physical -= physical
+                self._current_tokens -= tokens
+                self._close_serving()
+                self._line += lines
+                self._byte += nbytes
+                self._physical += physical
+                self._current_tokens = tokens
+                self._open_lines = tail
+            self._close_serving(final=True)
+        self.serving_ranges = [[b] for b in self.byte_bounds]
+        self.segments = [(start, end, n, 0) for n, (start, end) in enumerate(self.physical_bounds, start=1)]
+        return self.bounds
+
+    def report(self) -> Dict[str, Any]:
+        count = len(self.serving_tokens)
+        return {
+            "strategy": self.strategy,
+            "servings": count,
+            "fill_ratio": round(sum(self.serving_tokens) / (count * self.serving_size), 4) if count else 0.0,
+            "min_fill_ratio": round(min(self.serving_tokens) / self.serving_size, 4) if count else 0.0,
+        }
+
+
+def plan_servings(
+    line_tokens: Sequence[int],
     serving_size: int,
-    file_metadata: list,
-    encoding_name: str = "cl100k_base",
-    add_line_numbers: bool = False,
-    skip_empty_lines: bool = False
-) -> int:
-    """
-    Splits masterfile.txt into serving_XXX.txt files based on token count, using file_metadata for markers.
-    Returns the number of servings created.
-    """
-    enc = tiktoken.get_encoding(encoding_name)
-    serving_number = 1
-    current_serving_tokens = 0
-    current_serving_lines = []
-    serving_files = []
-    def write_chunk(serving_number, lines, total_chunks):
-        serving_path = output_dir / f"serving_{serving_number}_of_{total_chunks}.txt"
-        with open(serving_path, "w", encoding="utf-8") as f:
-            if serving_number < total_chunks:
-                comment = f"# [LMTokenCook] This is chunk {serving_number} of {total_chunks}. Do not respond yet, more chunks are coming."
+    overhead: int = 0,
+    final_overhead: Optional[int] = None
+) -> List[Tuple[int, int]]:
+    """
+    Greedily packs lines into servings using precomputed per-line token counts.
+    Returns a list of (start, end) line index ranges, one per serving.
+    """
+    planner = ServingPlanner(serving_size, overhead, final_overhead)
+    for line_tokens_count in line_tokens:
+        planner.add(line_tokens_count)
+    return planner.finish()
+
+
+def _pack_greedy(prefix: Sequence[int], limit: int, final_limit: int, lo: int = 0, hi: Optional[int] = None) -> List[Tuple[int, int]]:
+    """
+    Greedy packing of lines lo..hi given prefix sums of their costs, with the
+    same last-serving rule as ServingPlanner. Returns (start, end) line ranges.
+    """
+    hi = len(prefix) - 1 if hi is None else hi
+    bounds = []
+    start = lo
+    while start < hi:
+        end = max(bisect.bisect_right(prefix, prefix[start] + limit, start + 1, hi + 1) - 1, start + 1)
+        bounds.append((start, end))
+        start = end
+    if bounds:
+        start, end = bounds[-1]
+        if prefix[end] - prefix[start] > final_limit:
+            cut = bisect.bisect_left(prefix, prefix[end] - final_limit, start, end)
+            bounds[-1:] = [(start, cut), (cut, end)]
+    return bounds
+
+
+class _RecordingPlanner(ServingPlanner):
+    """
+    Base for the offline strategies: keeps prefix sums of every master line's
+    cost, bytes and physical lines (24 bytes per line) and plans in finish().
+    """
+    def __init__(self, serving_size: int, overhead: int = 0, final_overhead: Optional[int] = None):
+        super().__init__(serving_size, overhead, final_overhead)
+        self._cost_prefix = array("Q", [0])
+        self._byte_prefix = array("Q", [0])
+        self._physical_prefix = array("Q", [0])
+        self._units = []    # (first master line, name)
+
+    def begin_unit(self, name: str):
+        self._units.append((len(self._cost_prefix) - 1, name))
+
+    def add(self, line_tokens: int, nbytes: int = 0, physical_lines: int = 1):
+        self.total_tokens += line_tokens
+        self._cost_prefix.append(self._cost_prefix[-1] + line_tokens + 1)
+        self._byte_prefix.append(self._byte_prefix[-1] + nbytes)
+        self._physical_prefix.append(self._physical_prefix[-1] + physical_lines)
+
+    def _plan(self) -> List[List[Tuple[int, int]]]:
+        raise NotImplementedError
+
+    def finish(self) -> List[Tuple[int, int]]:
+        if self.serving_ranges or len(self._cost_prefix) == 1:
+            return self.bounds
+        cost, byte, physical = self._cost_prefix, self._byte_prefix, self._physical_prefix
+        servings = self._plan()
+        self.serving_tokens = [sum(cost[e] - cost[s] for s, e in ranges) + self.overhead for ranges in servings]
+        self.serving_tokens[-1] += self.final_overhead - self.overhead
+        self.serving_ranges = [[(byte[s], byte[e]) for s, e in ranges] for ranges in servings]
+        self.bounds = [ranges[0] if len(ranges) == 1 else (ranges[0][0], ranges[-1][1]) for ranges in servings]
+        for n, ranges in enumerate(servings, start=1):
+            offset = 0
+            for s, e in ranges:
+                self.segments.append((physical[s], physical[e], n, offset))
+                offset += physical[e] - physical[s]
+        self.segments.sort()
+        return self.bounds
+
+    def report(self) -> Dict[str, Any]:
+        report = super().report()
+        # What the default strategy would have needed, for comparison
+        report["greedy_servings"] = len(_pack_greedy(self._cost_prefix, self.serving_size - self.overhead,
+                                                     self.serving_size - self.final_overhead))
+        return report
+
+
+class BalancedPlanner(_RecordingPlanner):
+    """
+    Keeps master order and never uses more servings than greedy packing, but
+    evens out how full they are. The smallest per-serving limit that still
+    achieves the greedy count bounds the fullest serving; within that limit
+    every serving then aims for an equal share of what is left, so the last
+    one is not left nearly empty either.
+    """
+    strategy = "balanced"
+
+    def _plan(self) -> List[List[Tuple[int, int]]]:
+        prefix = self._cost_prefix
+        lines = len(prefix) - 1
+        limit, final_limit = self.serving_size - self.overhead, self.serving_size - self.final_overhead
+        count = len(_pack_greedy(prefix, limit, final_limit))
+        # Limits are on content; the last serving's is lower by its longer closing comment
+        extra = limit - final_limit
+        lo = max(prefix[i + 1] - prefix[i] for i in range(lines))
+        hi = limit
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if len(_pack_greedy(prefix, mid, mid - extra)) <= count:
+                hi = mid
             else:
-                comment = f"# [LMTokenCook] This is chunk {serving_number} of {total_chunks}. This is everything. Make an index of all the information you’ve been provided and summarize it. Ask me what I want to do now that we're on the same page thanks to LMTokenCook by DropShock Digital."
-            f.write(comment + "\n")
-            for l in lines:
-                f.write(l + "\n")
-            f.write(comment + "\n")
-        serving_files.append(serving_path)
-
-    # Read all lines from masterfile (preserve structure, do not filter or renumber)
-    with open(master_file, "r", encoding="utf-8") as mf:
-        file_lines = [line.rstrip("\n") for line in mf]
-
-    # Count how many chunks there will be
-    enc = tiktoken.get_encoding(encoding_name)
-    temp_serving_tokens = 0
-    temp_serving_count = 1
-    for line in file_lines:
-        line_tokens = len(enc.encode(line))
-        if temp_serving_tokens + line_tokens > serving_size and temp_serving_tokens > 0:
-            temp_serving_count += 1
-            temp_serving_tokens = 0
-        temp_serving_tokens += line_tokens
-    total_chunks = temp_serving_count
-
-    # Actual chunking
-    serving_number = 1
-    current_serving_tokens = 0
-    current_serving_lines = []
-    for line in file_lines:
-        line_tokens = len(enc.encode(line))
-        if current_serving_tokens + line_tokens > serving_size and current_serving_tokens > 0:
-            write_chunk(serving_number, current_serving_lines, total_chunks)
-            serving_number += 1
-            current_serving_lines = []
-            current_serving_tokens = 0
-        current_serving_lines.append(line)
-        current_serving_tokens += line_tokens
-    if current_serving_lines:
-        write_chunk(serving_number, current_serving_lines, total_chunks)
-    return len(serving_files)
-
-    import string
-    allowed = set(map(chr, range(32, 127)))
-    with open(master_file, "r", encoding="utf-8") as mf:
-        file_lines = mf.readlines()
-    filtered_lines = []
-    for idx, line in enumerate(file_lines, 1):
-        line = line.rstrip("\n")
-        if not all(c in allowed for c in line):
-            continue
-        if skip_empty_lines and not line.strip():
-            continue
-        if add_line_numbers:
-            filtered_lines.append(f"{idx:04d} {line}")
-        else:
-            filtered_lines.append(line)
-    file_lines = filtered_lines
-
-    # Servinging logic
-    enc = tiktoken.get_encoding(encoding_name)
-    serving_number = 1
-    current_serving_tokens = 0
-    current_serving_lines = []
-    serving_files = []
-    total_chunks = 0
-    # First, count how many chunks there will be
-    temp_serving_tokens = 0
-    temp_serving_count = 1
-    for line in file_lines:
-        line_tokens = len(enc.encode(line))
-        if temp_serving_tokens + line_tokens > serving_size and temp_serving_tokens > 0:
-            temp_serving_count += 1
-            temp_serving_tokens = 0
-        temp_serving_tokens += line_tokens
-    total_chunks = temp_serving_count
-    # Now do the actual chunking
-    for line in file_lines:
-        line_tokens = len(enc.encode(line))
-        if current_serving_tokens + line_tokens > serving_size and current_serving_tokens > 0:
-            write_chunk(serving_number, current_serving_lines, total_chunks)
-            serving_number += 1
-            current_serving_lines = []
-            current_serving_tokens = 0
-        current_serving_lines.append(line)
-        current_serving_tokens += line_tokens
-    if current_serving_lines:
-        write_chunk(serving_number, current_serving_lines, total_chunks)
-    return len(serving_files)
-
-    import string
-    allowed = set(map(chr, range(32, 127)))
-    with open(master_file, "r", encoding="utf-8") as mf:
-        file_lines = mf.readlines()
-    filtered_lines = []
-    for idx, line in enumerate(file_lines, 1):
-        line = line.rstrip("\n")
-        if not all(c in allowed for c in line):
-            continue
-        if skip_empty_lines and not line.strip():
-            continue
-        if add_line_numbers:
-            filtered_lines.append(f"{idx:04d} {line}")
+                lo = mid + 1
+        limit, final_limit = lo, lo - extra
+        # Greedy from the end gives the fewest servings, and latest[k] the latest
+        # line the last k + 1 servings can start at
+        latest = []
+        end = lines
+        while end > 0 or not latest:
+            start = bisect.bisect_left(prefix, prefix[end] - (limit if latest else final_limit), 0, end)
+            latest.append(start)
+            end = start
+        count = len(latest)
+        bounds = []
+        start = 0
+        for remaining in range(count, 1, -1):
+            # An equal share of what is left, the closing comment's extra tokens included
+            target = prefix[start] + (prefix[lines] - prefix[start] + extra) / remaining
+            reach = max(bisect.bisect_right(prefix, prefix[start] + limit, start + 1, lines + 1) - 1, start + 1)
+            end = bisect.bisect_left(prefix, target, start + 1, reach)
+            if end > start + 1 and target - prefix[end - 1] < prefix[end] - target:
+                end -= 1
+            end = min(max(end, latest[remaining - 2]), reach)
+            bounds.append((start, end))
+            start = end
+        bounds.append((start, lines))
+        return [[b] for b in bounds]
+
+
+class _FirstFit:
+    """Max segment tree over bins' free space: first bin with room for `size` in O(log n)."""
+    def __init__(self):
+        self._size = 1
+        self._tree = [-1, -1]
+        self.free = []
+
+    def _set(self, i: int, value: int):
+        i += self._size
+        self._tree[i] = value
+        while i > 1:
+            i //= 2
+            self._tree[i] = max(self._tree[2 * i], self._tree[2 * i + 1])
+
+    def find(self, size: int) -> Optional[int]:
+        if self._tree[1] < size:
+            return None
+        i = 1
+        while i < self._size:
+            i = 2 * i if self._tree[2 * i] >= size else 2 * i + 1
+        return i - self._size
+
+    def open(self, free: int) -> int:
+        if len(self.free) == self._size:
+            leaves = self._tree[self._size:]
+            self._size *= 2
+            self._tree = [-1] * self._size + leaves + [-1] * (self._size - len(leaves))
+            for i in range(self._size - 1, 0, -1):
+                self._tree[i] = max(self._tree[2 * i], self._tree[2 * i + 1])
+        self.free.append(free)
+        self._set(len(self.free) - 1, free)
+        return len(self.free) - 1
+
+    def take(self, i: int, size: int):
+        self.free[i] -= size
+        self._set(i, self.free[i])
+
+
+class FilePacker(_RecordingPlanner):
+    """
+    Keeps files whole where they fit. Whole directory subtrees that fit in a
+    serving are packed as one item, otherwise their children are; items are
+    then placed first-fit-decreasing. Within a serving items keep master
+    order, and servings are ordered by their earliest content, so the
+    directory tree stays in serving 1 and neighbouring files stay together.
+    Files too big for a serving get servings of their own, split by line.
+    If the last serving has no room for the longer closing comment, its
+    trailing lines move into a serving of their own, as with greedy packing.
+    """
+    strategy = "files"
+
+    def _items(self, units: List[Tuple[int, int, Tuple[str, ...]]], capacity: int) -> List[Tuple[int, int]]:
+        prefix = self._cost_prefix
+        items = []
+        stack = [(0, len(units), 0)]
+        while stack:
+            lo, hi, depth = stack.pop()
+            if hi - lo == 1 or prefix[units[hi - 1][1]] - prefix[units[lo][0]] <= capacity:
+                items.append((units[lo][0], units[hi - 1][1]))
+                continue
+            # Split into runs of units sharing the next path component (one run per child)
+            runs = []
+            i = lo
+            while i < hi:
+                parts = units[i][2]
+                j = i + 1
+                if depth < len(parts) - 1:
+                    while j < hi and len(units[j][2]) > depth + 1 and units[j][2][depth] == parts[depth]:
+                        j += 1
+                runs.append((i, j, depth + 1))
+                i = j
+            stack.extend(reversed(runs))
+        return items
+
+    def _plan(self) -> List[List[Tuple[int, int]]]:
+        prefix = self._cost_prefix
+        lines = len(prefix) - 1
+        capacity = self.serving_size - self.overhead
+        starts = self._units if self._units and self._units[0][0] == 0 else [(0, "")] + self._units
+        units = [(start, starts[i + 1][0] if i + 1 < len(starts) else lines, tuple(name.replace(os.sep, "/").split("/")))
+                 for i, (start, name) in enumerate(starts)]
+        units = [u for u in units if u[1] > u[0]]
+        packed = []     # indexed like first_fit's bins
+        standalone = []
+        first_fit = _FirstFit()
+        for start, end in sorted(self._items(units, capacity), key=lambda item: (prefix[item[0]] - prefix[item[1]], item[0])):
+            size = prefix[end] - prefix[start]
+            if size > capacity:
+                standalone.extend([b] for b in _pack_greedy(prefix, capacity, capacity, start, end))
+                continue
+            i = first_fit.find(size)
+            if i is None:
+                i = first_fit.open(capacity)
+                packed.append([])
+            first_fit.take(i, size)
+            packed[i].append((start, end))
+        servings = []
+        for ranges in packed + standalone:
+            ranges.sort()
+            merged = [ranges[0]]
+            for start, end in ranges[1:]:
+                if start == merged[-1][1]:
+                    merged[-1] = (merged[-1][0], end)
+                else:
+                    merged.append((start, end))
+            servings.append(merged)
+        servings.sort()
+        return self._fit_final(servings)
+
+    def _fit_final(self, servings: List[List[Tuple[int, int]]]) -> List[List[Tuple[int, int]]]:
+        prefix = self._cost_prefix
+        final_limit = self.serving_size - self.final_overhead
+        last = servings[-1]
+        if sum(prefix[e] - prefix[s] for s, e in last) <= final_limit:
+            return servings
+        # Longest run of trailing lines (in serving order) that fits the closing serving
+        tail = []
+        room = final_limit
+        for s, e in reversed(last):
+            if prefix[e] - prefix[s] <= room:
+                tail.insert(0, (s, e))
+                room -= prefix[e] - prefix[s]
+                continue
+            cut = bisect.bisect_left(prefix, prefix[e] - room, s, e)
+            if cut < e:
+                tail.insert(0, (cut, e))
+            break
+        if not tail:
+            # Not even the last line fits: as with greedy, the closing serving carries only its comments
+            tail = [(last[-1][1], last[-1][1])]
+        head = last[:len(last) - len(tail)]
+        if tail[0][0] != last[len(head)][0]:
+            head.append((last[len(head)][0], tail[0][0]))
+        return servings[:-1] + [head, tail]
+
+
+def make_planner(strategy: str, serving_size: int, overhead: int = 0, final_overhead: Optional[int] = None) -> ServingPlanner:
+    planners = {"greedy": ServingPlanner, "files": FilePacker, "balanced": BalancedPlanner}
+    if strategy not in planners:
+        raise ValueError(f"Unknown packing strategy: {strategy}")
+    return planners[strategy](serving_size, overhead, final_overhead)
+
+
+class MasterSpool:
+    """
+    Append-only master file on disk. Lines are written as they are produced and
+    fed to a ServingPlanner, so servings can later be copied out of the spool
+    by byte range instead of keeping the master text in memory.
+    With path=None the spool is an in-memory buffer instead.
+    `timings` holds the [wall, cpu] seconds spent writing ("write") and
+    planning ("pack"), and bytes_written the spool's size so far.
+    """
+    def __init__(self, path: Optional[pathlib.Path], planner: ServingPlanner):
+        self.path = pathlib.Path(path) if path is not None else None
+        self.planner = planner
+        self.line_count = 0     # physical lines written so far
+        self.bytes_written = 0
+        self.timings = {}
+        self.closed = False
+        self._f = open(self.path, "wb") if self.path is not None else io.BytesIO()
+
+    def write_lines(self, lines: Sequence[str], line_tokens: Sequence[int], unit: Optional[str] = None):
+        start = clock()
+        encoded = [_encode_line(line) for line in lines]
+        data = b"".join(encoded)
+        self._f.write(data)
+        self.bytes_written += len(data)
+        start = lap(self.timings, "write", start)
+        if unit is not None:
+            self.planner.begin_unit(unit)
+        add = self.planner.add
+        for line, data, line_tokens_count in zip(lines, encoded, line_tokens):
+            physical_lines = line.count("\n") + 1
+            add(line_tokens_count, len(data), physical_lines)
+            self.line_count += physical_lines
+        lap(self.timings, "pack", start)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        start = clock()
+        if self.path is not None:
+            self._f.close()
+        start = lap(self.timings, "write", start)
+        self.planner.finish()
+        lap(self.timings, "pack", start)
+
+    def reader(self):
+        """Context manager giving a seekable binary file over the spool, once closed."""
+        if self.path is None:
+            return nullcontext(self._f)
+        return open(self.path, "rb")
+
+    def discard(self):
+        """Closes the spool and drops its content."""
+        self.close()
+        if self.path is not None:
+            self.path.unlink(missing_ok=True)
         else:
-            filtered_lines.append(line)
-    file_lines = filtered_lines
-    for file_info in file_metadata:
-        # Write file start marker
-        start_marker = file_info["start_marker"]
-        end_marker = file_info["end_marker"]
-        content = file_info["content"]
-        file_lines = [start_marker, content, end_marker]
-        # Split content into lines for token counting
-        for line in file_lines:
-            line_tokens = len(enc.encode(line))
-            if current_serving_tokens + line_tokens > serving_size and current_serving_tokens > 0:
-                # Write current chunk and start new one
-                write_chunk(serving_number, current_serving_lines)
-                serving_number += 1
-                current_serving_lines = []
-                current_serving_tokens = 0
-            current_serving_lines.append(line)
-            current_serving_tokens += line_tokens
-    if current_serving_lines:
-        write_chunk(serving_number, current_serving_lines)
-    return len(serving_files)
+            self._f = io.BytesIO()
+
+
+def iter_serving_data(spool, serving_ranges: Sequence[Sequence[Tuple[int, int]]]) -> Iterator[Tuple[int, str, bytes]]:
+    """
+    Yields (serving_number, file name, content) per serving, header and footer
+    included, by copying the serving's byte ranges out of spool (a seekable
+    binary file). Only one serving is held in memory at a time.
+    """
+    total_chunks = len(serving_ranges)
+    for serving_number, ranges in enumerate(serving_ranges, start=1):
+        comment = _encode_line(serving_comment(serving_number, total_chunks))
+        parts = [comment]
+        for start, end in ranges:
+            spool.seek(start)
+            parts.append(spool.read(end - start))
+        parts.append(comment)
+        yield serving_number, serving_name(serving_number, total_chunks), b"".join(parts)
+
+
+def serving_name(serving_number: int, total_chunks: int) -> str:
+    return f"serving_{serving_number}_of_{total_chunks}.txt"
+
+
+class ServingWriter:
+    """
+    Publishes files into output_dir from a background thread. put() hands over
+    a file's complete content; the thread writes it with a single call to a
+    hidden temporary name and os.replace()s it into place, so a reader never
+    sees a half-written serving. At most max_pending files wait in the queue,
+    which bounds memory when the disk is slower than the producer.
+    """
+    def __init__(self, output_dir: pathlib.Path, max_pending: int = WRITE_QUEUE_SIZE):
+        self.output_dir = pathlib.Path(output_dir)
+        self.bytes_written = 0
+        self.files_written = 0
+        self._queue = queue.Queue(max_pending)
+        self._error = None
+        self._aborted = False
+        self._thread = threading.Thread(target=self._run, name="lmtc-writer", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                if self._error is not None or self._aborted:
+                    # Keep draining so put() never blocks on a dead writer
+                    continue
+                name, data = item
+                self._publish(name, data)
+                self.files_written += 1
+            except BaseException as e:
+                self._error = e
+            finally:
+                self._queue.task_done()
+
+    def _publish(self, name: str, data: bytes):
+        tmp = self.output_dir / f".{name}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, self.output_dir / name)
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+        self.bytes_written += len(data)
+
+    def put(self, name: str, data: bytes):
+        if self._error is not None:
+            raise self._error
+        self._queue.put((name, data))
+
+    def flush(self):
+        """Waits until every file queued so far is published; re-raises the first write error."""
+        if self._thread.is_alive():
+            self._queue.join()
+        if self._error is not None:
+            raise self._error
+
+    def close(self):
+        """Waits for every queued file to be published; re-raises the first write error."""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+    def abort(self):
+        """Stops after the file being written; queued files are dropped."""
+        self._aborted = True
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+
+def write_servings(
+    servings: Iterable,
+    output_dir: Optional[pathlib.Path],
+    previous_hashes: Optional[Dict[str, str]] = None,
+    writer: Optional[ServingWriter] = None
+) -> List[Dict[str, Any]]:
+    """
+    Writes serving_N_of_M.txt files from servings (cook.Serving objects, as
+    yielded by Cook.servings). Servings are written by a ServingWriter thread,
+    so cutting them out of the spool overlaps with disk writes; only a few
+    servings are held in memory at a time.
+    With previous_hashes ({file name: sha256}), a serving whose file already
+    exists with the same content is left untouched.
+    A writer passed in (e.g. an archive.ArchiveWriter) is used instead of
+    writing into output_dir and is left open for the caller to close.
+    Returns one {"file", "sha256", "written", "tokens"} entry per serving.
+    """
+    written_servings = []
+    own_writer = writer is None
+    if own_writer:
+        writer = ServingWriter(output_dir)
+    try:
+        for serving in servings:
+            name = serving.file_name
+            written = not (previous_hashes and output_dir is not None and previous_hashes.get(name) == serving.sha256 and (output_dir / name).is_file())
+            if written:
+                writer.put(name, serving.data)
+            written_servings.append({"file": name, "sha256": serving.sha256, "written": written, "tokens": serving.tokens})
+    except BaseException:
+        writer.abort()
+        raise
+    if own_writer:
+        writer.close()
+    return written_servings
+
+
+def locate_lines(segments: Sequence[Tuple[int, int, int, int]], start: int, end: int) -> List[Tuple[int, int, int]]:
+    """
+    Maps a master line range [start, end) (physical lines, 0-based) onto the
+    servings. `segments` is a planner's (master_start, master_end,
+    serving_number, offset_in_serving) list, sorted by master_start.
+    Returns (serving_number, first_line, last_line) triples with 1-based,
+    inclusive line numbers inside each serving file (line 1 is the header).
+    """
+    spans = []
+    first = bisect.bisect_right(segments, start, key=lambda s: s[0]) - 1
+    for segment_start, segment_end, serving_number, offset in segments[max(first, 0):]:
+        if segment_start >= end:
+            break
+        lo, hi = max(start, segment_start), min(end, segment_end)
+        if lo < hi:
+            spans.append((serving_number, lo - segment_start + offset + 2, hi - segment_start + offset + 1))
+    return spans
+
+
+def serving_byte_segments(serving_ranges: Sequence[Sequence[Tuple[int, int]]]) -> List[Tuple[int, int, int, int]]:
+    """
+    The byte counterpart of a planner's segments: (spool_start, spool_end,
+    serving_number, offset_in_serving) per spool range, sorted by spool_start.
+    Offsets count the serving's header line.
+    """
+    total_chunks = len(serving_ranges)
+    segments = []
+    for n, ranges in enumerate(serving_ranges, start=1):
+        offset = len(_encode_line(serving_comment(n, total_chunks)))
+        for start, end in ranges:
+            segments.append((start, end, n, offset))
+            offset += end - start
+    segments.sort()
+    return segments
+
+
+def locate_bytes(segments: Sequence[Tuple[int, int, int, int]], start: int, end: int) -> List[Tuple[int, int, int]]:
+    """
+    Maps a spool byte range [start, end) onto the servings, given
+    serving_byte_segments(). Returns (serving_number, byte_start, byte_end)
+    triples, 0-based and end-exclusive within each serving file, in the same
+    order as locate_lines() returns the matching line range.
+    """
+    spans = []
+    first = bisect.bisect_right(segments, start, key=lambda s: s[0]) - 1
+    for segment_start, segment_end, serving_number, offset in segments[max(first, 0):]:
+        if segment_start >= end:
+            break
+        lo, hi = max(start, segment_start), min(end, segment_end)
+        if lo < hi:
+            spans.append((serving_number, lo - segment_start + offset, hi - segment_start + offset))
+    return spans
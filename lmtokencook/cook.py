@@ -0,0 +1,360 @@
+import hashlib
+import os
+import pathlib
+from array import array
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List
+from lmtokencook.scanner import scan_directory, count_skipped, DEFAULT_MAX_FILE_BYTES
+from lmtokencook.extractors import get_extractor
+from lmtokencook.pipeline import iter_file_records, directory_tree_lines, DEFAULT_STREAM_MIN_BYTES
+from lmtokencook.manifest import EntrySpool
+from lmtokencook.chunker import (make_planner, MasterSpool, iter_serving_data, serving_name, serving_overhead, locate_lines,
+                                 locate_bytes, serving_byte_segments, DEFAULT_PACKING)
+from lmtokencook.tokens import count_tokens
+from lmtokencook.tokenizers import get_encoding, DEFAULT_ENCODING
+from lmtokencook.sanitize import DEFAULT_SANITIZE_MODE
+from lmtokencook.cache import ExtractionCache, DEFAULT_CACHE_SIZE_MB
+from lmtokencook.instrument import Instrumentation, clock
+
+
+class CancelledError(Exception):
+    pass
+
+
+@dataclass
+class Serving:
+    """
+    One serving of a cook. `data` is the serving file's exact content, header
+    and footer comments included; `sources` (when requested) lists the files
+    whose content it holds, each with the line and byte range it occupies in
+    this serving (same fields as the manifest's servings spans). An input that
+    fits in chunk_size comes out as a single master serving without comments.
+    """
+    index: int
+    total: int
+    file_name: str
+    data: bytes
+    tokens: int
+    sha256: str
+    sources: List[dict] = field(default_factory=list)
+
+    @property
+    def text(self) -> str:
+        return self.data.decode("utf-8")
+
+
+class Cook:
+    """
+    Scans, extracts and plans one input, then hands out its servings: the
+    shared core of run_lmtokencook (which writes them to disk) and cook()
+    (which yields them). The master spool is kept in work_dir, or in memory
+    when work_dir is None; manifest entries are kept in memory, or in
+    work_dir with manifest_format="jsonl".
+
+    Call scan() and extract(), then servings(), iter_entries() and
+    files_split() as needed, and close() to drop the spool.
+    """
+    def __init__(self, input_path, chunk_size=28000, add_line_numbers=False, skip_empty_lines=False, workers=1, cache_dir=None, cache_size_mb=DEFAULT_CACHE_SIZE_MB, scan_threads=1, ignore_patterns=None, use_gitignore=True, sanitize=DEFAULT_SANITIZE_MODE, packing=DEFAULT_PACKING, encoding=DEFAULT_ENCODING, stream_min_bytes=DEFAULT_STREAM_MIN_BYTES, pdf_max_pages=None, pdf_workers=None, max_file_bytes=DEFAULT_MAX_FILE_BYTES, work_dir=None, manifest_format="json", baseline=None, token_memo=None, instrument=None, progress_callback=None, cancel_flag=None):
+        self.input_path = pathlib.Path(input_path)
+        if not self.input_path.exists():
+            raise FileNotFoundError(f"Input path does not exist: {self.input_path}")
+        self.chunk_size = chunk_size
+        self.add_line_numbers = add_line_numbers
+        self.skip_empty_lines = skip_empty_lines
+        self.workers = workers
+        self.cache_dir = cache_dir
+        self.cache_size_mb = cache_size_mb
+        self.scan_threads = scan_threads
+        self.ignore_patterns = ignore_patterns
+        self.use_gitignore = use_gitignore
+        self.sanitize = sanitize
+        self.encoding = encoding
+        self.stream_min_bytes = stream_min_bytes
+        self.pdf_max_pages = pdf_max_pages
+        # Split long PDFs over the cores unless files are already cooked in parallel
+        self.pdf_workers = pdf_workers if pdf_workers is not None else (os.cpu_count() or 1) if workers <= 1 else 1
+        self.max_file_bytes = max_file_bytes
+        self.work_dir = pathlib.Path(work_dir) if work_dir is not None else None
+        self.manifest_format = manifest_format
+        self.baseline = baseline
+        # Refilled by extract() with every cooked file's line token counts, for
+        # the next Baseline (see incremental.Baseline)
+        self.token_memo = token_memo
+        self.instrument = instrument if instrument is not None else Instrumentation()
+        self.progress_callback = progress_callback
+        self.cancel_flag = cancel_flag
+
+        # Every serving, header and footer included, must fit in chunk_size tokens
+        self.enc = get_encoding(encoding)
+        self.planner = make_planner(packing, chunk_size, serving_overhead(self.enc), serving_overhead(self.enc, final=True))
+        self.cook_options = {"encoding": encoding, "add_line_numbers": add_line_numbers, "skip_empty_lines": skip_empty_lines,
+                             "sanitize": sanitize, "max_line_tokens": self.planner.max_line_tokens}
+        if pdf_max_pages is not None:
+            self.cook_options["pdf_max_pages"] = pdf_max_pages
+
+        self.files = []
+        self.dir_struct = {}
+        self.base_path = None
+        self.scan_counts = {}
+        self.incremental = None
+        self.spool = None
+        # Manifest entries wait on disk for a jsonl manifest, in memory for manifest.json;
+        # nothing is written before extract(), so a bad option fails with no output touched
+        self.entries = []
+        # Per cooked file: first content line, end of content (master file lines)
+        # and the same range in spool bytes; cooked_paths has the matching paths
+        self.content_positions = array("q")
+        self.cooked_paths = []
+        self._byte_segments = None
+
+    def _progress(self, *args):
+        if self.progress_callback:
+            self.progress_callback(*args)
+
+    @property
+    def total_tokens(self) -> int:
+        # Comes from the same per-line counts the serving planner uses
+        return self.planner.total_tokens
+
+    @property
+    def chunked(self) -> bool:
+        return self.total_tokens > self.chunk_size
+
+    @property
+    def master_name(self) -> str:
+        return f"masterfile.t-{self.total_tokens}.txt"
+
+    def scan(self):
+        input_path = self.input_path
+        stage_start = clock()
+        self._progress("Scanning pantry for ingredients...")
+        if input_path.is_dir():
+            self.files, self.dir_struct = scan_directory(input_path, threads=self.scan_threads, ignore_patterns=self.ignore_patterns,
+                                                         use_gitignore=self.use_gitignore, max_file_bytes=self.max_file_bytes)
+        else:
+            self.files = [input_path]
+            self.dir_struct = {input_path.name: {"processed": True, "rel_path": input_path.name}}
+        self.base_path = input_path.parent if input_path.is_file() else input_path
+        self.scan_counts = {
+            "scanned": len(self.files),
+            "processed": 0,
+            "skipped_binary": count_skipped(self.dir_struct, "binary") + count_skipped(self.dir_struct, "too_large"),
+            "skipped_symlink": 0,
+            "skipped_ignored": count_skipped(self.dir_struct, "ignored"),
+            "failed_extraction": 0,
+            "estimated_tokens": 0,
+            "dropped_lines": 0,
+            "stripped_chars": 0,
+            "split_lines": 0,
+            "cache_hits": 0,
+            "cache_misses": 0,
+        }
+        baseline = self.baseline
+        if baseline is not None:
+            self.incremental = baseline.classify(self.files, self.base_path, reuse_content=baseline.compatible(self.cook_options))
+            self.incremental["baseline"] = str(baseline.output_dir)
+            incremental = self.incremental
+            self._progress(f"Re-cooking: {incremental['added']} added, {incremental['modified']} modified, "
+                           f"{incremental['removed']} removed, {incremental['unchanged']} unchanged.")
+        self.instrument.add_since("scan", stage_start, items=len(self.files))
+        self.instrument.end_stage("scan")
+
+    def extract(self):
+        """
+        Extracts every scanned file straight into the master spool in scan order
+        (even with workers), so only one file's lines are held in memory at a
+        time, and finishes the serving plan.
+        """
+        if self.manifest_format == "jsonl" and self.work_dir is not None:
+            self.entries = EntrySpool(self.work_dir / ".manifest.entries")
+        files, base_path, scan_counts, entries = self.files, self.base_path, self.scan_counts, self.entries
+        baseline = self.baseline
+        reuse = (lambda f: baseline.reuse_record(f, base_path, self.enc)) if baseline is not None else None
+        char_offset = 0
+        spool = self.spool = MasterSpool(self.work_dir / ".masterfile.spool" if self.work_dir is not None else None, self.planner)
+        cache = ExtractionCache(self.cache_dir, self.cache_size_mb * 1024 * 1024) if self.cache_dir else None
+        memo = {} if self.token_memo is not None else None
+        try:
+            # Write directory tree as Ingredients
+            tree_lines = directory_tree_lines(self.dir_struct)
+            tree_tokens = count_tokens(tree_lines, self.enc)
+            for line, tokens in zip(tree_lines, tree_tokens):
+                self._check_line(tokens, f"directory tree line {line.strip()!r}")
+            spool.write_lines(tree_lines, tree_tokens, unit="")
+            file_records = iter_file_records(files, base_path, self.encoding, self.add_line_numbers, self.skip_empty_lines, self.workers,
+                                             cache, reuse, self.sanitize, self.planner.max_line_tokens, self.stream_min_bytes,
+                                             self.pdf_max_pages, self.pdf_workers)
+            for idx, record in enumerate(file_records):
+                if self.cancel_flag is not None and self.cancel_flag.is_set():
+                    file_records.close()
+                    self._progress("Cooking cancelled by chef!")
+                    raise CancelledError("Processing was cancelled by user.")
+                if not record.ok:
+                    scan_counts["failed_extraction"] += 1
+                    entries.append({
+                        "relative_path": record.relative_path,
+                        "absolute_path": record.absolute_path,
+                        "extraction_status": record.status,
+                        "encoding_used": None
+                    })
+                    self._progress(f"[BURNT] {record.absolute_path}: {record.status[len('Error: '):]}")
+                    continue
+                # Content lines are split to max_line_tokens, the path markers cannot be
+                self._check_line(max(record.line_tokens[0], record.line_tokens[-1]), f"path {record.absolute_path}")
+                spool.write_lines(record.lines[:1], record.line_tokens[:1], unit=record.relative_path)
+                content_start, byte_start = spool.line_count, spool.bytes_written
+                if record.content_batches is None:
+                    spool.write_lines(record.lines[1:-1], record.line_tokens[1:-1])
+                    content_lines = len(record.lines) - 2
+                    if memo is not None:
+                        memo[record.relative_path] = (record.sha256, array("q", record.line_tokens))
+                else:
+                    # Streamed file: content goes to the spool batch by batch, between the markers
+                    # (and is left out of the token memo, which would grow with it)
+                    content_lines = 0
+                    for lines, line_tokens in record.content_batches:
+                        spool.write_lines(lines, line_tokens)
+                        content_lines += len(lines)
+                self.content_positions.extend((content_start, spool.line_count, byte_start, spool.bytes_written))
+                self.cooked_paths.append(record.relative_path)
+                spool.write_lines(record.lines[-1:], record.line_tokens[-1:])
+                scan_counts["processed"] += 1
+                scan_counts["estimated_tokens"] += record.tokens
+                scan_counts["dropped_lines"] += record.dropped_lines
+                scan_counts["stripped_chars"] += record.stripped_chars
+                scan_counts["split_lines"] += record.split_lines
+                char_start = char_offset
+                char_offset += record.char_count
+                entry = {
+                    "relative_path": record.relative_path,
+                    "absolute_path": record.absolute_path
+                }
+                if self.manifest_format == "json":
+                    # Offsets into the concatenated extracted texts, kept for existing readers
+                    entry["char_start_offset"] = char_start
+                    entry["char_end_offset"] = char_offset
+                entry.update({
+                    "char_count": char_offset - char_start,
+                    "estimated_tokens": record.tokens,
+                    "extraction_status": "Success",
+                    "encoding_used": "utf-8",
+                    "size_bytes": record.size_bytes,
+                    "mtime_ns": record.mtime_ns,
+                    "sha256": record.sha256,
+                    "content_lines": content_lines,
+                    "dropped_lines": record.dropped_lines,
+                    "stripped_chars": record.stripped_chars,
+                    "split_lines": record.split_lines
+                })
+                if record.pages is not None:
+                    entry["pages_total"] = record.pages_total
+                    entry["pages"] = record.pages
+                entries.append(entry)
+                self.instrument.add_file(record, type(get_extractor(pathlib.Path(record.relative_path).suffix.lower())).__name__)
+                pages_note = f", first {len(record.pages)} of {record.pages_total} pages" if record.pages is not None and len(record.pages) < record.pages_total else ""
+                self._progress(f"[COOK] {record.absolute_path} ({record.tokens} tokens{pages_note})", idx+1, len(files))
+        except BaseException:
+            self.close()
+            raise
+        finally:
+            if cache is not None:
+                scan_counts["cache_hits"] = cache.hits
+                scan_counts["cache_misses"] = cache.misses
+                cache.close()
+        spool.close()
+        if memo is not None:
+            self.token_memo.clear()
+            self.token_memo.update(memo)
+
+        instrument = self.instrument
+        for stage in ("extract", "sanitize", "tokenize"):
+            instrument.end_stage(stage)
+        instrument.add("pack", *spool.timings.get("pack", (0.0, 0.0)), tokens=self.total_tokens, items=len(self.planner.serving_ranges))
+        instrument.end_stage("pack")
+        instrument.add("write", *spool.timings.get("write", (0.0, 0.0)), bytes_out=spool.bytes_written)
+
+    def _check_line(self, tokens: int, what: str):
+        # A line longer than max_line_tokens would make its serving overflow chunk_size
+        if tokens > self.planner.max_line_tokens:
+            raise ValueError(f"chunk_size {self.chunk_size} is too small for {what}: it takes {tokens} tokens "
+                             f"and a serving has room for {self.planner.max_line_tokens} per line")
+
+    def content_servings(self, slot: int) -> List[Dict]:
+        """The manifest's servings spans for the slot-th cooked file."""
+        start, end, byte_start, byte_end = self.content_positions[4 * slot:4 * slot + 4]
+        if not self.chunked:
+            return [{"file": self.master_name, "line_start": start + 1, "line_end": end,
+                     "byte_start": byte_start, "byte_end": byte_end}] if end > start else []
+        if self._byte_segments is None:
+            self._byte_segments = serving_byte_segments(self.planner.serving_ranges)
+        num_chunks = len(self.planner.serving_ranges)
+        return [
+            {"file": serving_name(n, num_chunks), "line_start": first, "line_end": last, "byte_start": lo, "byte_end": hi}
+            for (n, first, last), (_, lo, hi) in zip(locate_lines(self.planner.segments, start, end),
+                                                       locate_bytes(self._byte_segments, byte_start, byte_end))
+        ]
+
+    def files_split(self) -> int:
+        return sum(1 for slot in range(len(self.cooked_paths)) if len(self.content_servings(slot)) > 1)
+
+    def iter_entries(self) -> Iterator[Dict]:
+        """Manifest entries in scan order, each cooked file's with its servings spans."""
+        slots = iter(range(len(self.cooked_paths)))
+        for entry in self.entries:
+            if entry["extraction_status"] == "Success":
+                entry["servings"] = self.content_servings(next(slots))
+            yield entry
+
+    def _sources(self) -> Dict[str, List[Dict]]:
+        sources = {}
+        for slot, path in enumerate(self.cooked_paths):
+            for span in self.content_servings(slot):
+                span = dict(span)
+                sources.setdefault(span.pop("file"), []).append({"relative_path": path, **span})
+        return sources
+
+    def servings(self, with_sources: bool = False) -> Iterator[Serving]:
+        """
+        Yields the servings in order, one in memory at a time, or the whole
+        master text as a single serving when the input fits in chunk_size.
+        """
+        sources = self._sources() if with_sources else {}
+        with self.spool.reader() as spool:
+            if not self.chunked:
+                spool.seek(0)
+                data = spool.read()
+                yield Serving(1, 1, self.master_name, data, self.total_tokens, hashlib.sha256(data).hexdigest(),
+                              sources.get(self.master_name, []))
+                return
+            total = len(self.planner.serving_ranges)
+            for (n, name, data), tokens in zip(iter_serving_data(spool, self.planner.serving_ranges), self.planner.serving_tokens):
+                yield Serving(n, total, name, data, tokens, hashlib.sha256(data).hexdigest(), sources.get(name, []))
+
+    def close(self):
+        """Drops the spool and any on-disk manifest entries."""
+        if self.spool is not None:
+            self.spool.discard()
+        if isinstance(self.entries, EntrySpool):
+            self.entries.close()
+
+
+def cook(input_path, chunk_size=28000, **options) -> Iterator[Serving]:
+    """
+    Cooks input_path without writing anything: a lazy iterator of Serving
+    objects (text, token count, index and total, source file spans). Nothing
+    happens until the first serving is requested; the master text is then
+    spooled in memory (or in options["work_dir"]) and servings are cut from
+    it one at a time. Takes the same options as run_lmtokencook where they
+    apply, plus with_sources=False to skip the source spans.
+
+        for serving in cook("my_project", chunk_size=60000):
+            send(serving.text)
+    """
+    with_sources = options.pop("with_sources", True)
+    kitchen = Cook(input_path, chunk_size, **options)
+    try:
+        kitchen.scan()
+        kitchen.extract()
+        yield from kitchen.servings(with_sources=with_sources)
+    finally:
+        kitchen.close()
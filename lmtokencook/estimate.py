@@ -0,0 +1,235 @@
+import heapq
+import os
+import pathlib
+import time
+from typing import Dict, List, Optional, Sequence
+from lmtokencook.scanner import scan_directory, count_skipped, DEFAULT_MAX_FILE_BYTES
+from lmtokencook.extractors import get_extractor, PlainTextExtractor
+from lmtokencook.pipeline import iter_file_records, directory_tree_lines, file_block
+from lmtokencook.chunker import make_planner, serving_overhead, DEFAULT_PACKING
+from lmtokencook.tokens import count_tokens, count_line_tokens
+from lmtokencook.tokenizers import get_encoding, ApproxEstimator, DEFAULT_ENCODING
+from lmtokencook.sanitize import sanitize_lines, DEFAULT_SANITIZE_MODE
+
+# Serving sizes projected when no candidates are given: common prompt limits
+DEFAULT_CANDIDATE_SIZES = (8000, 16000, 28000, 60000, 128000)
+DEFAULT_SAMPLE_BYTES = 1024 * 1024
+
+
+def _sample_file(file_path: pathlib.Path, abs_path: str, enc, sample_bytes: int, add_line_numbers: bool,
+                 skip_empty_lines: bool, sanitize: str, size: int):
+    """
+    Tokenizes the first sample_bytes of a large plain-text file and scales the
+    result to the whole file. Returns (line_tokens, content_tokens): the
+    sampled lines' counts followed by average-sized stand-ins for the rest.
+    """
+    with open(file_path, "rb") as f:
+        data = f.read(sample_bytes)
+    # Only whole lines are sampled
+    cut = data.rfind(b"\n")
+    if 0 < cut < len(data) - 1:
+        data = data[:cut + 1]
+    lines, _, _ = sanitize_lines(data.decode("utf-8", errors="replace"), sanitize, skip_empty_lines)
+    if add_line_numbers:
+        lines = [f"{i}\t{line}" for i, line in enumerate(lines, start=1)]
+    line_tokens = count_tokens(lines, enc)
+    scale = size / max(len(data), 1)
+    sampled_tokens = sum(line_tokens)
+    content_tokens = round(sampled_tokens * scale)
+    if lines:
+        extra_lines = round(len(lines) * (scale - 1))
+        average = max(round(sampled_tokens / len(lines)), 0)
+        line_tokens.extend([average] * extra_lines)
+    start_tokens, end_tokens = count_line_tokens(file_block(abs_path, []), enc)
+    return [start_tokens, *line_tokens, end_tokens], content_tokens
+
+
+def _approx_lines(tokens: int, max_line_tokens: int) -> List[int]:
+    # A file estimated from its size alone is fed as max-size pieces
+    return [max_line_tokens] * (tokens // max_line_tokens) + ([tokens % max_line_tokens] if tokens % max_line_tokens else [])
+
+
+def estimate_lmtokencook(
+    input_path,
+    chunk_sizes: Optional[Sequence[int]] = None,
+    encoding: str = DEFAULT_ENCODING,
+    method: str = "exact",
+    sample_bytes: int = DEFAULT_SAMPLE_BYTES,
+    packing: str = DEFAULT_PACKING,
+    add_line_numbers: bool = False,
+    skip_empty_lines: bool = False,
+    sanitize: str = DEFAULT_SANITIZE_MODE,
+    workers: int = 1,
+    scan_threads: int = 1,
+    ignore_patterns: Optional[List[str]] = None,
+    use_gitignore: bool = True,
+    top_n: int = 10,
+    progress_callback=None,
+    pdf_max_pages: Optional[int] = None,
+    max_file_bytes: Optional[int] = DEFAULT_MAX_FILE_BYTES
+) -> Dict:
+    """
+    Dry run: scans and counts tokens like run_lmtokencook, but writes nothing.
+    Returns total and per-extension token counts, the largest files, and the
+    number of servings each candidate chunk size would produce.
+
+    method:
+      "exact"   - extract and tokenize every file, exactly as a cook would
+      "sampled" - like exact, but plain-text files larger than sample_bytes are
+                  tokenized from their first sample_bytes and scaled up
+      "approx"  - no extraction: byte counts through an ApproxEstimator
+                  calibrated on a few files of each type
+    """
+    if method not in ("exact", "sampled", "approx"):
+        raise ValueError(f"Unknown estimate method: {method}")
+    started = time.perf_counter()
+    input_path = pathlib.Path(input_path)
+    if not input_path.exists():
+        raise FileNotFoundError(f"Input path does not exist: {input_path}")
+    chunk_sizes = sorted(set(chunk_sizes or DEFAULT_CANDIDATE_SIZES))
+    enc = get_encoding(encoding)
+    overhead, final_overhead = serving_overhead(enc), serving_overhead(enc, final=True)
+    planners = {size: make_planner(packing, size, overhead, final_overhead) for size in chunk_sizes}
+
+    if progress_callback:
+        progress_callback("Scanning pantry for ingredients...")
+    if input_path.is_dir():
+        files, dir_struct = scan_directory(input_path, threads=scan_threads, ignore_patterns=ignore_patterns, use_gitignore=use_gitignore,
+                                           max_file_bytes=max_file_bytes)
+    else:
+        files = [input_path]
+        dir_struct = {input_path.name: {"processed": True, "rel_path": input_path.name}}
+    base_path = input_path.parent if input_path.is_file() else input_path
+
+    def _feed(unit: Optional[str], line_tokens: Sequence[int]):
+        for planner in planners.values():
+            if unit is not None:
+                planner.begin_unit(unit)
+            add, limit = planner.add, planner.max_line_tokens
+            for tokens in line_tokens:
+                if tokens > limit:
+                    # Oversize lines are split into servings-sized pieces when cooking
+                    for piece in _approx_lines(tokens, limit):
+                        add(piece)
+                else:
+                    add(tokens)
+
+    tree_lines = directory_tree_lines(dir_struct)
+    _feed("", count_tokens(tree_lines, enc))
+
+    estimator = None
+    if method == "approx":
+        estimator = ApproxEstimator(encoding_name=encoding)
+        estimator.calibrate(files, enc)
+    sampled = set()
+    if method == "sampled":
+        for f in files:
+            try:
+                if os.stat(f).st_size > sample_bytes and isinstance(get_extractor(f.suffix.lower()), PlainTextExtractor):
+                    sampled.add(f)
+            except OSError:
+                pass
+    full = [f for f in files if f not in sampled] if method != "approx" else []
+    records = iter_file_records(full, base_path, encoding, add_line_numbers, skip_empty_lines, workers, sanitize=sanitize,
+                                pdf_max_pages=pdf_max_pages, pdf_workers=(os.cpu_count() or 1) if workers <= 1 else 1)
+
+    by_extension = {}
+    largest = []    # min-heap of (tokens, relative_path, size_bytes, estimated)
+    total_tokens = 0
+    processed = failed = 0
+    try:
+        for idx, f in enumerate(files):
+            rel_path = str(f.relative_to(base_path))
+            try:
+                size = os.stat(f).st_size
+            except OSError:
+                size = 0
+            estimated = f in sampled or estimator is not None
+            if estimator is not None:
+                tokens = estimator.estimate_bytes(size, f.suffix)
+                _feed(rel_path, _approx_lines(tokens, max(p.max_line_tokens for p in planners.values())))
+            elif f in sampled:
+                try:
+                    line_tokens, tokens = _sample_file(f, str(f.resolve()), enc, sample_bytes, add_line_numbers,
+                                                       skip_empty_lines, sanitize, size)
+                except OSError:
+                    failed += 1
+                    continue
+                _feed(rel_path, line_tokens)
+            else:
+                record = next(records)
+                if not record.ok:
+                    failed += 1
+                    continue
+                if record.content_batches is None:
+                    _feed(rel_path, record.line_tokens)
+                else:
+                    _feed(rel_path, record.line_tokens[:1])
+                    for _, line_tokens in record.content_batches:
+                        _feed(None, line_tokens)
+                    _feed(None, record.line_tokens[1:])
+                tokens = record.tokens
+            processed += 1
+            total_tokens += tokens
+            ext = f.suffix.lower() or f.name
+            stats = by_extension.setdefault(ext, {"files": 0, "tokens": 0, "bytes": 0})
+            stats["files"] += 1
+            stats["tokens"] += tokens
+            stats["bytes"] += size
+            item = (tokens, rel_path, size, estimated)
+            if len(largest) < top_n:
+                heapq.heappush(largest, item)
+            elif top_n:
+                heapq.heappushpop(largest, item)
+            if progress_callback:
+                progress_callback(f"[TASTE] {rel_path} ({tokens} tokens{', estimated' if estimated else ''})", idx + 1, len(files))
+    finally:
+        records.close()
+
+    projections = []
+    for size, planner in planners.items():
+        planner.finish()
+        report = planner.report()
+        # A cook only serves the master when it is over the chunk size
+        servings = report["servings"] if planner.total_tokens > size else 0
+        projections.append({"chunk_size": size, "servings": servings, "fill_ratio": report["fill_ratio"] if servings else None})
+    return {
+        "input_path": str(input_path),
+        "encoding": encoding,
+        "method": method,
+        "packing": packing,
+        "files_scanned": len(files),
+        "files_processed": processed,
+        "files_failed": failed,
+        "files_sampled": len(sampled),
+        "skipped_ignored": count_skipped(dir_struct, "ignored"),
+        "skipped_binary": count_skipped(dir_struct, "binary") + count_skipped(dir_struct, "too_large"),
+        "total_tokens": total_tokens,
+        "by_extension": dict(sorted(by_extension.items(), key=lambda kv: -kv[1]["tokens"])),
+        "largest_files": [
+            {"relative_path": rel_path, "tokens": tokens, "size_bytes": size, "estimated": estimated}
+            for tokens, rel_path, size, estimated in sorted(largest, reverse=True)
+        ],
+        "projections": projections,
+        "calibration": estimator.to_dict() if estimator is not None else None,
+        "elapsed_seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def format_estimate(result: Dict) -> List[str]:
+    """Human-readable report lines for an estimate_lmtokencook() result."""
+    lines = [
+        f"Dry run ({result['method']}, {result['encoding']}): {result['files_processed']} of {result['files_scanned']} files, "
+        f"~{result['total_tokens']:,} tokens in {result['elapsed_seconds']:.2f}s. Nothing was written.",
+        "By extension:",
+    ]
+    for ext, stats in result["by_extension"].items():
+        lines.append(f"  {ext:<16} {stats['files']:>7} files  {stats['tokens']:>12,} tokens  {stats['bytes']:>14,} bytes")
+    lines.append("Largest files:")
+    for item in result["largest_files"]:
+        lines.append(f"  {item['tokens']:>12,} tokens  {item['relative_path']}{'  (estimated)' if item['estimated'] else ''}")
+    lines.append(f"Projected servings ({result['packing']} packing):")
+    for projection in result["projections"]:
+        fill = f"  fill {projection['fill_ratio']:.0%}" if projection["fill_ratio"] else ""
+        lines.append(f"  chunk size {projection['chunk_size']:>8,}: {projection['servings'] or 'no'} servings{fill}")
+    return lines
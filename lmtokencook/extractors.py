@@ -1,5 +1,11 @@
+import codecs
+import mmap
 import pathlib
-from typing import Protocol
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional, Protocol, Tuple
+
+# How much of a memory-mapped file is decoded at a time by iter_lines()
+STREAM_CHUNK_BYTES = 1 << 20
 
 class ExtractionError(Exception):
     pass
@@ -8,6 +14,26 @@ class FileExtractor(Protocol):
     def extract(self, file_path: pathlib.Path) -> str:
         ...
 
+    # Optional: extractors may also define
+    #   iter_lines(file_path) -> Iterator[str]
+    # yielding the text extract() would return, one line at a time with its
+    # line ending (normalised to "\n"), so "".join() of the lines equals
+    # extract(). The pipeline streams large files through it when present.
+    #
+    # Paged formats may instead define
+    #   extract_pages(file_path, max_pages=None, workers=1) -> (pages, total_pages)
+    # where "\n".join(pages) equals extract(); the manifest then gets per-page counts.
+
+def _normalise_newlines(lines):
+    # Text-mode reads turn "\r\n" and "\r" into "\n"; iter_lines() matches that
+    for line in lines:
+        if line.endswith("\r\n"):
+            yield line[:-2] + "\n"
+        elif line.endswith("\r"):
+            yield line[:-1] + "\n"
+        else:
+            yield line
+
 class PlainTextExtractor:
     def extract(self, file_path: pathlib.Path) -> str:
         try:
@@ -16,12 +42,77 @@ class PlainTextExtractor:
         except Exception as e:
             raise ExtractionError(f"Plain text extraction failed: {e}")
 
+    def iter_lines(self, file_path: pathlib.Path) -> Iterator[str]:
+        """
+        Memory-maps the file and decodes it incrementally, STREAM_CHUNK_BYTES
+        at a time, so only one chunk and the line being assembled are held in
+        memory. Lines split like str.splitlines() and keep their endings.
+        """
+        try:
+            f = open(file_path, 'rb')
+        except Exception as e:
+            raise ExtractionError(f"Plain text extraction failed: {e}")
+        with f:
+            try:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                return      # empty file: nothing to map
+            except Exception as e:
+                raise ExtractionError(f"Plain text extraction failed: {e}")
+            with mm:
+                # Read-ahead suits a front-to-back pass; pages already decoded are
+                # dropped again so the mapping does not pile up in resident memory
+                release = None
+                if hasattr(mmap, 'MADV_DONTNEED') and STREAM_CHUNK_BYTES % mmap.PAGESIZE == 0:
+                    release = getattr(mm, 'madvise', None)
+                if release is not None and hasattr(mmap, 'MADV_SEQUENTIAL'):
+                    release(mmap.MADV_SEQUENTIAL)
+                decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+                tail = ''
+                for pos in range(0, len(mm), STREAM_CHUNK_BYTES):
+                    chunk = mm[pos:pos + STREAM_CHUNK_BYTES]
+                    if release is not None:
+                        release(mmap.MADV_DONTNEED, pos, len(chunk))
+                    lines = (tail + decoder.decode(chunk)).splitlines(keepends=True)
+                    # The last piece may be unfinished, or a "\r" whose "\n" is in the next chunk
+                    tail = lines.pop() if lines else ''
+                    yield from _normalise_newlines(lines)
+                tail += decoder.decode(b'', final=True)
+                yield from _normalise_newlines(tail.splitlines(keepends=True))
+
+# Documents with fewer pages than this are extracted in-process
+PDF_PARALLEL_MIN_PAGES = 32
+
+def _extract_pdf_pages(file_path: str, start: int, end: int) -> List[str]:
+    # Runs in a worker process: each worker parses the document for itself
+    from pypdf import PdfReader
+    reader = PdfReader(file_path)
+    return [reader.pages[i].extract_text() or '' for i in range(start, end)]
+
 class PdfExtractor:
     def extract(self, file_path: pathlib.Path) -> str:
+        return '\n'.join(self.extract_pages(file_path)[0])
+
+    def extract_pages(self, file_path: pathlib.Path, max_pages: Optional[int] = None, workers: int = 1) -> Tuple[List[str], int]:
+        """
+        Returns (page texts in document order, number of pages in the document).
+        Only the first max_pages pages are extracted if given. With workers > 1,
+        long documents are split into contiguous page ranges extracted by a
+        process pool and reassembled in order.
+        """
         try:
             from pypdf import PdfReader
             reader = PdfReader(str(file_path))
-            return '\n'.join(page.extract_text() or '' for page in reader.pages)
+            total = len(reader.pages)
+            count = total if max_pages is None else min(total, max_pages)
+            if workers <= 1 or count < PDF_PARALLEL_MIN_PAGES:
+                return [reader.pages[i].extract_text() or '' for i in range(count)], total
+            # A few ranges per worker so one slow range does not hold up the rest
+            step = max(1, -(-count // (workers * 4)))
+            ranges = [(start, min(start + step, count)) for start in range(0, count, step)]
+            with ProcessPoolExecutor(max_workers=min(workers, len(ranges))) as pool:
+                futures = [pool.submit(_extract_pdf_pages, str(file_path), start, end) for start, end in ranges]
+                return [text for future in futures for text in future.result()], total
         except Exception as e:
             raise ExtractionError(f"PDF extraction failed: {e}")
 
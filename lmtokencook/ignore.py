@@ -0,0 +1,137 @@
+import os
+import re
+from typing import Iterable, NamedTuple, Optional, Pattern
+
+# Never worth descending into, whether or not a .gitignore says so
+DEFAULT_IGNORE_PATTERNS = [".git/"]
+
+
+class IgnoreRule(NamedTuple):
+    pattern: str
+    regex: Pattern
+    negate: bool
+    dir_only: bool
+    base_len: int   # length of "<base>/" prefix to strip before matching
+
+
+def _translate(pat: str) -> str:
+    """Translates the body of a .gitignore pattern into a regex over a relative posix path."""
+    res = []
+    i, n = 0, len(pat)
+    while i < n:
+        c = pat[i]
+        if pat.startswith("**/", i) and (i == 0 or pat[i - 1] == "/"):
+            res.append("(?:.*/)?")
+            i += 3
+        elif pat.startswith("/**", i) and i + 3 == n:
+            res.append("/.*")
+            i += 3
+        elif c == "*":
+            while i < n and pat[i] == "*":
+                i += 1
+            res.append("[^/]*")
+            continue
+        elif c == "?":
+            res.append("[^/]")
+            i += 1
+        elif c == "[":
+            j = i + 1
+            if j < n and pat[j] in "!^":
+                j += 1
+            if j < n and pat[j] == "]":
+                j += 1
+            while j < n and pat[j] != "]":
+                j += 1
+            if j >= n:
+                res.append(re.escape(c))
+                i += 1
+            else:
+                body = pat[i + 1:j]
+                if body[:1] in ("!", "^"):
+                    body = "^" + body[1:]
+                res.append("[" + body.replace("\\", "\\\\") + "]")
+                i = j + 1
+        elif c == "\\" and i + 1 < n:
+            res.append(re.escape(pat[i + 1]))
+            i += 2
+        else:
+            res.append(re.escape(c))
+            i += 1
+    return "".join(res)
+
+
+def compile_pattern(line: str, base: str = "") -> Optional[IgnoreRule]:
+    """
+    Compiles one .gitignore line into an IgnoreRule, or returns None for blank
+    lines and comments. `base` is the posix path (relative to the scan root) of
+    the directory the pattern came from.
+    """
+    pattern = line.rstrip("\n").rstrip("\r")
+    # Trailing spaces are ignored unless escaped
+    stripped = pattern.rstrip(" ")
+    if stripped.endswith("\\") and len(stripped) < len(pattern):
+        stripped += " "
+    pattern = stripped
+    if not pattern or pattern.startswith("#"):
+        return None
+    body = pattern
+    negate = body.startswith("!")
+    if negate:
+        body = body[1:]
+    elif body.startswith("\\!") or body.startswith("\\#"):
+        body = body[1:]
+    dir_only = body.endswith("/")
+    body = body.rstrip("/")
+    if not body:
+        return None
+    # A slash anywhere but the end anchors the pattern to its .gitignore directory
+    anchored = "/" in body
+    body = body.lstrip("/")
+    regex = _translate(body)
+    if not anchored:
+        regex = "(?:.*/)?" + regex
+    return IgnoreRule(line.strip(), re.compile(f"^{regex}$", re.DOTALL), negate, dir_only, len(base) + 1 if base else 0)
+
+
+class IgnoreRules:
+    """
+    An immutable, ordered set of compiled ignore rules. Directories extend
+    their parent's rules with their own .gitignore; the last matching rule wins,
+    as in git.
+    """
+    def __init__(self, rules: Iterable[IgnoreRule] = ()):
+        self.rules = tuple(rules)
+
+    @classmethod
+    def from_patterns(cls, patterns: Iterable[str], base: str = "") -> "IgnoreRules":
+        return cls(rule for rule in (compile_pattern(p, base) for p in patterns) if rule is not None)
+
+    def extended(self, patterns: Iterable[str], base: str = "") -> "IgnoreRules":
+        added = IgnoreRules.from_patterns(patterns, base).rules
+        return IgnoreRules(self.rules + added) if added else self
+
+    def with_gitignore(self, gitignore_path: str, base: str = "") -> "IgnoreRules":
+        try:
+            with open(gitignore_path, "r", encoding="utf-8", errors="replace") as f:
+                return self.extended(f.read().splitlines(), base)
+        except OSError:
+            return self
+
+    def match(self, rel_path: str, is_dir: bool) -> Optional[IgnoreRule]:
+        """
+        Returns the deciding rule if `rel_path` (posix, relative to the scan
+        root) is ignored, else None.
+        """
+        for rule in reversed(self.rules):
+            if rule.dir_only and not is_dir:
+                continue
+            if rule.regex.match(rel_path[rule.base_len:]):
+                return None if rule.negate else rule
+        return None
+
+    def __bool__(self):
+        return bool(self.rules)
+
+
+def to_posix(rel_path: str) -> str:
+    return rel_path if os.sep == "/" else rel_path.replace(os.sep, "/")
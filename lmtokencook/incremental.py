@@ -0,0 +1,142 @@
+import os
+import pathlib
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from lmtokencook.pipeline import FileRecord, file_sha256, file_block
+from lmtokencook.tokens import count_tokens
+from lmtokencook.manifest import is_complete, find_manifest, load_manifest, MANIFEST_NAMES
+
+
+class Baseline:
+    """
+    A previous cook (its output directory and manifest) used as the
+    starting point for an incremental re-cook. Files whose size and mtime (or,
+    failing that, sha256) match the manifest are rebuilt from the line spans the
+    manifest recorded for them, instead of being extracted again.
+    token_memo ({relative path: (sha256, line token counts)}, kept by a
+    long-running caller such as watch mode) also spares them tokenizing.
+    """
+    def __init__(self, output_dir, token_memo: Optional[dict] = None):
+        output_dir = pathlib.Path(output_dir)
+        if output_dir.name in MANIFEST_NAMES.values():
+            output_dir = output_dir.parent
+        manifest_path = find_manifest(output_dir)
+        if manifest_path is None:
+            raise FileNotFoundError(f"No manifest.json in previous output: {output_dir}")
+        manifest = load_manifest(manifest_path)
+        self.output_dir = output_dir
+        # A run that stopped part way may have replaced servings the manifest
+        # still describes: nothing in them can be trusted or skipped
+        self.complete = is_complete(output_dir)
+        self.metadata = manifest.get("metadata", {})
+        self.entries = {e["relative_path"]: e for e in manifest.get("processed_files", [])}
+        self.serving_hashes = {s["file"]: s["sha256"] for s in self.metadata.get("servings", []) if "sha256" in s} if self.complete else {}
+        self.status = {}
+        self.removed = []
+        self.token_memo = token_memo or {}
+        self._read_cache = OrderedDict()
+
+    def compatible(self, cook_options: dict) -> bool:
+        # Reused lines are only valid if they were filtered and numbered the same way
+        return self.complete and self.metadata.get("cook_options") == cook_options
+
+    def classify(self, files: List[pathlib.Path], base_path: pathlib.Path, reuse_content: bool = True) -> Dict[str, int]:
+        """
+        Marks every scanned file as added, modified or unchanged relative to the
+        baseline and lists baseline files that no longer exist. Returns counts.
+        """
+        seen = set()
+        for f in files:
+            rel_path = str(f.relative_to(base_path))
+            seen.add(rel_path)
+            entry = self.entries.get(rel_path)
+            if entry is None:
+                self.status[rel_path] = "added"
+            elif not reuse_content or entry.get("extraction_status") != "Success" or "servings" not in entry:
+                self.status[rel_path] = "modified"
+            else:
+                self.status[rel_path] = "unchanged" if self._same_content(f, entry) else "modified"
+        self.removed = [p for p in self.entries if p not in seen]
+        counts = {"added": 0, "modified": 0, "unchanged": 0, "removed": len(self.removed)}
+        for status in self.status.values():
+            counts[status] += 1
+        return counts
+
+    @staticmethod
+    def _same_content(file_path: pathlib.Path, entry: dict) -> bool:
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            return False
+        if st.st_size == entry.get("size_bytes") and st.st_mtime_ns == entry.get("mtime_ns"):
+            return True
+        # Touched but maybe not edited: fall back to the content hash
+        return st.st_size == entry.get("size_bytes") and file_sha256(file_path) == entry.get("sha256")
+
+    def _read_lines(self, name: str) -> List[str]:
+        # Files are visited in master order; with greedy packing that reads each
+        # serving once, and a few cached servings cover files-packed output
+        lines = self._read_cache.get(name)
+        if lines is None:
+            with open(self.output_dir / name, "rb") as f:
+                lines = f.read().decode("utf-8").split(os.linesep)
+            self._read_cache[name] = lines
+            if len(self._read_cache) > 8:
+                self._read_cache.popitem(last=False)
+        else:
+            self._read_cache.move_to_end(name)
+        return lines
+
+    def reuse_record(self, file_path: pathlib.Path, base_path: pathlib.Path, enc) -> Optional[FileRecord]:
+        """
+        Rebuilds the FileRecord of an unchanged file from the previous output.
+        Returns None (so the file is cooked normally) if anything does not line up.
+        """
+        rel_path = str(file_path.relative_to(base_path))
+        if self.status.get(rel_path) != "unchanged":
+            return None
+        entry = self.entries[rel_path]
+        if entry.get("split_lines"):
+            # Re-encoding the pieces of a split line need not give the slice counts back
+            return None
+        try:
+            content_lines = []
+            for span in entry["servings"]:
+                lines = self._read_lines(span["file"])
+                content_lines.extend(lines[span["line_start"] - 1:span["line_end"]])
+            st = os.stat(file_path)
+        except (OSError, UnicodeDecodeError, KeyError):
+            return None
+        if len(content_lines) != entry.get("content_lines"):
+            return None
+        abs_path = str(file_path.resolve())
+        lines = file_block(abs_path, content_lines)
+        memo = self.token_memo.get(rel_path)
+        if memo is not None and memo[0] == entry.get("sha256") and len(memo[1]) == len(lines):
+            line_tokens = list(memo[1])
+        else:
+            line_tokens = count_tokens(lines, enc)
+        return FileRecord(
+            relative_path=rel_path,
+            absolute_path=abs_path,
+            status="Success",
+            char_count=entry.get("char_count", 0),
+            lines=lines,
+            line_tokens=line_tokens,
+            tokens=sum(line_tokens[1:-1]),
+            size_bytes=st.st_size,
+            mtime_ns=st.st_mtime_ns,
+            sha256=entry.get("sha256", ""),
+            dropped_lines=entry.get("dropped_lines", 0),
+            stripped_chars=entry.get("stripped_chars", 0),
+            pages=entry.get("pages"),
+            pages_total=entry.get("pages_total", 0),
+        )
+
+    def stale_outputs(self, keep: List[str]) -> List[pathlib.Path]:
+        """Serving and master files in the output directory not produced by this run, and leftover temporary files."""
+        keep = set(keep)
+        stale = []
+        for pattern in ("serving_*_of_*.txt", "masterfile.t-*.txt", ".*.tmp"):
+            stale.extend(p for p in self.output_dir.glob(pattern) if p.name not in keep)
+        return stale
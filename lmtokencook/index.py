@@ -0,0 +1,193 @@
+"""
+Read side of a cooked output directory: which servings hold a file, and its
+exact content, without scanning or loading whole servings.
+
+    python -m lmtokencook.main lookup OUTPUT_DIR 'src/**/*.py' README.md
+    python -m lmtokencook.main lookup OUTPUT_DIR src/app.py --content
+"""
+import argparse
+import fnmatch
+import json
+import mmap
+import pathlib
+import re
+import sys
+from collections import OrderedDict
+from itertools import islice
+from typing import Dict, Iterable, List, Optional
+from lmtokencook.manifest import find_manifest, is_complete, MANIFEST_NAMES
+
+# Servings kept memory-mapped at once by an OutputIndex
+MAX_OPEN_SERVINGS = 16
+
+_SERVING_RE = re.compile(r"serving_(\d+)_of_\d+\.txt$")
+
+
+def _posix(path: str) -> str:
+    return pathlib.PurePath(path).as_posix()
+
+
+def _iter_entries(manifest_path: pathlib.Path) -> Iterable[dict]:
+    # manifest.jsonl is read a line at a time; manifest.json has to be loaded whole
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        if manifest_path.suffix == ".jsonl":
+            for line in f:
+                record = json.loads(line)
+                if record.get("type") == "file":
+                    yield record
+        else:
+            yield from json.load(f).get("processed_files", [])
+
+
+class OutputIndex:
+    """
+    The per-file serving index of one output directory (from manifest.json
+    or manifest.jsonl). Only each cooked file's path and serving spans are
+    kept. Content is sliced out of memory-mapped serving files by the byte
+    ranges the manifest recorded; manifests written before byte ranges were
+    recorded fall back to reading the span's lines.
+    Archived outputs (--output-format zip/tar) have to be extracted first.
+    """
+    def __init__(self, output_dir, allow_incomplete: bool = False):
+        output_dir = pathlib.Path(output_dir)
+        if output_dir.name in MANIFEST_NAMES.values():
+            output_dir = output_dir.parent
+        manifest_path = find_manifest(output_dir)
+        if manifest_path is None:
+            raise FileNotFoundError(f"No manifest.json or manifest.jsonl in: {output_dir}")
+        if not allow_incomplete and not is_complete(output_dir):
+            raise ValueError(f"Output is incomplete (the run that wrote it did not finish): {output_dir}")
+        self.output_dir = output_dir
+        self.spans = OrderedDict()     # posix relative path -> servings spans
+        for entry in _iter_entries(manifest_path):
+            if entry.get("extraction_status") == "Success":
+                self.spans[_posix(entry["relative_path"])] = entry.get("servings", [])
+        self._maps = OrderedDict()     # serving file name -> (file, mmap)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self.spans)
+
+    def paths(self) -> List[str]:
+        return list(self.spans)
+
+    def match(self, patterns: Iterable[str]) -> List[str]:
+        """
+        Cooked paths equal to any of patterns or matching it as a glob (fnmatch
+        rules: "*" also matches "/"), in manifest order.
+        """
+        patterns = [_posix(p) for p in patterns]
+        exact = [p for p in patterns if p in self.spans]
+        globs = [p for p in patterns if p not in self.spans and any(c in p for c in "*?[")]
+        if not globs:
+            return [p for p in self.spans if p in exact]
+        exact = set(exact)
+        return [p for p in self.spans if p in exact or any(fnmatch.fnmatchcase(p, g) for g in globs)]
+
+    def lookup(self, patterns: Iterable[str]) -> List[Dict]:
+        """
+        One {"relative_path", "servings"} entry per matching file. Each span
+        has the serving file, its number (None for the master file), 1-based
+        inclusive line_start/line_end and, when recorded, 0-based end-exclusive
+        byte_start/byte_end.
+        """
+        results = []
+        for path in self.match(patterns):
+            spans = []
+            for span in self.spans[path]:
+                m = _SERVING_RE.match(span["file"])
+                spans.append({"serving": int(m.group(1)) if m else None, **span})
+            results.append({"relative_path": path, "servings": spans})
+        return results
+
+    def servings(self, patterns: Iterable[str]) -> List[str]:
+        """The serving files, in serving order, that together hold every matching file."""
+        names = {span["file"] for path in self.match(patterns) for span in self.spans[path]}
+        return sorted(names, key=lambda name: (int(m.group(1)) if (m := _SERVING_RE.match(name)) else 0, name))
+
+    def _map(self, name: str) -> mmap.mmap:
+        mapped = self._maps.get(name)
+        if mapped is not None:
+            self._maps.move_to_end(name)
+            return mapped[1]
+        f = open(self.output_dir / name, "rb")
+        try:
+            m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except BaseException:
+            f.close()
+            raise
+        self._maps[name] = (f, m)
+        if len(self._maps) > MAX_OPEN_SERVINGS:
+            _, (old_f, old_m) = self._maps.popitem(last=False)
+            old_m.close()
+            old_f.close()
+        return m
+
+    def read_bytes(self, path: str) -> bytes:
+        """A cooked file's content exactly as it appears in the servings."""
+        spans = self.spans.get(_posix(path))
+        if spans is None:
+            raise KeyError(f"Not in this output: {path}")
+        parts = []
+        for span in spans:
+            if "byte_start" in span:
+                parts.append(self._map(span["file"])[span["byte_start"]:span["byte_end"]])
+            else:
+                with open(self.output_dir / span["file"], "rb") as f:
+                    parts.extend(islice(f, span["line_start"] - 1, span["line_end"]))
+        return b"".join(parts)
+
+    def read(self, path: str) -> str:
+        return self.read_bytes(path).decode("utf-8")
+
+    def close(self):
+        for f, m in self._maps.values():
+            m.close()
+            f.close()
+        self._maps.clear()
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(prog="lmtokencook lookup",
+                                     description="Find which servings of a cooked output hold the given files")
+    parser.add_argument("output", help="Output directory (or its manifest)")
+    parser.add_argument("patterns", nargs="+", metavar="PATH_OR_GLOB", help="Relative paths or glob patterns, as in the manifest")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--servings", action="store_true", help="Only list the serving files needed, one per line")
+    group.add_argument("--content", action="store_true", help="Print the matching files' content")
+    group.add_argument("--json", action="store_true", help="Print the lookup result as JSON")
+    parser.add_argument("--allow-incomplete", action="store_true", help="Read an output whose run did not finish")
+    args = parser.parse_args(argv)
+    try:
+        with OutputIndex(args.output, allow_incomplete=args.allow_incomplete) as index:
+            if args.servings:
+                print("\n".join(index.servings(args.patterns)))
+                return
+            results = index.lookup(args.patterns)
+            if not results:
+                print("No matching files.", file=sys.stderr)
+                sys.exit(1)
+            if args.json:
+                print(json.dumps(results, indent=2, ensure_ascii=False))
+            elif args.content:
+                for result in results:
+                    print(f"==> {result['relative_path']} <==")
+                    sys.stdout.write(index.read(result["relative_path"]))
+            else:
+                for result in results:
+                    print(result["relative_path"])
+                    for span in result["servings"]:
+                        byte_range = f", bytes {span['byte_start']}-{span['byte_end']}" if "byte_start" in span else ""
+                        print(f"  {span['file']}: lines {span['line_start']}-{span['line_end']}{byte_range}")
+    except (OSError, ValueError, KeyError) as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+import heapq
+import sys
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+# Stages of a cook, in pipeline order. extract, sanitize and tokenize are timed
+# per file (inside worker processes when workers > 1) and summed, so with
+# workers their wall time is busy time across all workers.
+STAGES = ("scan", "extract", "sanitize", "tokenize", "pack", "write", "manifest")
+DEFAULT_SLOWEST_FILES = 10
+
+
+def peak_rss_mb(children: bool = False) -> Optional[float]:
+    """Peak resident set size of this process (or its finished children) in MB, None if unknown."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def clock():
+    return time.perf_counter(), time.process_time()
+
+
+def lap(stages: Dict[str, list], name: str, start):
+    """Adds the wall and CPU time since start to stages[name] and returns the new start."""
+    now = clock()
+    totals = stages.setdefault(name, [0.0, 0.0])
+    totals[0] += now[0] - start[0]
+    totals[1] += now[1] - start[1]
+    return now
+
+
+class Instrumentation:
+    """
+    Per-stage spans for one cook: wall and CPU seconds, bytes in and out
+    (characters for text stages), tokens and items, tokens per second and the
+    process's peak RSS when the stage ended, plus the slowest files. Every
+    finished stage and file is also sent to event_callback as a dict with an
+    "event" key ("span", "file" or "run").
+    """
+    def __init__(self, event_callback: Optional[Callable[[dict], None]] = None, slowest_files: int = DEFAULT_SLOWEST_FILES):
+        self.event_callback = event_callback
+        self.slowest_files = slowest_files
+        self.stages = {name: {"wall_seconds": 0.0, "cpu_seconds": 0.0, "bytes_in": 0, "bytes_out": 0, "tokens": 0, "items": 0}
+                       for name in STAGES}
+        self.files_timed = 0
+        self.files_cached = 0
+        self._slowest = []      # min-heap of (seconds, index, entry)
+        self._start = clock()
+
+    def _emit(self, event: dict):
+        if self.event_callback is not None:
+            self.event_callback(event)
+
+    def add(self, stage: str, wall: float = 0.0, cpu: float = 0.0, bytes_in: int = 0, bytes_out: int = 0, tokens: int = 0, items: int = 0):
+        totals = self.stages[stage]
+        totals["wall_seconds"] += wall
+        totals["cpu_seconds"] += cpu
+        totals["bytes_in"] += bytes_in
+        totals["bytes_out"] += bytes_out
+        totals["tokens"] += tokens
+        totals["items"] += items
+
+    def add_since(self, stage: str, start, **counters):
+        """Adds the time since start (a clock() value) to stage and returns the new start."""
+        now = clock()
+        self.add(stage, now[0] - start[0], now[1] - start[1], **counters)
+        return now
+
+    @contextmanager
+    def span(self, stage: str):
+        """Times the block as (part of) stage; the yielded dict takes bytes_in, bytes_out, tokens and items."""
+        counters = {}
+        start = clock()
+        try:
+            yield counters
+        finally:
+            now = clock()
+            self.add(stage, now[0] - start[0], now[1] - start[1], **counters)
+
+    def end_stage(self, stage: str):
+        totals = self.stages[stage]
+        totals["peak_rss_mb"] = peak_rss_mb()
+        if totals["tokens"] and totals["wall_seconds"] > 0:
+            totals["tokens_per_second"] = round(totals["tokens"] / totals["wall_seconds"], 1)
+        self._emit({"event": "span", "stage": stage, **self._rounded(totals)})
+
+    def add_file(self, record, extractor: str):
+        """Adds a cooked FileRecord's per-stage timings (see FileRecord.stages)."""
+        if not record.stages:
+            self.files_cached += 1
+            return
+        self.files_timed += 1
+        sizes = {"extract": (record.size_bytes, record.char_count),
+                 "sanitize": (record.char_count, record.sanitized_chars),
+                 "tokenize": (record.sanitized_chars, 0)}
+        seconds = 0.0
+        for stage, (wall, cpu) in record.stages.items():
+            bytes_in, bytes_out = sizes.get(stage, (0, 0))
+            self.add(stage, wall, cpu, bytes_in, bytes_out, record.tokens, 1)
+            seconds += wall
+        entry = {"relative_path": record.relative_path, "extractor": extractor, "seconds": round(seconds, 6),
+                 "size_bytes": record.size_bytes, "tokens": record.tokens,
+                 **{f"{stage}_seconds": round(wall, 6) for stage, (wall, _) in record.stages.items()}}
+        item = (seconds, self.files_timed, entry)
+        if len(self._slowest) < self.slowest_files:
+            heapq.heappush(self._slowest, item)
+        elif self.slowest_files:
+            heapq.heappushpop(self._slowest, item)
+        self._emit({"event": "file", **entry})
+
+    @staticmethod
+    def _rounded(totals: dict) -> dict:
+        return {k: round(v, 6) if isinstance(v, float) else v for k, v in totals.items()}
+
+    def report(self, workers: int = 1, emit: bool = True) -> Dict:
+        """The manifest's performance section; also sent as a "run" event if emit is set."""
+        now = clock()
+        report = {
+            "wall_seconds": round(now[0] - self._start[0], 6),
+            "cpu_seconds": round(now[1] - self._start[1], 6),
+            "peak_rss_mb": peak_rss_mb(),
+            "peak_rss_children_mb": peak_rss_mb(children=True),
+            "workers": workers,
+            "files_timed": self.files_timed,
+            "files_cached": self.files_cached,
+            "stages": {name: self._rounded(totals) for name, totals in self.stages.items()},
+            "slowest_files": [entry for _, _, entry in sorted(self._slowest, key=lambda item: item[0], reverse=True)],
+        }
+        if emit:
+            self._emit({"event": "run", **report})
+        return report
@@ -2,218 +2,392 @@ import argparse
 import pathlib
 import shutil
 import sys
-from lmtokencook.scanner import scan_directory
-from lmtokencook.extractors import get_extractor, ExtractionError
-from lmtokencook.manifest import build_manifest_metadata, write_manifest
-from lmtokencook.chunker import serving_master_text
-import tiktoken
+from lmtokencook.scanner import snapshot_tree, DEFAULT_MAX_FILE_BYTES
+from lmtokencook.pipeline import DEFAULT_STREAM_MIN_BYTES
+from lmtokencook.manifest import build_manifest_metadata, write_manifest, write_manifest_jsonl, mark_incomplete, mark_complete, MANIFEST_FORMATS, MANIFEST_NAMES, DEFAULT_MANIFEST_FORMAT
+from lmtokencook.chunker import ServingWriter, write_servings, PACKING_STRATEGIES, DEFAULT_PACKING
+from lmtokencook.cook import Cook, CancelledError
+from lmtokencook.incremental import Baseline
+from lmtokencook.tokenizers import available_encodings, DEFAULT_ENCODING
+from lmtokencook.sanitize import SANITIZE_MODES, DEFAULT_SANITIZE_MODE
+from lmtokencook.estimate import estimate_lmtokencook, format_estimate, DEFAULT_CANDIDATE_SIZES, DEFAULT_SAMPLE_BYTES
+from lmtokencook.cache import DEFAULT_CACHE_SIZE_MB, default_cache_dir
+from lmtokencook.index import main as lookup_main
+from lmtokencook.archive import ArchiveWriter, archive_path_for, OUTPUT_FORMATS, DEFAULT_OUTPUT_FORMAT
+from lmtokencook.instrument import Instrumentation, clock, DEFAULT_SLOWEST_FILES
+from lmtokencook.watch import make_watcher, diff_snapshots, PollWatcher, WATCH_BACKENDS, DEFAULT_WATCH_BACKEND, DEFAULT_WATCH_INTERVAL, DEFAULT_WATCH_DEBOUNCE, MAX_DEBOUNCE_PERIODS
 import os
 import json
+import time
 from datetime import datetime
 
 import threading
 
-class CancelledError(Exception):
-    pass
-
-def run_lmtokencook(input_path, output_path, chunk_size=28000, progress_callback=None, cancel_flag=None, keep_masterfile=False, add_line_numbers=False, skip_empty_lines=False):
+def run_lmtokencook(input_path, output_path, chunk_size=28000, progress_callback=None, cancel_flag=None, keep_masterfile=False, add_line_numbers=False, skip_empty_lines=False, workers=1, cache_dir=None, cache_size_mb=DEFAULT_CACHE_SIZE_MB, incremental_from=None, scan_threads=1, ignore_patterns=None, use_gitignore=True, sanitize=DEFAULT_SANITIZE_MODE, packing=DEFAULT_PACKING, encoding=DEFAULT_ENCODING, stream_min_bytes=DEFAULT_STREAM_MIN_BYTES, pdf_max_pages=None, pdf_workers=None, max_file_bytes=DEFAULT_MAX_FILE_BYTES, event_callback=None, slowest_files=DEFAULT_SLOWEST_FILES, output_format=DEFAULT_OUTPUT_FORMAT, manifest_format=DEFAULT_MANIFEST_FORMAT, token_memo=None):
+    # progress_callback gets human-readable messages; event_callback gets the
+    # per-stage, per-file and whole-run timing dicts (see instrument.py).
+    # token_memo is a dict carried from one re-cook to the next (see watch_lmtokencook)
+    instrument = Instrumentation(event_callback, slowest_files)
     input_path = pathlib.Path(input_path)
     output_base = pathlib.Path(output_path)
 
     # Validate input
     if not input_path.exists():
         raise FileNotFoundError(f"Input path does not exist: {input_path}")
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format: {output_format}")
+    if manifest_format not in MANIFEST_FORMATS:
+        raise ValueError(f"Unknown manifest format: {manifest_format}")
+    if incremental_from and output_format != "dir":
+        raise ValueError("Incremental re-cooks need the dir output format")
     if not output_base.exists():
         output_base.mkdir(parents=True, exist_ok=True)
 
-    # Create unique output subdir
-    input_name = input_path.stem if input_path.is_file() else input_path.name
-    timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-    output_subdir = output_base / f"{input_name}_LMTC_Output_{timestamp}"
+    # Pick a unique output subdir, or re-cook a previous one in place
+    baseline = Baseline(incremental_from, token_memo) if incremental_from else None
+    archive_path = None
+    if baseline is not None:
+        output_subdir = baseline.output_dir
+        output_name = output_subdir.name
+    else:
+        input_name = input_path.stem if input_path.is_file() else input_path.name
+        timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
+        output_name = f"{input_name}_LMTC_Output_{timestamp}"
+        if output_format == "dir":
+            output_subdir = output_base / output_name
+        else:
+            # The spool and manifest are staged in a hidden work directory;
+            # servings go straight into the archive
+            archive_path = archive_path_for(output_base, output_name, output_format)
+            output_subdir = output_base / f".{output_name}.work"
+
+    # Scan, then extract into the master spool (see cook.Cook); servings are
+    # then cut out of the spool and handed to the writer below. Cook checks its
+    # options (e.g. chunk_size against the serving header and footer) before
+    # anything is written
+    kitchen = Cook(input_path, chunk_size, add_line_numbers=add_line_numbers, skip_empty_lines=skip_empty_lines, workers=workers,
+                   cache_dir=cache_dir, cache_size_mb=cache_size_mb, scan_threads=scan_threads, ignore_patterns=ignore_patterns,
+                   use_gitignore=use_gitignore, sanitize=sanitize, packing=packing, encoding=encoding, stream_min_bytes=stream_min_bytes,
+                   pdf_max_pages=pdf_max_pages, pdf_workers=pdf_workers, max_file_bytes=max_file_bytes, work_dir=output_subdir,
+                   manifest_format=manifest_format, baseline=baseline, token_memo=token_memo, instrument=instrument,
+                   progress_callback=progress_callback, cancel_flag=cancel_flag)
     output_subdir.mkdir(exist_ok=True)
+    # Cleared once the manifest is published; servings are swapped in atomically meanwhile
+    mark_incomplete(output_subdir)
 
-    # Scan files
-    if progress_callback:
-        progress_callback("Scanning pantry for ingredients...")
-    if input_path.is_dir():
-        files, dir_struct = scan_directory(input_path)
-    else:
-        files = [input_path]
-        dir_struct = {input_path.name: {"processed": True, "rel_path": input_path.name}}
-    scan_counts = {
-        "scanned": len(files),
-        "processed": 0,
-        "skipped_binary": 0,
-        "skipped_symlink": 0,
-        "failed_extraction": 0,
-        "estimated_tokens": 0,
-    }
-    processed_files = []
-    # Calculate total token count for all files (for master file naming)
-    enc = tiktoken.get_encoding("cl100k_base")
-    total_tokens = 0
-    temp_file_tokens = []
-    for f in files:
-        ext = f.suffix.lower()
-        extractor = get_extractor(ext)
-        try:
-            text = extractor.extract(f)
-            tokens = len(enc.encode(text))
-            total_tokens += tokens
-            temp_file_tokens.append(tokens)
-        except Exception:
-            temp_file_tokens.append(0)
-    master_lines = []
-    char_offset = 0
-    file_metadata = []
-    # Write directory tree as Ingredients (in-memory)
-    master_lines.append("=== Ingredients (Directory Tree) ===")
-    def _print_tree(d, prefix=""):
-        for k, v in d.items():
-            rel = v.get("rel_path", k)
-            master_lines.append(f"{prefix}{rel}")
-            if "children" in v:
-                _print_tree(v["children"], prefix + "  ")
-    _print_tree(dir_struct)
-    master_lines.append("")
-    # Process each file
-    for idx, f in enumerate(files):
-        if cancel_flag is not None and cancel_flag.is_set():
+    try:
+        kitchen.scan()
+        kitchen.extract()
+    except BaseException:
+        # Scan errors, extraction errors and cancels: nothing is published yet, so a
+        # new output directory (or archive staging directory) is removed again; a
+        # re-cooked one keeps its INCOMPLETE marker
+        kitchen.close()
+        if baseline is None:
+            shutil.rmtree(output_subdir, ignore_errors=True)
+        raise
+    files, scan_counts, incremental, spool = kitchen.files, kitchen.scan_counts, kitchen.incremental, kitchen.spool
+    stage_start = clock()
+
+    # Servinging. Servings go through a writer thread, into output_subdir or the archive
+    writer = ServingWriter(output_subdir) if archive_path is None else ArchiveWriter(archive_path, output_format, output_name)
+    try:
+        chunking = {"enabled": False, "threshold": chunk_size, "created": 0}
+        master_path = output_subdir / kitchen.master_name
+        if kitchen.chunked:
             if progress_callback:
-                progress_callback("Cooking cancelled by chef!")
-            raise CancelledError("Processing was cancelled by user.")
-        rel_path = str(f.relative_to(input_path.parent if input_path.is_file() else input_path))
-        abs_path = str(f.resolve())
-        ext = f.suffix.lower()
-        extractor = get_extractor(ext)
-        try:
-            text = extractor.extract(f)
-            if not text.strip():
-                raise ExtractionError("No text extracted.")
-            tokens = len(enc.encode(text))
-            scan_counts["processed"] += 1
-            scan_counts["estimated_tokens"] += tokens
-            # Write file start marker
-            master_lines.append(f"{abs_path}")
-            allowed = set(map(chr, range(32, 127)))
-            lines = text.splitlines()
-            filtered_lines = []
-            for line in lines:
-                if not all(c in allowed for c in line):
-                    continue
-                if skip_empty_lines and not line.strip():
-                    continue
-                filtered_lines.append(line)
-            if add_line_numbers:
-                for i, line in enumerate(filtered_lines, start=1):
-                    master_lines.append(f"{i}\t{line}")
+                progress_callback("Serving dish into portions...")
+            # Servings are copied out of the spool by byte range; unchanged ones are skipped when re-cooking
+            servings = write_servings(kitchen.servings(), output_subdir,
+                                      baseline.serving_hashes if baseline is not None else None, writer)
+            writer.flush()
+            stage_start = instrument.add_since("write", stage_start, bytes_in=spool.bytes_written,
+                                               bytes_out=writer.bytes_written, items=writer.files_written)
+            num_chunks = len(servings)
+            packing_report = kitchen.planner.report()
+            packing_report["files_split"] = kitchen.files_split()
+            chunking = {"enabled": True, "threshold": chunk_size, "created": num_chunks, "servings": servings, "packing": packing_report}
+            # Keep the spool as masterfile.txt only if keep_masterfile is True
+            if keep_masterfile:
+                os.replace(spool.path, master_path)
+                if progress_callback:
+                    progress_callback(f"Servinged into {num_chunks} files. master_content.txt kept.")
             else:
-                for line in filtered_lines:
-                    master_lines.append(line)
-            master_lines.append(f"\n=== File End: {abs_path} ===\n")
-            char_start = char_offset
-            char_offset += len(text)
-            processed_files.append({
-                "relative_path": rel_path,
-                "absolute_path": abs_path,
-                "char_start_offset": char_start,
-                "char_end_offset": char_offset,
-                "char_count": char_offset - char_start,
-                "estimated_tokens": tokens,
-                "extraction_status": "Success",
-                "encoding_used": "utf-8"
-            })
-            file_metadata.append({
-                "absolute_path": abs_path,
-                "tokens": tokens,
-                "start_marker": f"{abs_path}\n",
-                "end_marker": f"\n=== File End: {abs_path} ===\n\n",
-                "content": text
-            })
-            if progress_callback:
-                progress_callback(f"[COOK] {abs_path} ({tokens} tokens)", idx+1, len(files))
-        except ExtractionError as e:
-            scan_counts["failed_extraction"] += 1
-            processed_files.append({
-                "relative_path": rel_path,
-                "absolute_path": abs_path,
-                "extraction_status": f"Error: {e}",
-                "encoding_used": None
-            })
+                spool.path.unlink()
+                if progress_callback:
+                    progress_callback(f"Servinged into {num_chunks} files. master_content.txt not written.")
+        else:
+            # Not chunking: the spool is the masterfile, moved rather than copied
+            os.replace(spool.path, master_path)
             if progress_callback:
-                progress_callback(f"[BURNT] {abs_path}: {e}")
-        except Exception as e:
-            scan_counts["failed_extraction"] += 1
-            processed_files.append({
-                "relative_path": rel_path,
-                "absolute_path": abs_path,
-                "extraction_status": f"Error: {e}",
-                "encoding_used": None
-            })
+                progress_callback("Servinging not required.")
+        if baseline is not None:
+            servings = chunking.get("servings", [])
+            keep = [s["file"] for s in servings] + ([master_path.name] if master_path.exists() else [])
+            for stale in baseline.stale_outputs(keep):
+                stale.unlink()
+            incremental["servings_written"] = sum(1 for s in servings if s["written"])
+            incremental["servings_unchanged"] = len(servings) - incremental["servings_written"]
             if progress_callback:
-                progress_callback(f"[BURNT] {abs_path}: {e}")
+                progress_callback(f"Re-cooked {incremental['servings_written']} servings, {incremental['servings_unchanged']} unchanged.")
 
-    # After all content prep, calculate the true token count of the finalized master_lines
-    enc = tiktoken.get_encoding("cl100k_base")
-    master_content = "\n".join(master_lines)
-    total_tokens = len(enc.encode(master_content))
+        if archive_path is not None and master_path.exists():
+            writer.put_file(master_path.name, master_path)
+            writer.flush()
+        # Keeping or dropping the spool counts as writing
+        instrument.add_since("write", stage_start)
+        instrument.end_stage("write")
 
-    # Servinging
-    chunking = {"enabled": False, "threshold": chunk_size, "created": 0}
-    if total_tokens > chunk_size:
-        if progress_callback:
-            progress_callback("Serving dish into portions...")
-        # Write masterfile.txt only if keep_masterfile is True
-        master_path = output_subdir / f"masterfile.t-{total_tokens}.txt"
-        if keep_masterfile:
-            with open(master_path, "w", encoding="utf-8") as master_f:
-                for line in master_lines:
-                    master_f.write(line + "\n")
-        # Serving directly from in-memory lines
-        from lmtokencook.chunker import serving_lines
-        num_chunks = serving_lines(master_lines, output_subdir, chunk_size)
-        chunking = {"enabled": True, "threshold": chunk_size, "created": num_chunks}
-        if not keep_masterfile:
-            if progress_callback:
-                progress_callback(f"Servinged into {num_chunks} files. master_content.txt not written.")
-        else:
-            if progress_callback:
-                progress_callback(f"Servinged into {num_chunks} files. master_content.txt kept.")
-    else:
-        # Only write masterfile.txt if not chunking or keep_masterfile is True
-        master_path = output_subdir / f"masterfile.t-{total_tokens}.txt"
-        with open(master_path, "w", encoding="utf-8") as master_f:
-            for line in master_lines:
-                master_f.write(line + "\n")
-        if progress_callback:
-            progress_callback("Servinging not required.")
-
-    # Manifest
-    metadata = build_manifest_metadata(input_path, output_subdir.name, scan_counts, chunking)
-    manifest_path = output_subdir / "manifest.json"
-    write_manifest(manifest_path, metadata, dir_struct, processed_files)
+        # Manifest. Its performance section is taken just before it is written, so
+        # it covers every stage but the manifest's own
+        with instrument.span("manifest") as counters:
+            metadata = build_manifest_metadata(input_path, output_name, scan_counts, chunking, kitchen.cook_options, incremental)
+            metadata["performance"] = instrument.report(workers, emit=False)
+            manifest_path = output_subdir / MANIFEST_NAMES[manifest_format]
+            if manifest_format == "json":
+                write_manifest(manifest_path, metadata, kitchen.dir_struct, list(kitchen.iter_entries()))
+            else:
+                write_manifest_jsonl(manifest_path, metadata, kitchen.dir_struct, kitchen.iter_entries())
+            counters["bytes_out"] = os.path.getsize(manifest_path)
+            counters["items"] = len(kitchen.entries)
+            kitchen.close()
+            if archive_path is not None:
+                # Published last, then the archive is finished and renamed into place
+                writer.put_file(manifest_path.name, manifest_path)
+            writer.close()
+        if archive_path is None:
+            # A re-cook that switched formats leaves the other manifest behind
+            for name in MANIFEST_NAMES.values():
+                if name != manifest_path.name:
+                    (output_subdir / name).unlink(missing_ok=True)
+        mark_complete(output_subdir)
+    except BaseException:
+        writer.abort()
+        kitchen.close()
+        if archive_path is not None:
+            shutil.rmtree(output_subdir, ignore_errors=True)
+        raise
+    if archive_path is not None:
+        shutil.rmtree(output_subdir)
+    instrument.end_stage("manifest")
+    performance = instrument.report(workers)
+    stage_timings = {name: totals["wall_seconds"] for name, totals in performance["stages"].items()}
     if progress_callback:
-        progress_callback(f"Manifest written to {manifest_path}", len(files), len(files))
-        progress_callback(f"Done. Output in {output_subdir}", len(files), len(files))
+        progress_callback(f"Manifest written to {manifest_path if archive_path is None else archive_path}", len(files), len(files))
+        progress_callback("Stage timings: " + ", ".join(f"{k} {v:.2f}s" for k, v in stage_timings.items()), len(files), len(files))
+        progress_callback(f"Done. Output in {archive_path or output_subdir}", len(files), len(files))
     return {
-        "output_dir": str(output_subdir),
-        "manifest_path": str(manifest_path),
+        # For archives, output_dir is the archive and the manifest is its <output_name>/manifest.json member
+        "output_dir": str(archive_path or output_subdir),
+        "output_format": output_format,
+        "manifest_path": str(manifest_path) if archive_path is None else None,
         "scan_counts": scan_counts,
-        "chunking": chunking
+        "chunking": chunking,
+        "stage_timings": stage_timings,
+        "performance": performance,
+        "incremental": incremental
     }
 
+def watch_lmtokencook(input_path, output_path, interval=DEFAULT_WATCH_INTERVAL, debounce=DEFAULT_WATCH_DEBOUNCE, backend=DEFAULT_WATCH_BACKEND, stop_flag=None, progress_callback=None, incremental_from=None, on_rebuild=None, **options):
+    """
+    Cooks input_path, then keeps the output current until stop_flag is set.
+    The tree is compared against mtime/size snapshots (scanner.snapshot_tree)
+    every interval seconds, or as soon as inotify reports activity; once it
+    has stayed unchanged for debounce seconds, the output is re-cooked in
+    place as an incremental re-cook, so only changed files are extracted again
+    and servings and manifest are swapped in atomically. Token counts of
+    unchanged files are kept in memory between re-cooks.
+    options are run_lmtokencook's; on_rebuild gets every run's result.
+    Returns the last result.
+    """
+    input_path = pathlib.Path(input_path)
+    if options.get("output_format", DEFAULT_OUTPUT_FORMAT) != "dir":
+        raise ValueError("Watch mode needs the dir output format")
+    input_root = input_path.resolve()
+    output_root = pathlib.Path(output_path).resolve()
+    if input_path.is_dir() and (output_root == input_root or input_root in output_root.parents):
+        # Every re-cook would change the tree it is watching
+        raise ValueError("Watch mode needs an output directory outside the input tree")
+    stop_flag = stop_flag if stop_flag is not None else threading.Event()
+    ignore_patterns, use_gitignore = options.get("ignore_patterns"), options.get("use_gitignore", True)
+
+    def snapshot():
+        return snapshot_tree(input_path, ignore_patterns, use_gitignore)
+
+    def directories(snap):
+        if input_path.is_file():
+            return [str(input_path.parent)]
+        return [str(input_path)] + [str(input_path / rel) for rel in snap if rel.endswith(os.sep)]
+
+    token_memo = {}
+    watcher = make_watcher(backend, stop_flag)
+    try:
+        # Snapshots are taken before each cook, so changes made during one start the next
+        snap = snapshot()
+        result = run_lmtokencook(input_path, output_path, progress_callback=progress_callback, incremental_from=incremental_from,
+                                 token_memo=token_memo, **options)
+        output_dir = result["output_dir"]
+        if on_rebuild:
+            on_rebuild(result)
+        if progress_callback:
+            progress_callback(f"Watching {input_path} for changes ({watcher.name}); press Ctrl+C to stop.")
+        while not stop_flag.is_set():
+            try:
+                watcher.watch(directories(snap))
+            except OSError as e:
+                if backend == "inotify":
+                    raise
+                watcher.close()
+                watcher = PollWatcher(stop_flag)
+                if progress_callback:
+                    progress_callback(f"{e}; polling every {interval}s instead.")
+            watcher.wait(watcher.rescan_interval(interval))
+            if stop_flag.is_set():
+                break
+            latest = snapshot()
+            if latest == snap:
+                continue
+            # Debounce: wait for the tree to stay still, so a burst of writes is one re-cook
+            give_up = time.monotonic() + debounce * MAX_DEBOUNCE_PERIODS
+            while time.monotonic() < give_up and not stop_flag.is_set():
+                if watcher.wait(debounce):
+                    continue
+                settled = snapshot()
+                if settled == latest:
+                    break
+                latest = settled
+            if stop_flag.is_set():
+                break
+            changes = diff_snapshots(snap, latest)
+            snap = latest
+            if progress_callback:
+                progress_callback(f"Change detected: {changes['added']} added, {changes['modified']} modified, "
+                                  f"{changes['removed']} removed. Re-cooking...")
+            try:
+                result = run_lmtokencook(input_path, output_path, progress_callback=progress_callback, incremental_from=output_dir,
+                                         token_memo=token_memo, **options)
+            except CancelledError:
+                raise
+            except Exception as e:
+                # The output stays marked incomplete; the next re-cook rebuilds it
+                if progress_callback:
+                    progress_callback(f"[ERROR] Re-cook failed: {e}. Retrying on the next change.")
+                continue
+            if on_rebuild:
+                on_rebuild(result)
+    finally:
+        watcher.close()
+    return result
+
 # CLI wrapper remains for CLI usage
 
 def main():
-    parser = argparse.ArgumentParser(description="LMTokenCook Backend Prototype")
+    # `lookup OUTPUT PATTERN...` reads an existing output instead of cooking (see index.py)
+    if len(sys.argv) > 1 and sys.argv[1] == "lookup":
+        return lookup_main(sys.argv[2:])
+    parser = argparse.ArgumentParser(description="LMTokenCook Backend Prototype",
+                                     epilog="Use `lookup OUTPUT PATTERN...` to find which servings of an output hold some files.")
     parser.add_argument("--input", required=True, help="Input file or directory path")
-    parser.add_argument("--output", required=True, help="Output directory path")
+    parser.add_argument("--output", help="Output directory path (not needed with --dry-run)")
+    parser.add_argument("--output-format", choices=OUTPUT_FORMATS, default=DEFAULT_OUTPUT_FORMAT,
+                        help="Write a directory of servings, or stream them into a single zip, tar.gz or tar.xz archive")
+    parser.add_argument("--manifest-format", choices=MANIFEST_FORMATS, default=DEFAULT_MANIFEST_FORMAT,
+                        help="manifest.json, or manifest.jsonl streamed one line per file (for very large trees)")
     parser.add_argument("--chunk-size", type=int, default=28000, help="Token serving size threshold")
+    parser.add_argument("--workers", type=int, default=1, help="Extraction worker processes (1 = serial)")
+    parser.add_argument("--scan-threads", type=int, default=1, help="Threads for walking sibling directories concurrently")
+    parser.add_argument("--ignore", action="append", default=[], metavar="PATTERN",
+                        help="Gitignore-style pattern to skip (repeatable)")
+    parser.add_argument("--no-gitignore", action="store_true", help="Do not honour .gitignore files in the input tree")
+    parser.add_argument("--encoding", choices=available_encodings(), default=DEFAULT_ENCODING,
+                        help="Tokenizer used for token counts and serving sizes")
+    parser.add_argument("--sanitize", choices=SANITIZE_MODES, default=DEFAULT_SANITIZE_MODE,
+                        help="How to treat lines with characters outside printable ASCII")
+    parser.add_argument("--packing", choices=PACKING_STRATEGIES, default=DEFAULT_PACKING,
+                        help="greedy: fill servings in order; files: keep files whole where possible; balanced: even out serving sizes")
+    parser.add_argument("--cache-dir", nargs="?", const=str(default_cache_dir()), default=None,
+                        help="Reuse extracted text and token counts across runs (no value = default cache location)")
+    parser.add_argument("--cache-size-mb", type=int, default=DEFAULT_CACHE_SIZE_MB, help="Cache size cap before LRU eviction")
+    parser.add_argument("--max-file-mb", type=float, default=DEFAULT_MAX_FILE_BYTES / (1024 * 1024),
+                        help="Skip files larger than this when scanning a directory (0 = no limit)")
+    parser.add_argument("--pdf-max-pages", type=int, default=None, help="Only extract the first N pages of each PDF")
+    parser.add_argument("--pdf-workers", type=int, default=None,
+                        help="Processes to split each long PDF's pages over (default: all cores when --workers is 1)")
+    parser.add_argument("--stream-min-mb", type=float, default=DEFAULT_STREAM_MIN_BYTES / (1024 * 1024),
+                        help="Stream text files at least this large line by line instead of reading them whole")
+    parser.add_argument("--incremental", metavar="PREVIOUS_OUTPUT", default=None,
+                        help="Re-cook a previous output directory in place, re-extracting only changed files")
+    parser.add_argument("--watch", action="store_true",
+                        help="Keep running and re-cook the output in place whenever the input changes (Ctrl+C to stop)")
+    parser.add_argument("--watch-interval", type=float, default=DEFAULT_WATCH_INTERVAL, metavar="SECONDS",
+                        help="How often --watch compares the input tree's mtime/size snapshot")
+    parser.add_argument("--watch-debounce", type=float, default=DEFAULT_WATCH_DEBOUNCE, metavar="SECONDS",
+                        help="How long the tree must stay unchanged before --watch re-cooks, so bursts of writes make one re-cook")
+    parser.add_argument("--watch-backend", choices=WATCH_BACKENDS, default=DEFAULT_WATCH_BACKEND,
+                        help="poll: snapshots only; inotify: also wake up on filesystem events (Linux); auto: inotify when available")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Only scan and count tokens: report totals and projected servings, write nothing")
+    parser.add_argument("--candidate-sizes", type=int, nargs="+", metavar="N", default=None,
+                        help="Chunk sizes to project serving counts for in a dry run (default: --chunk-size and common limits)")
+    parser.add_argument("--estimate", choices=("exact", "sampled", "approx"), default="exact",
+                        help="Dry-run counting: exact BPE, BPE on the head of large text files, or byte-count estimates")
+    parser.add_argument("--sample-bytes", type=int, default=DEFAULT_SAMPLE_BYTES,
+                        help="With --estimate sampled, how much of each large file to tokenize")
+    parser.add_argument("--slowest-files", type=int, default=DEFAULT_SLOWEST_FILES, metavar="N",
+                        help="How many of the slowest files to list in the manifest's performance section")
+    parser.add_argument("--events", action="store_true",
+                        help="Print the per-stage and per-file timing events as JSON lines")
+    parser.add_argument("--profile", nargs="?", const="lmtokencook.prof", default=None, metavar="PATH",
+                        help="Run under cProfile, dump the stats to PATH and print the top entries")
     args = parser.parse_args()
+    if args.dry_run:
+        try:
+            sizes = args.candidate_sizes or sorted({args.chunk_size, *DEFAULT_CANDIDATE_SIZES})
+            result = estimate_lmtokencook(args.input, sizes, encoding=args.encoding, method=args.estimate,
+                                          sample_bytes=args.sample_bytes, packing=args.packing, sanitize=args.sanitize,
+                                          workers=args.workers, scan_threads=args.scan_threads,
+                                          ignore_patterns=args.ignore, use_gitignore=not args.no_gitignore,
+                                          pdf_max_pages=args.pdf_max_pages, max_file_bytes=int(args.max_file_mb * 1024 * 1024) or None)
+            print("\n".join(format_estimate(result)))
+        except Exception as e:
+            print(f"ERROR: {e}")
+        return
+    if not args.output:
+        parser.error("--output is required unless --dry-run is given")
+    event_callback = (lambda event: print(json.dumps(event))) if args.events else None
+    profiler = None
+    if args.profile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    options = dict(workers=args.workers,
+                   cache_dir=args.cache_dir, cache_size_mb=args.cache_size_mb, incremental_from=args.incremental,
+                   scan_threads=args.scan_threads, ignore_patterns=args.ignore, use_gitignore=not args.no_gitignore,
+                   sanitize=args.sanitize, packing=args.packing, encoding=args.encoding,
+                   stream_min_bytes=int(args.stream_min_mb * 1024 * 1024),
+                   pdf_max_pages=args.pdf_max_pages, pdf_workers=args.pdf_workers,
+                   max_file_bytes=int(args.max_file_mb * 1024 * 1024) or None,
+                   event_callback=event_callback, slowest_files=args.slowest_files, output_format=args.output_format,
+                   manifest_format=args.manifest_format)
     try:
-        run_lmtokencook(args.input, args.output, args.chunk_size, progress_callback=print)
+        if args.watch:
+            watch_lmtokencook(args.input, args.output, chunk_size=args.chunk_size, interval=args.watch_interval,
+                              debounce=args.watch_debounce, backend=args.watch_backend, progress_callback=print, **options)
+        else:
+            run_lmtokencook(args.input, args.output, args.chunk_size, progress_callback=print, **options)
+    except KeyboardInterrupt:
+        if not args.watch:
+            raise
+        print("Stopped watching.")
     except Exception as e:
         print(f"ERROR: {e}")
+    finally:
+        if profiler is not None:
+            import pstats
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+            print(f"Profile written to {args.profile} (worker processes are not included)")
+            pstats.Stats(profiler).sort_stats("cumulative").print_stats(20)
 
 
 if __name__ == "__main__":
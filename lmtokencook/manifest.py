@@ -1,10 +1,21 @@
 import json
+import os
 import pathlib
-from typing import List, Dict, Any
+from typing import Any, Dict, Iterable, Iterator, List, Optional
 from datetime import datetime
 
-def build_manifest_metadata(input_path: pathlib.Path, output_subdir: str, scan_counts: dict, serving: dict) -> dict:
-    return {
+# Present in an output directory while a run is writing it
+INCOMPLETE_MARKER = "INCOMPLETE"
+
+# json:  one manifest.json document (metadata, directory_structure, processed_files)
+# jsonl: manifest.jsonl, written as a stream: a "summary" line with the
+#        metadata, one "file" line per file, then a "directory_structure" line
+MANIFEST_FORMATS = ("json", "jsonl")
+DEFAULT_MANIFEST_FORMAT = "json"
+MANIFEST_NAMES = {"json": "manifest.json", "jsonl": "manifest.jsonl"}
+
+def build_manifest_metadata(input_path: pathlib.Path, output_subdir: str, scan_counts: dict, serving: dict, cook_options: dict = None, incremental: dict = None) -> dict:
+    metadata = {
         "input_path": str(input_path.resolve()),
         "output_subdirectory": output_subdir,
         "processing_timestamp_utc": datetime.utcnow().isoformat() + "Z",
@@ -12,12 +23,24 @@ def build_manifest_metadata(input_path: pathlib.Path, output_subdir: str, scan_c
         "total_files_processed": scan_counts.get("processed", 0),
         "total_files_skipped_binary": scan_counts.get("skipped_binary", 0),
         "total_files_skipped_symlink": scan_counts.get("skipped_symlink", 0),
+        "total_paths_ignored": scan_counts.get("skipped_ignored", 0),
         "total_files_failed_extraction": scan_counts.get("failed_extraction", 0),
         "total_estimated_tokens": scan_counts.get("estimated_tokens", 0),
+        "total_lines_dropped": scan_counts.get("dropped_lines", 0),
+        "total_chars_stripped": scan_counts.get("stripped_chars", 0),
+        "total_lines_split": scan_counts.get("split_lines", 0),
+        "cache_hits": scan_counts.get("cache_hits", 0),
+        "cache_misses": scan_counts.get("cache_misses", 0),
         "serving_enabled": serving.get("enabled", False),
         "serving_size_threshold": serving.get("threshold", 0),
-        "servings_created": serving.get("created", 0)
+        "servings_created": serving.get("created", 0),
+        "servings": [{"file": s["file"], "sha256": s["sha256"], "tokens": s.get("tokens", 0)} for s in serving.get("servings", [])],
+        "packing": serving.get("packing"),
+        "cook_options": cook_options or {}
     }
+    if incremental is not None:
+        metadata["incremental"] = incremental
+    return metadata
 
 def write_manifest(
     output_path: pathlib.Path,
@@ -30,5 +53,116 @@ def write_manifest(
         "directory_structure": directory_structure,
         "processed_files": processed_files
     }
-    with open(output_path, "w", encoding="utf-8") as f:
-        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    # Written aside and swapped in, so a manifest on disk is always complete
+    tmp_path = output_path.with_name(f".{output_path.name}.tmp")
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+
+def write_manifest_jsonl(
+    output_path: pathlib.Path,
+    metadata: dict,
+    directory_structure: dict,
+    processed_files: Iterable[Dict[str, Any]]
+) -> int:
+    """
+    Writes manifest.jsonl one line at a time, so processed_files can be a
+    generator and the manifest is never held in memory. Returns the number of
+    file lines written.
+    """
+    tmp_path = output_path.with_name(f".{output_path.name}.tmp")
+    count = 0
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"type": "summary", **metadata}, ensure_ascii=False) + "\n")
+            for entry in processed_files:
+                f.write(json.dumps({"type": "file", **entry}, ensure_ascii=False) + "\n")
+                count += 1
+            f.write(json.dumps({"type": "directory_structure", "directory_structure": directory_structure}, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    return count
+
+
+class EntrySpool:
+    """
+    Per-file manifest entries parked on disk as JSON lines while a cook runs,
+    so a jsonl manifest does not keep one dict per file in memory. Iterating
+    reads them back in order.
+    """
+    def __init__(self, path: pathlib.Path):
+        self.path = pathlib.Path(path)
+        self._f = open(self.path, "w", encoding="utf-8")
+        self.count = 0
+
+    def append(self, entry: Dict[str, Any]):
+        self._f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self.count += 1
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        self._f.flush()
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                yield json.loads(line)
+
+    def close(self):
+        if not self._f.closed:
+            self._f.close()
+        self.path.unlink(missing_ok=True)
+
+
+def find_manifest(output_dir: pathlib.Path) -> Optional[pathlib.Path]:
+    """The manifest.json or manifest.jsonl in output_dir, None if there is neither."""
+    for name in MANIFEST_NAMES.values():
+        path = pathlib.Path(output_dir) / name
+        if path.is_file():
+            return path
+    return None
+
+
+def load_manifest(path: pathlib.Path) -> Dict[str, Any]:
+    """Reads either manifest format into the manifest.json shape."""
+    path = pathlib.Path(path)
+    with open(path, "r", encoding="utf-8") as f:
+        if path.suffix != ".jsonl":
+            return json.load(f)
+        manifest = {"metadata": {}, "directory_structure": {}, "processed_files": []}
+        for line in f:
+            record = json.loads(line)
+            kind = record.pop("type", None)
+            if kind == "summary":
+                manifest["metadata"] = record
+            elif kind == "file":
+                manifest["processed_files"].append(record)
+            elif kind == "directory_structure":
+                manifest["directory_structure"] = record["directory_structure"]
+    return manifest
+
+
+def mark_incomplete(output_dir: pathlib.Path):
+    """
+    Flags output_dir as being (re)written. The marker is removed by
+    mark_complete() once the manifest has been published, so a cancelled or
+    crashed run leaves it behind.
+    """
+    with open(pathlib.Path(output_dir) / INCOMPLETE_MARKER, "w", encoding="utf-8") as f:
+        f.write("This LMTokenCook output is incomplete: the run that wrote it did not finish.\n")
+
+
+def mark_complete(output_dir: pathlib.Path):
+    (pathlib.Path(output_dir) / INCOMPLETE_MARKER).unlink(missing_ok=True)
+
+
+def is_complete(output_dir: pathlib.Path) -> bool:
+    output_dir = pathlib.Path(output_dir)
+    return find_manifest(output_dir) is not None and not (output_dir / INCOMPLETE_MARKER).exists()
@@ -0,0 +1,389 @@
+import hashlib
+import os
+import pathlib
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from itertools import chain
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from lmtokencook.extractors import get_extractor, ExtractionError
+from lmtokencook.tokens import count_line_tokens, count_tokens_split
+from lmtokencook.tokenizers import get_encoding, DEFAULT_ENCODING
+from lmtokencook.sanitize import sanitize_lines, DEFAULT_SANITIZE_MODE
+from lmtokencook.instrument import clock, lap
+
+# Files at least this large are streamed when their extractor has iter_lines()
+DEFAULT_STREAM_MIN_BYTES = 16 * 1024 * 1024
+# Characters of text sanitized and tokenized per streamed batch
+STREAM_BATCH_CHARS = 4 * 1024 * 1024
+
+
+@dataclass
+class FileRecord:
+    """
+    Result of the extraction stage for one file. `lines` is the file's block of
+    master lines (start marker, content, end marker) and `line_tokens` holds one
+    token count per entry in `lines`. `tokens` counts the content lines only.
+
+    `stages` maps "extract", "sanitize" and "tokenize" to the [wall, cpu]
+    seconds spent on this file; it is empty for cached and reused records.
+
+    For paged documents, `pages` holds {"page", "chars", "tokens"} per
+    extracted page and `pages_total` the document's page count.
+
+    A streamed record (see stream_file) holds just the two markers in `lines`
+    and yields its content from `content_batches` as (lines, line_tokens)
+    pairs; its counts and stats are complete once that has been consumed.
+    """
+    relative_path: str
+    absolute_path: str
+    status: str
+    char_count: int = 0
+    lines: List[str] = field(default_factory=list)
+    line_tokens: array = field(default_factory=lambda: array("I"))
+    tokens: int = 0
+    size_bytes: int = 0
+    mtime_ns: int = 0
+    sha256: str = ""
+    dropped_lines: int = 0
+    stripped_chars: int = 0
+    split_lines: int = 0
+    pages: Optional[List[dict]] = None
+    pages_total: int = 0
+    sanitized_chars: int = 0
+    stages: Dict[str, list] = field(default_factory=dict)
+    content_batches: Optional[Iterator[Tuple[List[str], array]]] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.status == "Success"
+
+
+def file_sha256(file_path: pathlib.Path) -> str:
+    h = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def file_block(abs_path: str, content_lines: List[str]) -> List[str]:
+    return [abs_path, *content_lines, f"\n=== File End: {abs_path} ===\n"]
+
+
+def directory_tree_lines(dir_struct: dict) -> List[str]:
+    """The Ingredients block that opens the master: one line per scanned entry, indented by depth."""
+    tree_lines = ["=== Ingredients (Directory Tree) ==="]
+    def _print_tree(d, prefix=""):
+        for k, v in d.items():
+            rel = v.get("rel_path", k)
+            tree_lines.append(f"{prefix}{rel}")
+            if "children" in v:
+                _print_tree(v["children"], prefix + "  ")
+    _print_tree(dir_struct)
+    tree_lines.append("")
+    return tree_lines
+
+
+def _sanitize_pages(page_texts: List[str], sanitize: str, skip_empty_lines: bool):
+    # Each page keeps the "\n" that joins it to the next, so the lines come out
+    # exactly as sanitize_lines gives them for the joined text
+    last = len(page_texts) - 1
+    for i, page_text in enumerate(page_texts):
+        yield sanitize_lines(page_text + "\n" if i < last else page_text, sanitize, skip_empty_lines)
+
+
+def cook_file(file_path: pathlib.Path, base_path: pathlib.Path, enc, add_line_numbers=False, skip_empty_lines=False, sanitize=DEFAULT_SANITIZE_MODE, max_line_tokens=None, pdf_max_pages=None, pdf_workers=1) -> FileRecord:
+    """
+    Extracts, filters and tokenizes a single file. Content lines longer than
+    max_line_tokens are split on token boundaries. Paged documents (extractors
+    with extract_pages) are capped at pdf_max_pages pages, extracted with up to
+    pdf_workers processes and counted page by page. Never raises for a bad file;
+    failures come back as a record whose status starts with "Error:".
+    """
+    rel_path = str(file_path.relative_to(base_path))
+    abs_path = str(file_path.resolve())
+    stages = {}
+    start = clock()
+    try:
+        st = os.stat(file_path)
+        extractor = get_extractor(file_path.suffix.lower())
+        page_texts = None
+        pages_total = 0
+        if hasattr(extractor, "extract_pages"):
+            page_texts, pages_total = extractor.extract_pages(file_path, pdf_max_pages, pdf_workers)
+            text = "\n".join(page_texts)
+        else:
+            text = extractor.extract(file_path)
+        if not text.strip():
+            raise ExtractionError("No text extracted.")
+        sha256 = file_sha256(file_path)
+        start = lap(stages, "extract", start)
+        if page_texts is None:
+            page_results = [sanitize_lines(text, sanitize, skip_empty_lines)]
+        else:
+            page_results = list(_sanitize_pages(page_texts, sanitize, skip_empty_lines))
+        sanitized_chars = sum(sum(map(len, filtered_lines)) for filtered_lines, _, _ in page_results)
+        start = lap(stages, "sanitize", start)
+        content_lines = []
+        content_tokens = array("I")
+        dropped_lines = stripped_chars = split_lines = 0
+        page_token_counts = []
+        line_number = 0
+        for filtered_lines, page_dropped, page_stripped in page_results:
+            if add_line_numbers:
+                filtered_lines = [f"{i}\t{line}" for i, line in enumerate(filtered_lines, start=line_number + 1)]
+                line_number += len(filtered_lines)
+            page_lines, page_tokens, page_split = count_tokens_split(filtered_lines, enc, max_line_tokens)
+            content_lines.extend(page_lines)
+            content_tokens.extend(page_tokens)
+            page_token_counts.append(sum(page_tokens))
+            dropped_lines += page_dropped
+            stripped_chars += page_stripped
+            split_lines += page_split
+        lines = file_block(abs_path, content_lines)
+        start_tokens, end_tokens = count_line_tokens((lines[0], lines[-1]), enc)
+        line_tokens = array("I", (start_tokens,)) + content_tokens + array("I", (end_tokens,))
+        lap(stages, "tokenize", start)
+        pages = None
+        if page_texts is not None:
+            pages = [{"page": i, "chars": len(page_text), "tokens": tokens}
+                     for i, (page_text, tokens) in enumerate(zip(page_texts, page_token_counts), start=1)]
+        return FileRecord(
+            relative_path=rel_path,
+            absolute_path=abs_path,
+            status="Success",
+            char_count=len(text),
+            lines=lines,
+            line_tokens=line_tokens,
+            tokens=sum(line_tokens[1:-1]),
+            size_bytes=st.st_size,
+            mtime_ns=st.st_mtime_ns,
+            sha256=sha256,
+            dropped_lines=dropped_lines,
+            stripped_chars=stripped_chars,
+            split_lines=split_lines,
+            pages=pages,
+            pages_total=pages_total,
+            sanitized_chars=sanitized_chars,
+            stages=stages,
+        )
+    except Exception as e:
+        return FileRecord(relative_path=rel_path, absolute_path=abs_path, status=f"Error: {e}")
+
+
+def _text_batches(raw_lines: Iterator[str], batch_chars: int) -> Iterator[str]:
+    batch, size = [], 0
+    for line in raw_lines:
+        batch.append(line)
+        size += len(line)
+        if size >= batch_chars:
+            yield "".join(batch)
+            batch, size = [], 0
+    if batch:
+        yield "".join(batch)
+
+
+def stream_file(file_path: pathlib.Path, base_path: pathlib.Path, enc, add_line_numbers=False, skip_empty_lines=False, sanitize=DEFAULT_SANITIZE_MODE, max_line_tokens=None, batch_chars=STREAM_BATCH_CHARS) -> FileRecord:
+    """
+    Like cook_file, for an extractor with iter_lines(): the content is not
+    read here but streamed from the record's content_batches, batch_chars of
+    text at a time, so memory does not grow with the file. Sanitisation works
+    line by line, so batching gives the same lines and counts as cook_file.
+    """
+    rel_path = str(file_path.relative_to(base_path))
+    abs_path = str(file_path.resolve())
+    start = clock()
+    try:
+        st = os.stat(file_path)
+        raw_lines = get_extractor(file_path.suffix.lower()).iter_lines(file_path)
+        # Find some content before anything is written, so blank files fail like in cook_file
+        head = []
+        for line in raw_lines:
+            head.append(line)
+            if line.strip():
+                break
+        else:
+            raise ExtractionError("No text extracted.")
+        sha256 = file_sha256(file_path)
+    except Exception as e:
+        return FileRecord(relative_path=rel_path, absolute_path=abs_path, status=f"Error: {e}")
+    markers = file_block(abs_path, [])
+    record = FileRecord(
+        relative_path=rel_path,
+        absolute_path=abs_path,
+        status="Success",
+        lines=markers,
+        line_tokens=count_line_tokens(markers, enc),
+        size_bytes=st.st_size,
+        mtime_ns=st.st_mtime_ns,
+        sha256=sha256,
+    )
+    lap(record.stages, "extract", start)
+
+    def _batches():
+        line_number = 0
+        start = clock()
+        for text in _text_batches(chain(head, raw_lines), batch_chars):
+            start = lap(record.stages, "extract", start)
+            record.char_count += len(text)
+            filtered_lines, dropped_lines, stripped_chars = sanitize_lines(text, sanitize, skip_empty_lines)
+            record.sanitized_chars += sum(map(len, filtered_lines))
+            start = lap(record.stages, "sanitize", start)
+            if add_line_numbers:
+                filtered_lines = [f"{i}\t{line}" for i, line in enumerate(filtered_lines, start=line_number + 1)]
+                line_number += len(filtered_lines)
+            content_lines, content_tokens, split_lines = count_tokens_split(filtered_lines, enc, max_line_tokens)
+            start = lap(record.stages, "tokenize", start)
+            record.tokens += sum(content_tokens)
+            record.dropped_lines += dropped_lines
+            record.stripped_chars += stripped_chars
+            record.split_lines += split_lines
+            yield content_lines, content_tokens
+
+    record.content_batches = _batches()
+    return record
+
+
+def _streamable(file_path: pathlib.Path, stream_min_bytes: Optional[int]) -> bool:
+    if stream_min_bytes is None or not hasattr(get_extractor(file_path.suffix.lower()), "iter_lines"):
+        return False
+    try:
+        return os.stat(file_path).st_size >= stream_min_bytes
+    except OSError:
+        return False
+
+
+# Per-process encoder for pool workers, set once by _init_worker
+_worker_enc = None
+
+
+def _init_worker(encoding_name: str):
+    global _worker_enc
+    _worker_enc = get_encoding(encoding_name)
+
+
+def _cook_file_in_worker(file_path, base_path, add_line_numbers, skip_empty_lines, sanitize, max_line_tokens, pdf_max_pages, pdf_workers) -> FileRecord:
+    return cook_file(file_path, base_path, _worker_enc, add_line_numbers, skip_empty_lines, sanitize, max_line_tokens, pdf_max_pages, pdf_workers)
+
+
+def _cache_key(cache, file_path: pathlib.Path, encoding_name: str, add_line_numbers: bool, skip_empty_lines: bool, sanitize: str, max_line_tokens: Optional[int], pdf_max_pages: Optional[int]):
+    if cache is None:
+        return None
+    extractor = get_extractor(file_path.suffix.lower())
+    options = f"ln={int(add_line_numbers)},skip={int(skip_empty_lines)},sanitize={sanitize},split={max_line_tokens}"
+    if pdf_max_pages is not None and hasattr(extractor, "extract_pages"):
+        options += f",pages={pdf_max_pages}"
+    return cache.make_key(file_path, type(extractor).__name__, encoding_name, options)
+
+
+def _cached_record(cache, key, file_path: pathlib.Path, base_path: pathlib.Path) -> Optional[FileRecord]:
+    if key is None:
+        return None
+    cached = cache.get(key)
+    if cached is None:
+        return None
+    content_lines, line_tokens, tokens, char_count, sha256, stats = cached
+    st = os.stat(file_path)
+    abs_path = str(file_path.resolve())
+    return FileRecord(
+        relative_path=str(file_path.relative_to(base_path)),
+        absolute_path=abs_path,
+        status="Success",
+        char_count=char_count,
+        lines=file_block(abs_path, content_lines),
+        line_tokens=line_tokens,
+        tokens=tokens,
+        size_bytes=st.st_size,
+        mtime_ns=st.st_mtime_ns,
+        sha256=sha256,
+        dropped_lines=stats.get("dropped_lines", 0),
+        stripped_chars=stats.get("stripped_chars", 0),
+        split_lines=stats.get("split_lines", 0),
+        pages=stats.get("pages"),
+        pages_total=stats.get("pages_total", 0),
+    )
+
+
+def iter_file_records(
+    files: Iterable[pathlib.Path],
+    base_path: pathlib.Path,
+    encoding_name: str = DEFAULT_ENCODING,
+    add_line_numbers: bool = False,
+    skip_empty_lines: bool = False,
+    workers: int = 1,
+    cache=None,
+    reuse=None,
+    sanitize: str = DEFAULT_SANITIZE_MODE,
+    max_line_tokens: Optional[int] = None,
+    stream_min_bytes: Optional[int] = DEFAULT_STREAM_MIN_BYTES,
+    pdf_max_pages: Optional[int] = None,
+    pdf_workers: int = 1
+) -> Iterator[FileRecord]:
+    """
+    Yields one FileRecord per file, always in the order of `files`.
+    With workers > 1, extraction and tokenization fan out over a process pool;
+    only a small window of files is in flight at once so memory stays bounded.
+    PDFs are capped at pdf_max_pages pages and each one's pages are split over
+    pdf_workers processes (pass 1 when workers > 1 already fills the cores).
+    With a cache (see cache.ExtractionCache), hits skip extraction entirely
+    and successful misses are stored; the cache is only touched from here.
+    `reuse`, if given, is called as reuse(file_path) after a cache miss and may
+    return a ready FileRecord (e.g. rebuilt from a previous output directory).
+    Files of at least stream_min_bytes whose extractor has iter_lines() are
+    streamed in this process (see stream_file) instead, bypassing the cache,
+    `reuse` and the pool; consume each streamed record's content_batches
+    before asking for the next record. stream_min_bytes=None never streams.
+    Closing the generator early (e.g. on cancel) drops any queued work.
+    """
+    def _store(key, record):
+        if key is not None and record.ok:
+            cache.put(key, record.lines[1:-1], record.line_tokens, record.tokens, record.char_count, record.sha256,
+                      {"dropped_lines": record.dropped_lines, "stripped_chars": record.stripped_chars,
+                       "split_lines": record.split_lines, "pages": record.pages, "pages_total": record.pages_total})
+
+    if workers <= 1:
+        enc = get_encoding(encoding_name)
+        for f in files:
+            if _streamable(f, stream_min_bytes):
+                yield stream_file(f, base_path, enc, add_line_numbers, skip_empty_lines, sanitize, max_line_tokens)
+                continue
+            key = _cache_key(cache, f, encoding_name, add_line_numbers, skip_empty_lines, sanitize, max_line_tokens, pdf_max_pages)
+            record = _cached_record(cache, key, f, base_path) or (reuse(f) if reuse else None)
+            if record is None:
+                record = cook_file(f, base_path, enc, add_line_numbers, skip_empty_lines, sanitize, max_line_tokens, pdf_max_pages, pdf_workers)
+                _store(key, record)
+            yield record
+        return
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(encoding_name,))
+    try:
+        # Each entry is (cache_key, cached FileRecord or Future), kept in file order;
+        # files to stream are queued as their path and opened only when their turn comes
+        enc = None
+        pending = deque()
+        files = iter(files)
+        def _submit_next():
+            f = next(files, None)
+            if f is not None and _streamable(f, stream_min_bytes):
+                pending.append((None, f))
+            elif f is not None:
+                key = _cache_key(cache, f, encoding_name, add_line_numbers, skip_empty_lines, sanitize, max_line_tokens, pdf_max_pages)
+                record = _cached_record(cache, key, f, base_path) or (reuse(f) if reuse else None)
+                if record is None:
+                    record = pool.submit(_cook_file_in_worker, f, base_path, add_line_numbers, skip_empty_lines, sanitize, max_line_tokens, pdf_max_pages, pdf_workers)
+                pending.append((key, record))
+        for _ in range(workers * 4):
+            _submit_next()
+        while pending:
+            key, record = pending.popleft()
+            if isinstance(record, pathlib.Path):
+                enc = enc or get_encoding(encoding_name)
+                record = stream_file(record, base_path, enc, add_line_numbers, skip_empty_lines, sanitize, max_line_tokens)
+            elif not isinstance(record, FileRecord):
+                record = record.result()
+                _store(key, record)
+            _submit_next()
+            yield record
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
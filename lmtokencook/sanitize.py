@@ -0,0 +1,74 @@
+import re
+from typing import List, Tuple
+
+# drop-line:            drop any line with a character outside printable ASCII (0x20-0x7E)
+# strip-chars:          keep the line, remove the characters outside printable ASCII
+# pass-through-unicode: keep unicode text and tabs, remove only control characters
+SANITIZE_MODES = ("drop-line", "strip-chars", "pass-through-unicode")
+DEFAULT_SANITIZE_MODE = "drop-line"
+
+# ASCII control characters that can still occur inside a line after splitlines()
+_INLINE_ASCII_CONTROL = re.compile(r"[\x00-\x09\x0e-\x1b\x1f\x7f]")
+_NOT_PRINTABLE_ASCII = re.compile(r"[^\x20-\x7e]+")
+_CONTROL = re.compile(r"[\x00-\x08\x0e-\x1b\x1f\x7f-\x84\x86-\x9f]+")
+
+# Byte tables for bytes.translate(); the characters str.splitlines() breaks on are kept
+_ASCII_CONTROL_BYTES = bytes(range(0x00, 0x0a)) + bytes(range(0x0e, 0x1c)) + b"\x1f\x7f"
+_C0_CONTROL_BYTES = bytes(range(0x00, 0x09)) + bytes(range(0x0e, 0x1c)) + b"\x1f\x7f"
+_C1_CONTROL_UTF8 = re.compile(rb"\xc2[\x80-\x84\x86-\x9f]")
+_UNICODE_LINE_BREAKS = ("\x85", "\u2028", "\u2029")
+
+
+def _strip_whole_text(text: str, mode: str):
+    """
+    Removes the mode's characters from the whole text in a few C-level bytes
+    passes. Returns None when that could change where lines break.
+    """
+    if mode == "strip-chars":
+        if any(c in text for c in _UNICODE_LINE_BREAKS):
+            return None
+        return text.encode("ascii", "ignore").translate(None, _ASCII_CONTROL_BYTES).decode("ascii")
+    data = text.encode("utf-8", "surrogatepass").translate(None, _C0_CONTROL_BYTES)
+    if b"\xc2" in data:
+        data = _C1_CONTROL_UTF8.sub(b"", data)
+    return data.decode("utf-8", "surrogatepass")
+
+
+def _strip_lines(text: str, lines: List[str], mode: str) -> List[str]:
+    cleaned_text = _strip_whole_text(text, mode)
+    if cleaned_text is not None:
+        if len(cleaned_text) == len(text):
+            return lines
+        cleaned = cleaned_text.splitlines()
+        if len(cleaned) == len(lines):
+            return cleaned
+    # Removal joined a "\r" to a "\n" or emptied the last line; redo it line by line
+    sub = (_NOT_PRINTABLE_ASCII if mode == "strip-chars" else _CONTROL).sub
+    return [sub("", line) for line in lines]
+
+
+def sanitize_lines(text: str, mode: str = DEFAULT_SANITIZE_MODE, skip_empty_lines: bool = False) -> Tuple[List[str], int, int]:
+    """
+    Splits extracted text into lines and applies the sanitisation mode using
+    whole-text checks and C-level string/bytes operations instead of a
+    per-character loop. Returns (lines, dropped_lines, stripped_chars); lines
+    removed only because of skip_empty_lines are not counted as dropped.
+    """
+    if mode not in SANITIZE_MODES:
+        raise ValueError(f"Unknown sanitize mode: {mode}")
+    dropped = 0
+    stripped = 0
+    lines = text.splitlines()
+    # Fast path: pure printable ASCII text needs no per-line work
+    if not text.isascii() or _INLINE_ASCII_CONTROL.search(text) is not None:
+        if mode == "drop-line":
+            kept = [line for line in lines if line.isascii() and line.isprintable()]
+            dropped = len(lines) - len(kept)
+            lines = kept
+        else:
+            cleaned = _strip_lines(text, lines, mode)
+            stripped = sum(map(len, lines)) - sum(map(len, cleaned))
+            lines = cleaned
+    if skip_empty_lines:
+        lines = [line for line in lines if line.strip()]
+    return lines, dropped, stripped
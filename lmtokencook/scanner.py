@@ -1,12 +1,16 @@
+import codecs
 import os
 import pathlib
-from typing import List, Tuple
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Optional, Tuple
+from lmtokencook.ignore import DEFAULT_IGNORE_PATTERNS, IgnoreRules, to_posix
+from lmtokencook.extractors import get_extractor, PlainTextExtractor
 
 # === Whitelist of safe, human-readable text/code/document extensions ===
 # Edit this list to add/remove types as needed
 INCLUDE_EXTENSIONS = {
     # Plain text & docs
-    '.txt', '.md', '.rst', '.csv', '.tsv', '.json', '.yaml', '.yml', '.xml', '.ini', '.cfg', '.log', '.docx', '.rtf', '.env', '.conf', '.properties',
+    '.txt', '.md', '.rst', '.csv', '.tsv', '.json', '.yaml', '.yml', '.xml', '.ini', '.cfg', '.log', '.docx', '.pdf', '.rtf', '.env', '.conf', '.properties',
     # Code
     '.py', '.js', '.ts', '.java', '.c', '.cpp', '.h', '.hpp', '.cs', '.go', '.rb', '.sh', '.bat', '.ps1', '.toml', '.html', '.htm', '.css', '.scss', '.less', '.php', '.pl', '.swift', '.kt', '.rs', '.m', '.scala', '.vb', '.dart', '.sql', '.r', '.jl', '.lua', '.asm',
     # Jupyter
@@ -14,7 +18,7 @@ INCLUDE_EXTENSIONS = {
 }
 # === Blacklist of extensions that are always excluded (binary, encoded, media, machine code, etc) ===
 EXCLUDE_EXTENSIONS = {
-    '.enc', '.pdf', '.exe', '.dll', '.so', '.app', '.dmg', '.pkg', '.deb', '.rpm', '.zip', '.gz', '.tar', '.rar', '.7z', '.bin', '.dat', '.o', '.obj', '.a', '.lib', '.class', '.jar', '.apk', '.ipa', '.iso', '.img', '.dmg', '.pkl', '.db', '.sqlite', '.mp3', '.wav', '.flac', '.ogg', '.mp4', '.avi', '.mov', '.mkv', '.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', '.ico', '.svg', '.bz2', '.xz'
+    '.enc', '.exe', '.dll', '.so', '.app', '.dmg', '.pkg', '.deb', '.rpm', '.zip', '.gz', '.tar', '.rar', '.7z', '.bin', '.dat', '.o', '.obj', '.a', '.lib', '.class', '.jar', '.apk', '.ipa', '.iso', '.img', '.dmg', '.pkl', '.db', '.sqlite', '.mp3', '.wav', '.flac', '.ogg', '.mp4', '.avi', '.mov', '.mkv', '.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', '.ico', '.svg', '.bz2', '.xz'
 }
 
 BINARY_EXTENSIONS = {
@@ -23,39 +27,179 @@ BINARY_EXTENSIONS = {
     '.mp4', '.avi', '.mov', '.mkv', '.wmv'
 } # Kept for legacy, but now only INCLUDE_EXTENSIONS matter.
 
-def scan_directory(input_path: pathlib.Path) -> Tuple[List[pathlib.Path], dict]:
+# === Content checks for candidate files ===
+# Larger files are skipped as 'too_large' (None = no limit)
+DEFAULT_MAX_FILE_BYTES = 512 * 1024 * 1024
+# Plain-text candidates are sniffed from their first SNIFF_BYTES on a thread pool
+SNIFF_BYTES = 8192
+DEFAULT_SNIFF_THREADS = 8
+# Control bytes that do not occur in text (tab, newlines, form feed, backspace and escape do)
+_BINARY_CONTROL_BYTES = bytes(b for b in range(32) if b not in b"\t\n\v\f\r\b\x1b") + b"\x7f"
+
+def _suffix(name: str) -> str:
+    # Same rule as pathlib.PurePath.suffix, without building a Path per entry
+    i = name.rfind('.')
+    return name[i:] if 0 < i < len(name) - 1 else ''
+
+
+def binary_reason(head: bytes) -> Optional[str]:
     """
-    Recursively scan directory, filter files, skip binaries/symlinks.
+    Why the first bytes of a file look binary: 'nul_bytes', 'undecodable'
+    (not UTF-8 and full of control or high bytes, so not just a legacy
+    8-bit encoding either) or None for text.
+    """
+    if b"\0" in head:
+        return 'nul_bytes'
+    try:
+        # final=False: a character cut off by the read is fine
+        codecs.getincrementaldecoder('utf-8')().decode(head, final=False)
+        return None
+    except UnicodeDecodeError:
+        pass
+    controls = len(head) - len(head.translate(None, _BINARY_CONTROL_BYTES))
+    high = sum(1 for b in head if b >= 0x80)
+    if controls > len(head) * 0.05 or high > len(head) * 0.3:
+        return 'undecodable'
+    return None
+
+
+def _sniff(path: str, rel: str, struct: dict, max_file_bytes: Optional[int]) -> list:
+    # Runs on the sniff pool; fills in the entry _scan_tree reserved for the file
+    try:
+        size = os.stat(path).st_size
+        if max_file_bytes is not None and size > max_file_bytes:
+            struct.update({'processed': False, 'skipped': 'too_large', 'size_bytes': size})
+            return [(path, 'too_large')]
+        reason = None
+        if isinstance(get_extractor(_suffix(os.path.basename(path)).lower()), PlainTextExtractor):
+            with open(path, 'rb') as f:
+                reason = binary_reason(f.read(SNIFF_BYTES))
+    except OSError:
+        reason = None   # unreadable: left to extraction, which reports the error
+    if reason is not None:
+        struct.update({'processed': False, 'skipped': 'binary', 'binary': reason})
+        return [(path, f'binary: {reason}')]
+    struct.update({'processed': True, 'rel_path': rel})
+    return [pathlib.Path(path)]
+
+
+def _list_dir(path: str) -> list:
+    with os.scandir(path) as it:
+        return list(it)
+
+
+def _open_dir(path: str, rel: str, rules: IgnoreRules, use_gitignore: bool):
+    # A directory's own .gitignore applies to everything listed in it
+    entries = _list_dir(path)
+    if use_gitignore:
+        for entry in entries:
+            if entry.name == '.gitignore' and entry.is_file(follow_symlinks=False):
+                rules = rules.with_gitignore(entry.path, to_posix(rel))
+                break
+    return iter(entries), rules
+
+
+def _scan_tree(root: str, root_rel: str, root_struct: dict, rules: IgnoreRules, use_gitignore: bool, pool, depth: int, parallel_depth: int,
+               sniff_pool, max_file_bytes: Optional[int]) -> list:
+    """
+    Iterative pre-order walk of one subtree using cached DirEntry type info.
+    Ignored directories are recorded once and never entered.
+    Returns an ordered list of items: (path, reason) tuples (skipped files),
+    Futures of candidate files being size-checked and sniffed on sniff_pool
+    and, when a thread pool is given, Futures of nested subtrees that are
+    scanned concurrently. Every Future resolves to a list of items.
+    """
+    items = []
+    stack = [(*_open_dir(root, root_rel, rules, use_gitignore), root_rel, root_struct, depth)]
+    while stack:
+        entries, cur_rules, rel, cur_struct, d = stack[-1]
+        entry = next(entries, None)
+        if entry is None:
+            stack.pop()
+            continue
+        name = entry.name
+        if entry.is_symlink():
+            cur_struct[name] = {'processed': False, 'skipped': 'symlink'}
+            continue
+        entry_rel = name if not rel else rel + os.sep + name
+        is_dir = entry.is_dir(follow_symlinks=False)
+        if cur_rules:
+            rule = cur_rules.match(to_posix(entry_rel), is_dir)
+            if rule is not None:
+                cur_struct[name] = {'processed': False, 'skipped': 'ignored', 'ignored_by': rule.pattern}
+                continue
+        # Always skip any .venv directory for privacy/security reasons
+        if is_dir:
+            if name == '.venv':
+                cur_struct[name] = {'processed': False, 'skipped': '.venv'}
+                continue
+            child = cur_struct[name] = {}
+            if pool is not None and d < parallel_depth:
+                items.append(pool.submit(_scan_tree, entry.path, entry_rel, child, cur_rules, use_gitignore, pool, d + 1, parallel_depth,
+                                         sniff_pool, max_file_bytes))
+            else:
+                stack.append((*_open_dir(entry.path, entry_rel, cur_rules, use_gitignore), entry_rel, child, d + 1))
+        elif entry.is_file(follow_symlinks=False):
+            ext = _suffix(name).lower()
+            # Only allow specific plain text/code/document files, plus extensionless
+            # names like Makefile or Dockerfile, and only if their content agrees
+            if ext in EXCLUDE_EXTENSIONS:
+                cur_struct[name] = {'processed': False, 'skipped': 'explicitly_excluded'}
+                items.append((entry.path, 'explicitly_excluded'))
+            elif ext in INCLUDE_EXTENSIONS or (not ext and not name.startswith('.')):
+                # Reserve the entry now so the structure keeps directory order
+                child = cur_struct[name] = {}
+                items.append(sniff_pool.submit(_sniff, entry.path, entry_rel, child, max_file_bytes))
+            else:
+                cur_struct[name] = {'processed': False, 'skipped': 'not_plaintext'}
+                items.append((entry.path, 'not_plaintext'))
+    return items
+
+
+def _flatten(items: list, files: list, skipped_files: list):
+    for item in items:
+        if isinstance(item, Future):
+            _flatten(item.result(), files, skipped_files)
+        elif isinstance(item, tuple):
+            skipped_files.append(item)
+        else:
+            files.append(item)
+
+
+def scan_directory(
+    input_path: pathlib.Path,
+    threads: int = 1,
+    parallel_depth: int = 2,
+    ignore_patterns: Optional[List[str]] = None,
+    use_gitignore: bool = True,
+    max_file_bytes: Optional[int] = DEFAULT_MAX_FILE_BYTES,
+    sniff_threads: int = DEFAULT_SNIFF_THREADS
+) -> Tuple[List[pathlib.Path], dict]:
+    """
+    Scan directory with os.scandir, filter files, skip binaries/symlinks.
+    Paths matching DEFAULT_IGNORE_PATTERNS, ignore_patterns (gitignore syntax,
+    relative to input_path) or any .gitignore in the tree are pruned: an ignored
+    directory gets a single 'ignored' entry in the structure and is not entered.
+    With threads > 1, subtrees down to parallel_depth levels are walked
+    concurrently; the result is identical to a serial scan.
+    Candidate files larger than max_file_bytes are skipped as 'too_large', and
+    plain-text candidates whose first SNIFF_BYTES look binary (see
+    binary_reason) as 'binary'; these checks run on sniff_threads threads.
     Returns (list_of_files, directory_structure_dict)
     """
+    rules = IgnoreRules.from_patterns(DEFAULT_IGNORE_PATTERNS + list(ignore_patterns or []))
     files = []
     dir_struct = {}
     skipped_files = []  # For summary logging
-    def _scan_dir(cur_path, cur_struct):
-        for entry in cur_path.iterdir():
-            if entry.is_symlink():
-                cur_struct[entry.name] = {'processed': False, 'skipped': 'symlink'}
-                continue
-            # Always skip any .venv directory for privacy/security reasons
-            if entry.is_dir():
-                if entry.name == '.venv':
-                    cur_struct[entry.name] = {'processed': False, 'skipped': '.venv'}
-                    continue
-                cur_struct[entry.name] = {}
-                _scan_dir(entry, cur_struct[entry.name])
-            elif entry.is_file():
-                ext = entry.suffix.lower()
-                # Only allow specific plain text/code/document files
-                if ext in EXCLUDE_EXTENSIONS:
-                    cur_struct[entry.name] = {'processed': False, 'skipped': 'explicitly_excluded'}
-                    skipped_files.append((str(entry), 'explicitly_excluded'))
-                elif ext in INCLUDE_EXTENSIONS:
-                    cur_struct[entry.name] = {'processed': True, 'rel_path': str(entry.relative_to(input_path))}
-                    files.append(entry)
-                else:
-                    cur_struct[entry.name] = {'processed': False, 'skipped': 'not_plaintext'}
-                    skipped_files.append((str(entry), 'not_plaintext'))
-    _scan_dir(input_path, dir_struct)
+    input_path = pathlib.Path(input_path)
+    with ThreadPoolExecutor(max_workers=max(sniff_threads, 1), thread_name_prefix="lmtc-sniff") as sniff_pool:
+        if threads > 1:
+            with ThreadPoolExecutor(max_workers=threads, thread_name_prefix="lmtc-scan") as pool:
+                items = _scan_tree(str(input_path), '', dir_struct, rules, use_gitignore, pool, 0, parallel_depth, sniff_pool, max_file_bytes)
+                _flatten(items, files, skipped_files)
+        else:
+            items = _scan_tree(str(input_path), '', dir_struct, rules, use_gitignore, None, 0, 0, sniff_pool, max_file_bytes)
+            _flatten(items, files, skipped_files)
     # Print a summary of skipped files (optional, can be removed or redirected to a logger)
     if skipped_files:
         print(f"[LMTokenCook] Skipped {len(skipped_files)} files not suitable for plain text processing:")
@@ -64,3 +208,67 @@ def scan_directory(input_path: pathlib.Path) -> Tuple[List[pathlib.Path], dict]:
         if len(skipped_files) > 10:
             print(f"  ...and {len(skipped_files)-10} more.")
     return files, dir_struct
+
+
+def count_skipped(dir_struct: dict, reason: str) -> int:
+    """Counts entries in a scan_directory structure skipped for `reason`."""
+    count = 0
+    stack = [dir_struct]
+    while stack:
+        for value in stack.pop().values():
+            if not isinstance(value, dict):
+                continue
+            # Entries are {'processed': bool, 'skipped' or 'rel_path': ...}; directories map
+            # names to entries, so a file named 'processed' holds a dict, never a bool
+            if isinstance(value.get('processed'), bool) and ('skipped' in value or 'rel_path' in value):
+                if value.get('skipped') == reason:
+                    count += 1
+            else:
+                stack.append(value)
+    return count
+
+
+def snapshot_tree(
+    input_path: pathlib.Path,
+    ignore_patterns: Optional[List[str]] = None,
+    use_gitignore: bool = True
+) -> dict:
+    """
+    Cheap change-detection snapshot of what scan_directory would look at:
+    {relative path: (size, mtime_ns)} for every file that is not ignored, and
+    {relative path + os.sep: None} for every directory (so empty ones count).
+    Only directory listings and stats; nothing is opened or sniffed, so two
+    snapshots that compare equal mean a re-scan would find the same tree.
+    """
+    input_path = pathlib.Path(input_path)
+    if input_path.is_file():
+        st = os.stat(input_path)
+        return {input_path.name: (st.st_size, st.st_mtime_ns)}
+    rules = IgnoreRules.from_patterns(DEFAULT_IGNORE_PATTERNS + list(ignore_patterns or []))
+    snapshot = {}
+    stack = [(*_open_dir(str(input_path), '', rules, use_gitignore), '')]
+    while stack:
+        entries, cur_rules, rel = stack[-1]
+        entry = next(entries, None)
+        if entry is None:
+            stack.pop()
+            continue
+        if entry.is_symlink():
+            continue
+        entry_rel = entry.name if not rel else rel + os.sep + entry.name
+        is_dir = entry.is_dir(follow_symlinks=False)
+        if cur_rules and cur_rules.match(to_posix(entry_rel), is_dir) is not None:
+            continue
+        try:
+            if is_dir:
+                if entry.name == '.venv':
+                    continue
+                snapshot[entry_rel + os.sep] = None
+                stack.append((*_open_dir(entry.path, entry_rel, cur_rules, use_gitignore), entry_rel))
+            elif entry.is_file(follow_symlinks=False):
+                st = entry.stat(follow_symlinks=False)
+                snapshot[entry_rel] = (st.st_size, st.st_mtime_ns)
+        except OSError:
+            # Removed between listing and stat: the next snapshot settles it
+            continue
+    return snapshot
@@ -0,0 +1,141 @@
+import json
+import math
+import os
+import pathlib
+import threading
+from typing import Callable, Dict, Iterable, List, Optional
+import tiktoken
+
+DEFAULT_ENCODING = "cl100k_base"
+
+_loaders: Dict[str, Callable[[], object]] = {}
+_encoders: Dict[str, object] = {}
+_lock = threading.Lock()
+
+
+def register_encoding(name: str, loader: Callable[[], object]):
+    """
+    Registers a named encoding. `loader` is called at most once per process and
+    must return an object with tiktoken's encode_ordinary()/decode_bytes().
+    """
+    with _lock:
+        _loaders[name] = loader
+        _encoders.pop(name, None)
+
+
+for _name in ("cl100k_base", "o200k_base", "p50k_base", "r50k_base"):
+    register_encoding(_name, lambda _name=_name: tiktoken.get_encoding(_name))
+
+
+def available_encodings() -> List[str]:
+    return sorted(_loaders)
+
+
+def get_encoding(name: str = DEFAULT_ENCODING):
+    """
+    Returns the shared encoder for `name`, loading it on first use. Encoders
+    are thread-safe and cached per process, so threads share one instance and
+    each worker process loads its own once (forked workers inherit the parent's).
+    """
+    with _lock:
+        enc = _encoders.get(name)
+        if enc is None:
+            if name not in _loaders:
+                raise ValueError(f"Unknown encoding: {name} (available: {', '.join(sorted(_loaders))})")
+            enc = _encoders[name] = _loaders[name]()
+        return enc
+
+
+# Bytes on disk per cl100k_base token, by file type, before any calibration
+DEFAULT_BYTES_PER_TOKEN = {
+    ".txt": 4.2, ".md": 4.0, ".rst": 4.0,
+    ".py": 3.6, ".js": 3.4, ".ts": 3.4, ".java": 3.8, ".c": 3.5, ".cpp": 3.5, ".h": 3.6,
+    ".go": 3.6, ".rs": 3.6, ".rb": 3.6, ".sh": 3.4,
+    ".json": 3.0, ".yaml": 3.4, ".yml": 3.4, ".toml": 3.4, ".xml": 3.0, ".html": 3.1, ".css": 3.2,
+    ".csv": 2.8, ".sql": 3.6,
+    ".pdf": 12.0, ".docx": 18.0,
+}
+DEFAULT_RATIO = 3.8
+
+
+class ApproxEstimator:
+    """
+    Token estimates from byte counts alone: bytes on disk divided by a
+    bytes-per-token ratio for the file type. Ratios start from
+    DEFAULT_BYTES_PER_TOKEN and can be calibrated against a real encoding on
+    a few sample files per type, after which estimates need only a stat().
+    """
+    def __init__(self, ratios: Optional[Dict[str, float]] = None, default_ratio: float = DEFAULT_RATIO,
+                 encoding_name: str = DEFAULT_ENCODING):
+        self.ratios = dict(DEFAULT_BYTES_PER_TOKEN if ratios is None else ratios)
+        self.default_ratio = default_ratio
+        self.encoding_name = encoding_name
+        self.calibrated = {}    # suffix -> number of sample files measured
+
+    def ratio(self, suffix: str) -> float:
+        return self.ratios.get(suffix.lower(), self.default_ratio)
+
+    def estimate_bytes(self, nbytes: int, suffix: str = "") -> int:
+        return math.ceil(nbytes / self.ratio(suffix)) if nbytes > 0 else 0
+
+    def estimate_file(self, file_path: pathlib.Path) -> int:
+        file_path = pathlib.Path(file_path)
+        return self.estimate_bytes(os.stat(file_path).st_size, file_path.suffix)
+
+    def estimate_text(self, text: str, suffix: str = "") -> int:
+        return self.estimate_bytes(len(text.encode("utf-8")), suffix)
+
+    def calibrate(self, files: Iterable[pathlib.Path], enc=None, samples_per_type: int = 5,
+                  extract: Optional[Callable[[pathlib.Path], str]] = None) -> Dict[str, float]:
+        """
+        Measures bytes on disk per real token for up to samples_per_type files
+        of each suffix (extracted the same way the cook does, so PDF and DOCX
+        ratios account for their container overhead) and updates the ratios.
+        Returns the new ratios for the calibrated suffixes.
+        """
+        if enc is None:
+            enc = get_encoding(self.encoding_name)
+        if extract is None:
+            from lmtokencook.extractors import get_extractor
+            extract = lambda p: get_extractor(p.suffix.lower()).extract(p)
+        totals = {}     # suffix -> [bytes, tokens, files]
+        for file_path in files:
+            file_path = pathlib.Path(file_path)
+            suffix = file_path.suffix.lower()
+            total = totals.setdefault(suffix, [0, 0, 0])
+            if total[2] >= samples_per_type:
+                continue
+            try:
+                nbytes = os.stat(file_path).st_size
+                tokens = len(enc.encode_ordinary(extract(file_path)))
+            except Exception:
+                continue
+            if tokens:
+                total[0] += nbytes
+                total[1] += tokens
+                total[2] += 1
+        measured = {}
+        for suffix, (nbytes, tokens, count) in totals.items():
+            if tokens:
+                measured[suffix] = self.ratios[suffix] = nbytes / tokens
+                self.calibrated[suffix] = count
+        return measured
+
+    def to_dict(self) -> dict:
+        return {"encoding": self.encoding_name, "default_ratio": self.default_ratio,
+                "ratios": self.ratios, "calibrated": self.calibrated}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ApproxEstimator":
+        estimator = cls(data.get("ratios"), data.get("default_ratio", DEFAULT_RATIO), data.get("encoding", DEFAULT_ENCODING))
+        estimator.calibrated = dict(data.get("calibrated", {}))
+        return estimator
+
+    def save(self, path: pathlib.Path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    @classmethod
+    def load(cls, path: pathlib.Path) -> "ApproxEstimator":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
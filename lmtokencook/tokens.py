@@ -0,0 +1,158 @@
+import os
+import threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Lines per batch handed to one tokenizer thread. Inputs shorter than this are
+# counted inline, where thread hand-off would cost more than it saves.
+DEFAULT_BATCH_SIZE = 4096
+DEFAULT_NUM_THREADS = min(8, os.cpu_count() or 1)
+
+_pool = None
+_pool_threads = 0
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool(num_threads: int) -> ThreadPoolExecutor:
+    # One shared pool per process (tiktoken releases the GIL while encoding).
+    # A forked extraction worker must not reuse its parent's pool object.
+    global _pool, _pool_threads, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid() or _pool_threads < num_threads:
+            if _pool is not None and _pool_pid == os.getpid():
+                # Growing: work already queued on the old pool still finishes, then its threads exit
+                _pool.shutdown(wait=False)
+            _pool = ThreadPoolExecutor(max_workers=num_threads, thread_name_prefix="lmtc-tokens")
+            _pool_threads = num_threads
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def _count_batch(enc, strings: Sequence[str]) -> List[int]:
+    encode = enc.encode_ordinary
+    return [len(encode(s)) for s in strings]
+
+
+def _encode_batch(enc, strings: Sequence[str], max_tokens: int) -> Tuple[List[int], Dict[int, List[int]]]:
+    # Like _count_batch, but keeps the token ids of strings longer than max_tokens
+    encode = enc.encode_ordinary
+    counts = []
+    oversize = {}
+    for i, s in enumerate(strings):
+        tokens = encode(s)
+        counts.append(len(tokens))
+        if len(tokens) > max_tokens:
+            oversize[i] = tokens
+    return counts, oversize
+
+
+def count_line_tokens(lines: Iterable[str], enc) -> array:
+    """
+    Per-call path: encodes every line exactly once, one encoder call per line,
+    and returns the per-line token counts as a compact unsigned int array
+    (4 bytes per line). Kept as the fallback for count_tokens.
+    """
+    return array("I", (len(enc.encode_ordinary(line)) for line in lines))
+
+
+def count_tokens(
+    strings: Iterable[str],
+    enc,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    num_threads: int = DEFAULT_NUM_THREADS,
+    backend: str = "batch"
+) -> array:
+    """
+    Counts tokens for each string and returns one count per string, in order.
+    The "batch" backend splits the input into batches and counts them
+    concurrently on a shared thread pool; "simple" is the per-call path.
+    Both return identical counts.
+    """
+    if backend not in ("batch", "simple"):
+        raise ValueError(f"Unknown tokenization backend: {backend}")
+    if not isinstance(strings, list):
+        strings = list(strings)
+    if backend == "simple" or num_threads <= 1 or len(strings) <= batch_size:
+        return count_line_tokens(strings, enc)
+    batches = [strings[i:i + batch_size] for i in range(0, len(strings), batch_size)]
+    counts = array("I")
+    for batch_counts in _get_pool(num_threads).map(lambda b: _count_batch(enc, b), batches):
+        counts.extend(batch_counts)
+    return counts
+
+
+def _decode_prefix(enc, tokens: List[int], start: int, end: int) -> Tuple[int, str]:
+    """
+    Decodes tokens[start:end], moving `end` back (or, for budgets smaller than
+    one character, forward) so a multi-byte character is never cut in two.
+    Returns (end, text).
+    """
+    for cut in chain(range(end, start, -1), range(end + 1, len(tokens) + 1)):
+        try:
+            return cut, enc.decode_bytes(tokens[start:cut]).decode("utf-8")
+        except UnicodeDecodeError:
+            continue
+    return len(tokens), enc.decode_bytes(tokens[start:]).decode("utf-8", "replace")
+
+
+def split_tokens(enc, tokens: List[int], max_tokens: int) -> List[Tuple[str, int]]:
+    """
+    Splits an encoded string into pieces of at most max_tokens tokens by
+    decoding slices of the token array. Returns (text, token_count) per piece.
+    """
+    pieces = []
+    start = 0
+    while start < len(tokens):
+        end, text = _decode_prefix(enc, tokens, start, min(start + max_tokens, len(tokens)))
+        pieces.append((text, end - start))
+        start = end
+    return pieces
+
+
+def count_tokens_split(
+    strings: Iterable[str],
+    enc,
+    max_tokens: Optional[int],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    num_threads: int = DEFAULT_NUM_THREADS
+) -> Tuple[List[str], array, int]:
+    """
+    Counts tokens like count_tokens, and replaces every string longer than
+    max_tokens tokens with pieces cut on token boundaries from its own
+    encoding (the text is not encoded again). Returns (strings, counts,
+    number of strings split). With max_tokens=None nothing is split.
+    """
+    if not isinstance(strings, list):
+        strings = list(strings)
+    if max_tokens is None:
+        return strings, count_tokens(strings, enc, batch_size, num_threads), 0
+    if max_tokens < 1:
+        raise ValueError("max_tokens must be at least 1")
+    if num_threads <= 1 or len(strings) <= batch_size:
+        results = [_encode_batch(enc, strings, max_tokens)]
+        batch_size = max(len(strings), 1)
+    else:
+        batches = [strings[i:i + batch_size] for i in range(0, len(strings), batch_size)]
+        results = _get_pool(num_threads).map(lambda b: _encode_batch(enc, b, max_tokens), batches)
+    out_strings = []
+    counts = array("I")
+    split = 0
+    for batch_index, (batch_counts, oversize) in enumerate(results):
+        offset = batch_index * batch_size
+        if not oversize:
+            out_strings.extend(strings[offset:offset + len(batch_counts)])
+            counts.extend(batch_counts)
+            continue
+        for i, count in enumerate(batch_counts):
+            if i in oversize:
+                split += 1
+                for text, piece_count in split_tokens(enc, oversize[i], max_tokens):
+                    out_strings.append(text)
+                    counts.append(piece_count)
+            else:
+                out_strings.append(strings[offset + i])
+                counts.append(count)
+    return out_strings, counts, split
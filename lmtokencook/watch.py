@@ -0,0 +1,143 @@
+"""
+Change detection for watch mode (run_lmtokencook's long-running sibling,
+main.watch_lmtokencook). What changed is always decided by comparing
+scanner.snapshot_tree snapshots; a watcher only decides when to look again.
+PollWatcher sleeps for the poll interval; InotifyWatcher (Linux, through
+libc, no extra dependency) wakes up as soon as something in the tree moves.
+"""
+import ctypes
+import ctypes.util
+import os
+import select
+import sys
+import threading
+from typing import Dict, Iterable, Optional
+
+WATCH_BACKENDS = ("auto", "poll", "inotify")
+DEFAULT_WATCH_BACKEND = "auto"
+DEFAULT_WATCH_INTERVAL = 1.0
+DEFAULT_WATCH_DEBOUNCE = 2.0
+# A tree that never settles (say, a log being appended to) is still rebuilt
+# once this many debounce periods have passed since its first change
+MAX_DEBOUNCE_PERIODS = 20
+# With inotify the tree is still re-snapshotted this often, in case events were lost
+INOTIFY_RESCAN_SECONDS = 60.0
+
+# <sys/inotify.h>
+_IN_MODIFY = 0x002
+_IN_ATTRIB = 0x004
+_IN_CLOSE_WRITE = 0x008
+_IN_MOVED_FROM = 0x040
+_IN_MOVED_TO = 0x080
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+_IN_DELETE_SELF = 0x400
+_IN_MOVE_SELF = 0x800
+_IN_ONLYDIR = 0x01000000
+_WATCH_MASK = (_IN_MODIFY | _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+               | _IN_DELETE_SELF | _IN_MOVE_SELF | _IN_ONLYDIR)
+
+
+def diff_snapshots(old: Dict, new: Dict) -> Dict[str, int]:
+    """Counts of files added, modified and removed between two snapshot_tree snapshots."""
+    counts = {"added": 0, "modified": 0, "removed": 0}
+    for path, stat in new.items():
+        if path.endswith(os.sep):
+            continue
+        if path not in old:
+            counts["added"] += 1
+        elif old[path] != stat:
+            counts["modified"] += 1
+    counts["removed"] = sum(1 for path in old if path not in new and not path.endswith(os.sep))
+    return counts
+
+
+class PollWatcher:
+    name = "poll"
+
+    def __init__(self, stop_flag: Optional[threading.Event] = None):
+        self.stop_flag = stop_flag if stop_flag is not None else threading.Event()
+
+    def watch(self, directories: Iterable[str]):
+        pass
+
+    def wait(self, timeout: float) -> bool:
+        """Waits up to timeout seconds; True if the tree was seen to change meanwhile (never, when polling)."""
+        self.stop_flag.wait(timeout)
+        return False
+
+    def rescan_interval(self, interval: float) -> float:
+        return interval
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher(PollWatcher):
+    """
+    Wakes up on inotify events from every directory of the tree. Raises
+    OSError if inotify is not available (not Linux, or out of watches).
+    """
+    name = "inotify"
+
+    def __init__(self, stop_flag: Optional[threading.Event] = None):
+        super().__init__(stop_flag)
+        if not sys.platform.startswith("linux"):
+            raise OSError("inotify is only available on Linux")
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._watched = set()
+
+    def watch(self, directories: Iterable[str]):
+        """Adds watches for directories not watched yet (removed ones drop their watch by themselves)."""
+        directories = set(directories)
+        for directory in directories - self._watched:
+            if self._libc.inotify_add_watch(self._fd, os.fsencode(directory), _WATCH_MASK) < 0:
+                errno = ctypes.get_errno()
+                if errno == 28:     # ENOSPC: fs.inotify.max_user_watches reached
+                    raise OSError(errno, "Out of inotify watches (raise fs.inotify.max_user_watches)")
+                # Gone since the snapshot: the next one will notice
+        self._watched = directories
+
+    def _drain(self):
+        try:
+            while os.read(self._fd, 65536):
+                pass
+        except BlockingIOError:
+            pass
+
+    def wait(self, timeout: float) -> bool:
+        # Wakes up every second at most, so stop_flag is noticed
+        remaining = timeout
+        while remaining > 0 and not self.stop_flag.is_set():
+            ready, _, _ = select.select([self._fd], [], [], min(remaining, 1.0))
+            if ready:
+                self._drain()
+                return True
+            remaining -= 1.0
+        return False
+
+    def rescan_interval(self, interval: float) -> float:
+        return max(interval, INOTIFY_RESCAN_SECONDS)
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+def make_watcher(backend: str = DEFAULT_WATCH_BACKEND, stop_flag: Optional[threading.Event] = None) -> PollWatcher:
+    """A watcher for backend; "auto" uses inotify when it is available and polls otherwise."""
+    if backend not in WATCH_BACKENDS:
+        raise ValueError(f"Unknown watch backend: {backend}")
+    if backend == "poll":
+        return PollWatcher(stop_flag)
+    try:
+        return InotifyWatcher(stop_flag)
+    except (OSError, AttributeError):
+        # AttributeError: a libc without inotify_init1
+        if backend == "inotify":
+            raise
+        return PollWatcher(stop_flag)
@@ -0,0 +1,67 @@
+import random
+
+import pytest
+
+from lmtokencook.chunker import MAX_SERVINGS, PACKING_STRATEGIES, make_planner, serving_comment, serving_overhead
+from lmtokencook.tokenizers import available_encodings, get_encoding
+
+
+def _load(name):
+    try:
+        return get_encoding(name)
+    except Exception as e:
+        pytest.skip(f"{name} is not available here: {e}")
+
+
+@pytest.mark.parametrize("name", available_encodings())
+def test_serving_overhead_bounds_every_serving_number(name):
+    enc = _load(name)
+    numbers = list(range(1, 2000)) + random.Random(0).sample(range(2000, MAX_SERVINGS), 2000)
+    numbers += [10 ** k for k in range(3, 6)] + [MAX_SERVINGS - 1, MAX_SERVINGS]
+    overhead, final_overhead = serving_overhead(enc), serving_overhead(enc, final=True)
+    for total in numbers:
+        final = 2 * (len(enc.encode_ordinary(serving_comment(total, total))) + 1)
+        assert final <= final_overhead, total
+        for number in {1, total // 2, total - 1} - {0, total}:
+            middle = 2 * (len(enc.encode_ordinary(serving_comment(number, total))) + 1)
+            assert middle <= overhead, (number, total)
+
+
+@pytest.mark.parametrize("strategy", PACKING_STRATEGIES)
+def test_last_line_too_long_for_the_closing_serving(strategy):
+    # 80 tokens fit a serving (100 - 10) but not the last one (100 - 30)
+    planner = make_planner(strategy, 100, overhead=10, final_overhead=30)
+    planner.begin_unit("a_rather_long_path.py")
+    for line_tokens in (20, 20, 79):
+        planner.add(line_tokens)
+    assert planner.finish() == [(0, 2), (2, 3), (3, 3)]
+    assert planner.serving_tokens == [52, 90, 30]
+
+
+def _plan(strategy, line_tokens, serving_size=1000, overhead=40, final_overhead=90):
+    planner = make_planner(strategy, serving_size, overhead, final_overhead)
+    for tokens in line_tokens:
+        planner.add(tokens)
+    planner.finish()
+    return planner
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_balanced_evens_out_both_ends(seed):
+    line_tokens = [random.Random(seed).randint(1, 60) for _ in range(300)]
+    greedy, balanced = _plan("greedy", line_tokens), _plan("balanced", line_tokens)
+    assert len(balanced.serving_tokens) <= len(greedy.serving_tokens)
+    assert max(balanced.serving_tokens) <= 1000
+    assert balanced.bounds[0][0] == 0 and balanced.bounds[-1][1] == 300
+    assert all(a[1] == b[0] for a, b in zip(balanced.bounds, balanced.bounds[1:]))
+    assert min(balanced.serving_tokens) >= min(greedy.serving_tokens)
+    spread = max(balanced.serving_tokens) - min(balanced.serving_tokens)
+    assert spread < max(greedy.serving_tokens) - min(greedy.serving_tokens)
+    assert spread <= 2 * 61
+
+
+def test_balanced_splits_a_short_remainder_evenly():
+    # Greedy: 960 + 40, then 50 + 90 in the closing serving
+    balanced = _plan("balanced", [9] * 101)
+    assert _plan("greedy", [9] * 101).serving_tokens == [1000, 140]
+    assert balanced.serving_tokens == [570, 570]
@@ -0,0 +1,27 @@
+import pytest
+from lmtokencook.main import run_lmtokencook
+
+
+def _deep_tree(tmp_path, depth):
+    directory = tmp_path.joinpath("src", *["a_rather_long_directory_name_for_testing"] * depth)
+    directory.mkdir(parents=True)
+    (directory / "module.py").write_text("print('hello')\n" * 200)
+    return tmp_path / "src"
+
+
+@pytest.mark.parametrize("packing", ["greedy", "files", "balanced"])
+def test_path_marker_longer_than_a_serving_fails_cleanly(tmp_path, packing):
+    src = _deep_tree(tmp_path, depth=40)
+    out = tmp_path / "out"
+    with pytest.raises(ValueError, match="too small for path"):
+        run_lmtokencook(src, out, chunk_size=600, packing=packing)
+    # Nothing was published: no output directory is left behind
+    assert list(out.iterdir()) == []
+
+
+def test_small_servings_with_long_path_stay_within_chunk_size(tmp_path):
+    src = _deep_tree(tmp_path, depth=3)
+    result = run_lmtokencook(src, tmp_path / "out", chunk_size=800, packing="files")
+    servings = result["chunking"]["servings"]
+    assert len(servings) > 1
+    assert all(serving["tokens"] <= 800 for serving in servings)
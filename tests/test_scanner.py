@@ -0,0 +1,14 @@
+from lmtokencook.scanner import count_skipped, scan_directory
+
+
+def test_count_skipped_with_entries_named_like_the_markers(tmp_path):
+    for name in ("processed", "skipped", "rel_path"):
+        directory = tmp_path / "src" / name
+        directory.mkdir(parents=True)
+        (directory / "notes.txt").write_text("kept\n")
+        (directory / "image.png").write_bytes(b"\x89PNG")
+        (directory / name).mkdir()
+        (directory / name / "data.xyz").write_text("skipped\n")
+    _, dir_struct = scan_directory(tmp_path / "src")
+    assert count_skipped(dir_struct, "explicitly_excluded") == 3
+    assert count_skipped(dir_struct, "not_plaintext") == 3